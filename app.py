@@ -1,8 +1,14 @@
 # app.py
+import logging
+import time
 import streamlit as st
 from src.config import APP_TITLE, ABOUT_TEXT, CONTACT_TEXT, LLM_PROVIDER, LLM_PROVIDER_HUGGINGFACE
-from src.search_logic import load_search_artifacts, semantic_search
-from src.llm_services import load_hf_model, get_relevance_explanation
+from src.config import METRICS_FILE, METRICS_PORT
+from src import metrics
+from src.facet_index import FacetFilter
+from src.search_logic import load_search_data, load_bi_encoder, load_facets, start_model_warmup, cached_semantic_search, search_chapters
+from src.search_logic import related_kurals
+from src.llm_services import load_hf_model, stream_explanations_concurrently
 
 # --- Page Config ---
 st.set_page_config(page_title="Thirukkural Semantic Search", page_icon="📜", layout="wide")
@@ -20,16 +26,34 @@ st.markdown(
 )
 
 # --- Load Resources ---
-search_model, embeddings, metadata_list = load_search_artifacts()
-
-# Conditionally load the Hugging Face model
-model, tokenizer = None, None
-if LLM_PROVIDER == LLM_PROVIDER_HUGGINGFACE:
-    model, tokenizer = load_hf_model()
+# The memory-mapped search data opens in milliseconds. The models (and the
+# Hugging Face LLM, if selected) load on a background thread so the page
+# renders immediately; a search waits for them only if they aren't ready yet.
+embeddings, metadata_list = load_search_data()
+warmup = start_model_warmup((load_hf_model,) if LLM_PROVIDER == LLM_PROVIDER_HUGGINGFACE else ())
+if metrics.enabled() and METRICS_PORT:
+    metrics.start_metrics_server(METRICS_PORT)
+facets = load_facets()
 
 # --- Sidebar ---
+search_mode, facet_filter = "Kurals", FacetFilter()
 with st.sidebar:
     st.image("img/logo.png", width=120)
+    # Facet controls (only when the facet index has been built).
+    if facets is not None:
+        st.header("Search Options")
+        search_mode = st.radio("Search for", ["Kurals", "Chapters"], horizontal=True,
+                               help="'Chapters' lists the Adhikarams closest to your theme.")
+        paal_names = {paal["name_english"]: f"{paal['name_tamil']} ({paal['name_english']})" for paal in facets.paals}
+        chosen_paals = st.multiselect("Paal", list(paal_names), format_func=paal_names.get, placeholder="All Paals")
+        chapter_names = {
+            chapter["number"]: f"{chapter['number']}. {chapter['name_tamil']} ({chapter['name_english']})"
+            for chapter in facets.chapters if not chosen_paals or chapter["paal"] in chosen_paals
+        }
+        chosen_chapters = st.multiselect("Adhikaram", list(chapter_names), format_func=chapter_names.get,
+                                         placeholder="All chapters")
+        facet_filter = FacetFilter.create(chosen_paals, chosen_chapters)
+        st.markdown("---")
     st.header("About This App")
     st.markdown(ABOUT_TEXT)
     st.markdown("---")
@@ -50,52 +74,110 @@ if st.button("Search for Wisdom", type="primary"):
     if not query:
         st.warning("Please enter a query to search.")
     else:
-        with st.spinner("Searching for the most relevant verses..."):
-            results = semantic_search(query, search_model, embeddings, metadata_list)
+        with metrics.trace() as page_trace:
+            page_start = time.perf_counter()
+            if not warmup.done():
+                with st.spinner("Loading the AI models (first run only)..."), metrics.span("model_warmup_wait"):
+                    warmup.result()
+            search_model = load_bi_encoder()
+            if search_mode == "Chapters":
+                with st.spinner("Finding the most relevant chapters..."):
+                    chapters = search_chapters(query, search_model, facet_filter=facet_filter)
+                st.subheader(f"Top {len(chapters)} Relevant Chapters:")
+                for chapter in chapters:
+                    st.markdown("---")
+                    st.markdown(
+                        f"**Adhikaram {chapter['number']}:** {chapter['name_tamil']} ({chapter['name_english']}) | "
+                        f"**Paal:** {paal_names[chapter['paal']]} | **Similarity:** {chapter['score']:.2f}"
+                    )
+                    with st.expander(f"Show the {chapter['end'] - chapter['start']} Kurals"):
+                        for row in range(chapter["start"], chapter["end"]):
+                            kural_data = metadata_list[row]
+                            st.markdown(f"**Kural {kural_data.get('kural_no')}**<br>{kural_data.get('Line1', '')}<br>"
+                                        f"{kural_data.get('Line2', '')}", unsafe_allow_html=True)
+                            st.caption(kural_data.get('kural_english_explanation', ''))
+            else:
+                # Conditionally use the Hugging Face model (already loaded by the warm-up)
+                model, tokenizer = None, None
+                if LLM_PROVIDER == LLM_PROVIDER_HUGGINGFACE:
+                    model, tokenizer = load_hf_model()
+
+                with st.spinner("Searching for the most relevant verses..."):
+                    results = cached_semantic_search(query, search_model, embeddings, metadata_list,
+                                                     facet_filter=facet_filter)
         
-        st.subheader("Top 3 Relevant Kurals:")
-        if not results:
-            st.info("No relevant Kurals were found for your query.")
-        else:
-            # --- MODIFIED LOGIC STARTS HERE ---
+                st.subheader("Top 3 Relevant Kurals:")
+                if not results:
+                    st.info("No relevant Kurals were found for your query.")
+                else:
+                    # --- MODIFIED LOGIC STARTS HERE ---
             
-            # Step 1: Display all Kurals and create empty placeholders.
-            placeholders = []
-            for kural_data in results:
-                st.markdown("---")
-                header = (
-                    f"**Kural {kural_data.get('kural_no', 'N/A')}** | "
-                    f"**Paal:** {kural_data.get('paal_name_tamil', 'N/A')} ({kural_data.get('paal_translation_english', 'N/A')}) | "
-                    f"**Adhikaram:** {kural_data.get('adhikaram_name_tamil', 'N/A')} ({kural_data.get('adhikaram_translation_english', 'N/A')})"
-                )
-                st.markdown(header)
-                
-                line1 = kural_data.get('Line1', '')
-                line2 = kural_data.get('Line2', '')
-                st.markdown(f"### {line1}<br>{line2}", unsafe_allow_html=True)
+                    # Step 1: Display all Kurals and create empty placeholders.
+                    placeholders = []
+                    for kural_data in results:
+                        st.markdown("---")
+                        header = (
+                            f"**Kural {kural_data.get('kural_no', 'N/A')}** | "
+                            f"**Paal:** {kural_data.get('paal_name_tamil', 'N/A')} ({kural_data.get('paal_translation_english', 'N/A')}) | "
+                            f"**Adhikaram:** {kural_data.get('adhikaram_name_tamil', 'N/A')} ({kural_data.get('adhikaram_translation_english', 'N/A')})"
+                        )
+                        st.markdown(header)
                 
-                with st.expander("Show Explanations", expanded=True):
-                    st.info(f"**English Explanation:** {kural_data.get('kural_english_explanation', '')}\n\n"
-                            f"**Tamil Explanation:** {kural_data.get('kural_tamil_explanation', '')}")
+                        line1 = kural_data.get('Line1', '')
+                        line2 = kural_data.get('Line2', '')
+                        st.markdown(f"### {line1}<br>{line2}", unsafe_allow_html=True)
                 
-                placeholders.append(st.empty())
+                        with st.expander("Show Explanations", expanded=True):
+                            st.info(f"**English Explanation:** {kural_data.get('kural_english_explanation', '')}\n\n"
+                                    f"**Tamil Explanation:** {kural_data.get('kural_tamil_explanation', '')}")
 
-            # Step 2: Now, fill each placeholder with a spinner while generating its explanation.
-            for i, kural_data in enumerate(results):
-                # Use the placeholder as a container for the spinner
-                with placeholders[i]:
-                    with st.spinner("💬 Analyzing relevance with AI..."):
-                        relevance = get_relevance_explanation(
-                            query, 
-                            kural_data.get('kural_english_explanation', ''),
-                            model,
-                            tokenizer
-                        )
+                        # Related Kurals come from the precomputed neighbor graph (no model call).
+                        related = related_kurals(kural_data.row, metadata_list)
+                        if related:
+                            with st.expander("🔗 Related Kurals"):
+                                for related_kural, _ in related:
+                                    st.markdown(
+                                        f"**Kural {related_kural.get('kural_no')}** "
+                                        f"({related_kural.get('adhikaram_translation_english', '')})<br>"
+                                        f"{related_kural.get('Line1', '')}<br>{related_kural.get('Line2', '')}",
+                                        unsafe_allow_html=True,
+                                    )
+                                    st.caption(related_kural.get('kural_english_explanation', ''))
                 
-                # After the spinner is done, fill the placeholder with the final result
-                if "not available" in relevance:
-                     placeholders[i].warning(f"💬 **Relevance Analysis:** {relevance}")
-                else:
-                     placeholders[i].success(f"💬 **Relevance Analysis:** {relevance}")
+                        placeholders.append(st.empty())
+                        placeholders[-1].info("💬 Analyzing relevance with AI...")
+
+                    # Step 2: Generate all explanations concurrently. Worker threads can't
+                    # touch Streamlit elements, so tokens come back here and each
+                    # placeholder is updated from the script thread as they arrive.
+                    explanations = [kural_data.get('kural_english_explanation', '') for kural_data in results]
+                    kural_numbers = [kural_data.get('kural_no') for kural_data in results]
+                    for i, relevance, done in stream_explanations_concurrently(query, explanations, model, tokenizer, kural_numbers=kural_numbers):
+                        if not done:
+                            placeholders[i].info(f"💬 **Relevance Analysis:** {relevance}▌")
+                        elif "not available" in relevance:
+                            placeholders[i].warning(f"💬 **Relevance Analysis:** {relevance}")
+                        else:
+                            placeholders[i].success(f"💬 **Relevance Analysis:** {relevance}")
+
+            page_seconds = time.perf_counter() - page_start
+            logging.info(f"Page for query rendered in {page_seconds:.2f}s")
+            metrics.observe("page_duration_seconds", page_seconds)
+            metrics.note("page_total_ms", round(page_seconds * 1000, 1))
+
+        # --- Metrics ---
+        if page_trace is not None:
+            if METRICS_FILE:
+                try:
+                    metrics.write_prometheus_file(METRICS_FILE)
+                except OSError as e:
+                    logging.warning(f"Could not write metrics to {METRICS_FILE}: {e}")
+            with st.sidebar.expander("⏱️ Timing breakdown", expanded=False):
+                st.table({
+                    "Stage": [name for name, _ in page_trace.stages],
+                    "ms": [round(seconds * 1000, 1) for _, seconds in page_trace.stages],
+                })
+                for name, value in page_trace.notes.items():
+                    st.caption(f"{name.replace('_', ' ')}: {value}")
 else:
     st.info("Enter a query above and click 'Search for Wisdom' to begin.")
\ No newline at end of file
@@ -0,0 +1,119 @@
+# benchmarks/bench_batch_search.py
+# Compares answering a query set one query at a time against one
+# semantic_search_batch call, and checks both return identical results.
+# semantic_search is itself a batch of one, so the per-query side is an
+# independent reference pipeline written here (plain NumPy, one encode and
+# one re-rank call per query) rather than the shared batched code path.
+# Run from the repo root: python -m benchmarks.bench_batch_search
+
+import time
+import numpy as np
+from src.config import (
+    QUERY_PREFIX,
+    RETRIEVE_K,
+    LEXICAL_K,
+    RRF_K,
+    RERANK_TOP_K,
+    ADAPTIVE_RERANK,
+    COARSE_TO_FINE_CHAPTERS,
+)
+from src.search_logic import (
+    load_search_artifacts,
+    load_reranker,
+    load_relevance_threshold,
+    load_lexical_index,
+    load_exact_matcher,
+    semantic_search_batch,
+)
+
+# A mix of on-topic themes and off-topic queries, repeated to get a
+# workload closer to a nightly evaluation run.
+BENCH_QUERIES = [
+    "the value of true friendship",
+    "controlling anger",
+    "how to earn wealth honestly",
+    "the duties of a king",
+    "patience in hard times",
+    "gratitude for help received",
+    "the pain of separation from a lover",
+    "avoiding bad company",
+    "the importance of education",
+    "kindness to all living beings",
+    "quantum chromodynamics lattice simulation",
+    "best pizza toppings",
+    "kural 42",
+]
+REPEATS = 10
+
+def reference_search(query: str, model, corpus: np.ndarray, metadata, top_k: int = RERANK_TOP_K) -> list:
+    """
+    The fixed pipeline for a single query, spelled out step by step:
+    exact match, dense top RETRIEVE_K, reciprocal-rank fusion with the top
+    LEXICAL_K BM25 hits, cross-encoder re-rank, threshold. `corpus` is the
+    (rows, dim) float32 matrix of normalized kural vectors.
+    Returns metadata row indices, best first.
+    """
+    exact = load_exact_matcher().match(query)
+    if exact is not None:
+        return exact[:top_k]
+
+    query_vector = np.asarray(model.encode([QUERY_PREFIX + query]), dtype=np.float32)[0]
+    query_vector = query_vector / (np.linalg.norm(query_vector) or 1.0)
+    similarities = corpus @ query_vector
+    candidates = [int(i) for i in np.argsort(-similarities, kind="stable")[:RETRIEVE_K]]
+
+    lexical_index = load_lexical_index()
+    if lexical_index is not None:
+        bm25 = lexical_index.score(query)
+        matched = np.flatnonzero(bm25 > 0)
+        lexical = [int(i) for i in matched[np.argsort(-bm25[matched], kind="stable")][:LEXICAL_K]]
+        if lexical:
+            fused = {}
+            for ranking in (candidates, lexical):
+                for rank, row in enumerate(ranking, start=1):
+                    fused[row] = fused.get(row, 0.0) + 1.0 / (RRF_K + rank)
+            candidates = sorted(fused, key=fused.get, reverse=True)[:RETRIEVE_K]
+
+    pairs = [(query, metadata[i].get("kural_english_explanation", "")) for i in candidates]
+    scores = load_reranker().predict(pairs)
+    ranked = sorted(zip(candidates, scores), key=lambda x: x[1], reverse=True)
+    threshold = load_relevance_threshold()
+    return [row for row, score in ranked if score >= threshold][:top_k]
+
+def main():
+    if ADAPTIVE_RERANK or COARSE_TO_FINE_CHAPTERS:
+        raise SystemExit("The reference pipeline covers the fixed re-rank over the whole corpus; "
+                         "unset ADAPTIVE_RERANK and COARSE_TO_FINE_CHAPTERS to run this benchmark.")
+    queries = BENCH_QUERIES * REPEATS
+    model, embeddings, metadata = load_search_artifacts()
+    load_reranker()
+    corpus = np.asarray(embeddings.vectors, dtype=np.float32)
+    if embeddings.scales is not None:
+        corpus = corpus * np.asarray(embeddings.scales)[:, None]
+
+    # Warm-up so neither path pays for lazy initialisation.
+    semantic_search_batch(BENCH_QUERIES[:2], model, embeddings, metadata)
+    reference_search(BENCH_QUERIES[0], model, corpus, metadata)
+
+    start = time.perf_counter()
+    looped = [reference_search(q, model, corpus, metadata) for q in queries]
+    loop_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batched = semantic_search_batch(queries, model, embeddings, metadata)
+    batch_seconds = time.perf_counter() - start
+
+    looped_numbers = [[metadata[i].get("kural_no") for i in rows] for rows in looped]
+    batched_numbers = [[r.get("kural_no") for r in result] for result in batched]
+    mismatches = [q for q, a, b in zip(queries, looped_numbers, batched_numbers) if a != b]
+
+    print(f"Queries: {len(queries)}")
+    print(f"Per-query reference:     {loop_seconds:8.3f} s  ({len(queries) / loop_seconds:8.1f} queries/s)")
+    print(f"semantic_search_batch:   {batch_seconds:8.3f} s  ({len(queries) / batch_seconds:8.1f} queries/s)")
+    print(f"Speed-up: {loop_seconds / batch_seconds:.2f}x")
+    print(f"Results identical: {not mismatches}")
+    if mismatches:
+        raise SystemExit(f"Batched results differ from the per-query reference for: {', '.join(sorted(set(mismatches)))}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+# benchmarks/bench_hf_batch.py
+# Compares explaining three results one generate() call at a time against a
+# single batched call with the shared prompt prefix cached, on the local
+# Hugging Face model (TinyLlama). Both default and fast (greedy) modes.
+# Run from the repo root: python -m benchmarks.bench_hf_batch
+
+import time
+from src.providers.huggingface_provider import load_hf_model, get_relevance_explanations_batch_hf
+
+BENCH_QUERY = "the value of true friendship"
+BENCH_EXPLANATIONS = [
+    "Those who befriend the good, after due inquiry, will find that friendship endures.",
+    "Friendship is not for laughing together but for rebuking a friend who goes astray.",
+    "What is as hard to gain as friendship? And what so sure a shield against the works of foes?",
+]
+
+def main():
+    model, tokenizer = load_hf_model()
+    if model is None:
+        raise SystemExit("Hugging Face model failed to load.")
+
+    # Warm-up so neither path pays for lazy initialisation.
+    get_relevance_explanations_batch_hf(BENCH_QUERY, BENCH_EXPLANATIONS[:1], model, tokenizer, fast=True)
+
+    for fast in (False, True):
+        start = time.perf_counter()
+        for explanation in BENCH_EXPLANATIONS:
+            get_relevance_explanations_batch_hf(BENCH_QUERY, [explanation], model, tokenizer, fast=fast)
+        sequential_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        get_relevance_explanations_batch_hf(BENCH_QUERY, BENCH_EXPLANATIONS, model, tokenizer, fast=fast)
+        batch_seconds = time.perf_counter() - start
+
+        mode = "fast (greedy)" if fast else "default (sampled)"
+        print(f"--- {mode}, {len(BENCH_EXPLANATIONS)} explanations ---")
+        print(f"Sequential generate(): {sequential_seconds:8.2f} s")
+        print(f"Batched generate():    {batch_seconds:8.2f} s")
+        print(f"Speed-up: {sequential_seconds / batch_seconds:.2f}x")
+
+if __name__ == "__main__":
+    main()
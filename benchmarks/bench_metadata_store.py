@@ -0,0 +1,61 @@
+# benchmarks/bench_metadata_store.py
+# Cold-load time and resident memory (Linux /proc) of the columnar metadata store against
+# the old pickled list of dicts. Each variant runs in a fresh interpreter that
+# loads the metadata and reads what one search touches: the rerank text of 15
+# candidates and every field of the 3 returned rows. Module imports happen
+# before timing starts, so only loading the data itself is measured.
+# Run from the repo root: python -m benchmarks.bench_metadata_store
+
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+from src.metadata_store import load_metadata_store
+
+CANDIDATE_ROWS = list(range(0, 1330, 89))[:15]
+RESULT_ROWS = CANDIDATE_ROWS[:3]
+
+LOADERS = {
+    "pickle (list of dicts)": """
+with open({path!r}, 'rb') as f:
+    metadata = pickle.load(f)
+""",
+    "columnar (memory-mapped)": """
+from src.metadata_store import load_metadata_store
+metadata = load_metadata_store()
+""",
+}
+
+PROBE = """
+import os, pickle, time, numpy
+import src.metadata_store
+def rss_mb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+before = rss_mb()
+start = time.perf_counter()
+{loader}
+texts = [metadata[i].get("kural_english_explanation", "") for i in {candidates}]
+rows = [dict(metadata[i]) for i in {results}]
+elapsed = time.perf_counter() - start
+print(f"{{elapsed * 1000:.1f}} {{rss_mb() - before:.1f}}")
+"""
+
+def main():
+    # Recreate the legacy pickle from the store so both hold identical data.
+    store = load_metadata_store()
+    with tempfile.TemporaryDirectory() as tmp:
+        pickle_path = os.path.join(tmp, "kural_metadata.pkl")
+        with open(pickle_path, 'wb') as f:
+            pickle.dump([record.to_dict() for record in store], f)
+
+        print(f"{'format':<28}{'cold load + access (ms)':>26}{'RSS growth (MB)':>18}")
+        for name, loader in LOADERS.items():
+            script = PROBE.format(loader=loader.format(path=pickle_path), candidates=CANDIDATE_ROWS, results=RESULT_ROWS)
+            output = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True)
+            elapsed_ms, rss_mb = output.stdout.split()
+            print(f"{name:<28}{elapsed_ms:>26}{rss_mb:>18}")
+
+if __name__ == "__main__":
+    main()
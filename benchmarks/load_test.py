@@ -0,0 +1,93 @@
+# benchmarks/load_test.py
+# Load generator for search_service.py: sends /search requests at increasing
+# concurrency and reports throughput, latency percentiles and errors per level
+# (503 = shed by backpressure, 504 = timed out).
+# Start the service first (python search_service.py), then from the repo root:
+#   python -m benchmarks.load_test --concurrency 1 2 4 8 16 32 --requests 200
+
+import argparse
+import itertools
+import json
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from benchmarks.bench_batch_search import BENCH_QUERIES
+
+def post_json(url: str, payload: dict, timeout: float):
+    """
+    Returns (HTTP status, server-side latency in ms or None).
+    """
+    request = urllib.request.Request(url, data=json.dumps(payload).encode("utf-8"),
+                                     headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status, json.loads(response.read()).get("took_ms")
+    except urllib.error.HTTPError as e:
+        return e.code, None
+    except (urllib.error.URLError, TimeoutError, ConnectionError):
+        return 0, None
+
+def run_level(url: str, concurrency: int, n_requests: int, bust_cache: bool, timeout: float, offset: int) -> dict:
+    # A unique suffix per request defeats the result cache, so every request
+    # reaches the models (and the micro-batcher).
+    queries = itertools.cycle(BENCH_QUERIES)
+    payloads = [{"query": f"{next(queries)} ({offset + i})" if bust_cache else next(queries)} for i in range(n_requests)]
+
+    def one(payload):
+        start = time.perf_counter()
+        status, _ = post_json(url, payload, timeout)
+        return status, (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(one, payloads))
+    elapsed = time.perf_counter() - start
+
+    latencies = [ms for status, ms in outcomes if status == 200]
+    statuses = {}
+    for status, _ in outcomes:
+        statuses[status] = statuses.get(status, 0) + 1
+    return {
+        "concurrency": concurrency,
+        "requests": n_requests,
+        "ok": len(latencies),
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "p50": float(np.percentile(latencies, 50)) if latencies else float("nan"),
+        "p95": float(np.percentile(latencies, 95)) if latencies else float("nan"),
+        "p99": float(np.percentile(latencies, 99)) if latencies else float("nan"),
+        "errors": {str(k): v for k, v in statuses.items() if k != 200},
+    }
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Load test for search_service.py.")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="Service base URL.")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32],
+                        help="Concurrent clients per level.")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per level.")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Client timeout in seconds.")
+    parser.add_argument("--allow-cache", action="store_true",
+                        help="Repeat the same queries so the result cache answers most requests.")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    url = args.url.rstrip("/") + "/search"
+    with urllib.request.urlopen(args.url.rstrip("/") + "/health", timeout=args.timeout) as response:
+        print(f"Service: {json.loads(response.read())}")
+
+    print(f"\n{'clients':>7s} {'ok':>6s} {'req/s':>8s} {'p50 ms':>8s} {'p95 ms':>8s} {'p99 ms':>8s}  errors")
+    offset = int(time.time())
+    for concurrency in args.concurrency:
+        level = run_level(url, concurrency, args.requests, not args.allow_cache, args.timeout, offset)
+        offset += args.requests
+        errors = ", ".join(f"{k}: {v}" for k, v in level["errors"].items()) or "-"
+        print(f"{concurrency:7d} {level['ok']:6d} {level['throughput']:8.1f} {level['p50']:8.1f} "
+              f"{level['p95']:8.1f} {level['p99']:8.1f}  {errors}")
+
+    with urllib.request.urlopen(args.url.rstrip("/") + "/health", timeout=args.timeout) as response:
+        print(f"\nBatcher: {json.loads(response.read())['batcher']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# benchmarks/profile_startup.py
+# Startup profile: import time per top-level package (via python -X importtime)
+# for what app.py imports, then time-to-first-query broken down by stage.
+# Run from the repo root: python -m benchmarks.profile_startup [--skip-first-query]
+
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+APP_IMPORTS = "import streamlit, src.search_logic, src.llm_services"
+TOP_N = 15
+FIRST_QUERY = "the value of true friendship"
+
+def profile_imports():
+    """
+    Runs the app's imports in a fresh interpreter and sums the self time of
+    every module under its top-level package.
+    """
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, "-X", "importtime", "-c", APP_IMPORTS],
+                            capture_output=True, text=True, check=True)
+    wall = time.perf_counter() - start
+
+    by_package = defaultdict(int)
+    modules = set()
+    for line in output.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _cumulative_us, module = (part.strip() for part in line[len("import time:"):].split("|"))
+        by_package[module.split(".")[0]] += int(self_us)
+        modules.add(module)
+
+    print(f"--- Import time ({APP_IMPORTS}) ---")
+    print(f"Interpreter start + imports: {wall * 1000:.0f} ms")
+    for package, micros in sorted(by_package.items(), key=lambda item: item[1], reverse=True)[:TOP_N]:
+        print(f"  {package:<28}{micros / 1000:>9.1f} ms")
+    heavy = [m for m in ("torch", "transformers", "sentence_transformers", "ollama", "google.genai") if m in modules]
+    print(f"Heavy backends imported at startup: {', '.join(heavy) if heavy else 'none'}")
+
+def profile_first_query():
+    """
+    Times each stage a cold process goes through before its first result.
+    """
+    from src.config import LLM_PROVIDER
+    stages = []
+
+    def timed(label, fn):
+        start = time.perf_counter()
+        value = fn()
+        stages.append((label, time.perf_counter() - start))
+        return value
+
+    search_logic = timed("import src.search_logic", lambda: __import__("src.search_logic", fromlist=["*"]))
+    embeddings, metadata = timed("load_search_data (mmap)", search_logic.load_search_data)
+    model = timed("load_bi_encoder", search_logic.load_bi_encoder)
+    timed("load_reranker", search_logic.load_reranker)
+    timed("first semantic_search", lambda: search_logic.semantic_search(FIRST_QUERY, model, embeddings, metadata))
+    from src.providers import get_provider
+    timed(f"import LLM provider '{LLM_PROVIDER}'", lambda: get_provider(LLM_PROVIDER))
+
+    print("\n--- Time to first query ---")
+    for label, seconds in stages:
+        print(f"  {label:<36}{seconds * 1000:>9.0f} ms")
+    print(f"  {'total':<36}{sum(s for _, s in stages) * 1000:>9.0f} ms")
+
+def main():
+    profile_imports()
+    if "--skip-first-query" not in sys.argv:
+        profile_first_query()
+
+if __name__ == "__main__":
+    main()
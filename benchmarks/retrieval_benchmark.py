@@ -0,0 +1,402 @@
+# benchmarks/retrieval_benchmark.py
+# Reproducible retrieval quality and latency benchmark over the labelled query
+# set in benchmarks/data/. Reports recall@k, MRR and no-result precision,
+# p50/p95 latency per search stage, queries/sec and peak memory, plus a
+# relevance-threshold sweep that reproduces the RELEVANCE_THRESHOLD
+# calibration, and the cross-encoder work and quality of the adaptive re-rank
+# cascade against the fixed pipeline. Compares the run against a recorded baseline and exits non-zero
+# on a regression (the check is skipped until a baseline has been recorded).
+#
+# Runs offline against the committed search_artifacts/ and the locally cached
+# models (run the app or embed_data.py once with network access to fetch them).
+# Run from the repo root:
+#   python -m benchmarks.retrieval_benchmark                    # check against the baseline
+#   python -m benchmarks.retrieval_benchmark --update-baseline  # record a new baseline
+#   python -m benchmarks.retrieval_benchmark --skip-latency     # quality only (e.g. on CI hardware)
+import os
+
+# Must be set before src/ and the model libraries are imported.
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+os.environ["METRICS_ENABLED"] = "true"
+
+import argparse
+import json
+import platform
+import sys
+import time
+import numpy as np
+from src import metrics
+from src.config import (
+    EMBEDDING_MODEL,
+    RERANK_MODEL,
+    RETRIEVE_K,
+    RERANK_TOP_K,
+    HYBRID_SEARCH,
+    INFERENCE_BACKEND,
+    LEXICAL_K,
+    ADAPTIVE_RERANK,
+)
+from src.search_logic import (
+    load_search_artifacts,
+    load_reranker,
+    load_exact_matcher,
+    load_relevance_threshold,
+    search_config_fingerprint,
+    search_indices_batch,
+    retrieve_candidates,
+    rerank_candidates,
+)
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+QUERY_SET_FILE = os.path.join(BENCHMARK_DIR, "data", "retrieval_queries_v1.json")
+BASELINE_FILE = os.path.join(BENCHMARK_DIR, "baselines", "retrieval_baseline.json")
+
+# How far a run may fall behind the baseline before it counts as a regression.
+# Quality metrics are absolute drops; latency and memory are ratios, generous
+# because they depend on the machine the baseline was recorded on.
+DEFAULT_TOLERANCES = {
+    "quality_drop": 0.02,
+    "latency_p95_ratio": 1.5,
+    "latency_slack_ms": 5.0,
+    "peak_rss_ratio": 1.25,
+}
+# Higher is better for every quality metric.
+QUALITY_METRICS = (
+    "on_topic_recall_at_k",
+    "on_topic_mrr",
+    "on_topic_answer_rate",
+    "off_topic_no_result_precision",
+    "exact_lookup_recall_at_k",
+    "exact_lookup_mrr",
+)
+SWEEP_THRESHOLDS = [float(t) for t in np.arange(-12.0, -3.5, 0.5)]
+
+
+def load_query_set(path: str, metadata) -> dict:
+    """
+    Reads the labelled queries and resolves their chapter / kural_no labels
+    to metadata row indices.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        query_set = json.load(f)
+    rows_by_number = {int(n): row for row, n in enumerate(metadata.column("kural_no"))}
+    rows_by_chapter = {}
+    for row, chapter in enumerate(metadata.column("adhikaram_translation_english")):
+        rows_by_chapter.setdefault(chapter.strip(), set()).add(row)
+
+    for item in query_set["queries"]:
+        relevant = set()
+        for chapter in item.get("relevant_chapters", []):
+            if chapter not in rows_by_chapter:
+                raise SystemExit(f"Query {item['id']}: unknown chapter {chapter!r}.")
+            relevant |= rows_by_chapter[chapter]
+        for number in item.get("relevant", []):
+            relevant.add(rows_by_number[number])
+        item["relevant_rows"] = relevant
+    return query_set
+
+
+def recall_at_k(results: list, relevant: set, k: int) -> float:
+    """
+    Relevant results in the top k over the most that could fit (min(k, |relevant|)),
+    so a chapter-labelled query can reach 1.0 with k=3.
+    """
+    if not relevant:
+        return 0.0
+    return len(set(results[:k]) & relevant) / min(k, len(relevant))
+
+def reciprocal_rank(results: list, relevant: set) -> float:
+    for rank, row in enumerate(results, start=1):
+        if row in relevant:
+            return 1.0 / rank
+    return 0.0
+
+def quality_metrics(query_set: dict, results: dict, k: int) -> dict:
+    by_category = {}
+    for item in query_set["queries"]:
+        by_category.setdefault(item["category"], []).append(item)
+
+    def mean(values):
+        return float(np.mean(values)) if values else 0.0
+
+    on_topic = by_category.get("on_topic", [])
+    off_topic = by_category.get("off_topic", [])
+    exact = by_category.get("exact_lookup", [])
+    return {
+        "on_topic_recall_at_k": mean([recall_at_k(results[q["id"]], q["relevant_rows"], k) for q in on_topic]),
+        "on_topic_mrr": mean([reciprocal_rank(results[q["id"]], q["relevant_rows"]) for q in on_topic]),
+        "on_topic_answer_rate": mean([1.0 if results[q["id"]] else 0.0 for q in on_topic]),
+        "off_topic_no_result_precision": mean([0.0 if results[q["id"]] else 1.0 for q in off_topic]),
+        "exact_lookup_recall_at_k": mean([recall_at_k(results[q["id"]], q["relevant_rows"], k) for q in exact]),
+        "exact_lookup_mrr": mean([reciprocal_rank(results[q["id"]], q["relevant_rows"]) for q in exact]),
+    }
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process, or None where unsupported.
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+
+def run_timed_pass(query_set: dict, model, embeddings, metadata, k: int, repeats: int):
+    """
+    Runs every query `repeats` times, one at a time as the app does, tracing
+    each search. Returns the results of the first repetition, the per-stage
+    latencies in ms and the overall queries/sec.
+    """
+    results = {}
+    stage_ms = {}
+    wall = 0.0
+    for repeat in range(repeats):
+        for item in query_set["queries"]:
+            with metrics.trace() as trace:
+                start = time.perf_counter()
+                indices = search_indices_batch([item["query"]], model, embeddings, metadata, k)[0]
+                elapsed = time.perf_counter() - start
+            wall += elapsed
+            stage_ms.setdefault("total", []).append(elapsed * 1000)
+            for name, seconds in trace.stages:
+                stage_ms.setdefault(name, []).append(seconds * 1000)
+            if repeat == 0:
+                results[item["id"]] = indices
+    latency = {
+        name: {
+            "p50": round(float(np.percentile(values, 50)), 3),
+            "p95": round(float(np.percentile(values, 95)), 3),
+            "samples": len(values),
+        }
+        for name, values in stage_ms.items()
+    }
+    queries_per_second = len(query_set["queries"]) * repeats / wall if wall else 0.0
+    return results, latency, round(queries_per_second, 2)
+
+
+def threshold_sweep(query_set: dict, model, embeddings, metadata, k: int) -> dict:
+    """
+    Re-ranks the candidates of every model-path query once, then applies each
+    threshold in SWEEP_THRESHOLDS offline. Also reports stage-1 candidate
+    recall and the spread of the best cross-encoder score per category: the
+    numbers RELEVANCE_THRESHOLD and RETRIEVE_K are chosen from.
+    """
+    matcher = load_exact_matcher()
+    items = [item for item in query_set["queries"] if matcher.match(item["query"]) is None]
+    queries = [item["query"] for item in items]
+    candidate_lists, _ = retrieve_candidates(queries, model, embeddings)
+    ranked_lists = rerank_candidates(queries, candidate_lists, metadata)
+
+    on_topic = [(item, candidates) for item, candidates in zip(items, candidate_lists) if item["category"] == "on_topic"]
+    candidate_recall = float(np.mean([recall_at_k(list(candidates), item["relevant_rows"], RETRIEVE_K)
+                                      for item, candidates in on_topic])) if on_topic else 0.0
+
+    best_scores = {}
+    for item, ranked in zip(items, ranked_lists):
+        if ranked:
+            best_scores.setdefault(item["category"], []).append(ranked[0][1])
+    score_spread = {
+        category: {"min": round(min(scores), 3), "median": round(float(np.median(scores)), 3), "max": round(max(scores), 3)}
+        for category, scores in best_scores.items()
+    }
+
+    sweep = []
+    for threshold in SWEEP_THRESHOLDS:
+        results = {item["id"]: [row for row, score in ranked if score >= threshold][:k]
+                   for item, ranked in zip(items, ranked_lists)}
+        swept = quality_metrics({"queries": items}, results, k)
+        sweep.append({
+            "threshold": threshold,
+            "on_topic_recall_at_k": round(swept["on_topic_recall_at_k"], 4),
+            "on_topic_answer_rate": round(swept["on_topic_answer_rate"], 4),
+            "off_topic_no_result_precision": round(swept["off_topic_no_result_precision"], 4),
+        })
+    return {
+        "candidate_recall_at_retrieve_k": round(candidate_recall, 4),
+        "best_score_by_category": score_spread,
+        "sweep": sweep,
+    }
+
+
+def cascade_comparison(query_set: dict, model, embeddings, metadata, k: int) -> dict:
+    """
+    Runs the query set through the fixed pipeline and the adaptive cascade
+    (ADAPTIVE_RERANK) and reports, for each, the quality metrics and the mean
+    cross-encoder pairs per query, plus the quality delta (adaptive - fixed).
+    Also reports the spread of the best bi-encoder cosine per category, the
+    number CASCADE_OFF_TOPIC_SIMILARITY is chosen from.
+    """
+    report = {}
+    for name, adaptive in (("fixed", False), ("adaptive", True)):
+        results = {}
+        pairs = []
+        for item in query_set["queries"]:
+            with metrics.trace() as trace:
+                results[item["id"]] = search_indices_batch([item["query"]], model, embeddings, metadata, k,
+                                                            adaptive=adaptive)[0]
+            pairs.append(trace.notes.get("rerank_pairs", 0))
+        report[name] = {
+            "quality": {metric: round(value, 4) for metric, value in quality_metrics(query_set, results, k).items()},
+            "mean_rerank_pairs": round(float(np.mean(pairs)), 2),
+        }
+    report["quality_delta"] = {
+        metric: round(report["adaptive"]["quality"][metric] - report["fixed"]["quality"][metric], 4)
+        for metric in QUALITY_METRICS
+    }
+
+    matcher = load_exact_matcher()
+    items = [item for item in query_set["queries"] if matcher.match(item["query"]) is None]
+    _, similarities = retrieve_candidates([item["query"] for item in items], model, embeddings)
+    best_similarity = {}
+    for item, row_similarity in zip(items, similarities):
+        best_similarity.setdefault(item["category"], []).append(float(row_similarity.max()))
+    report["best_similarity_by_category"] = {
+        category: {"min": round(min(values), 3), "median": round(float(np.median(values)), 3), "max": round(max(values), 3)}
+        for category, values in best_similarity.items()
+    }
+    return report
+
+
+def compare_with_baseline(report: dict, baseline: dict, skip_latency: bool) -> list:
+    """
+    Returns a description of every regression against the baseline.
+    """
+    if baseline["query_set_version"] != report["query_set_version"]:
+        return [f"Baseline was recorded on query set v{baseline['query_set_version']}, "
+                f"this run uses v{report['query_set_version']}; re-record it with --update-baseline."]
+    tolerances = {**DEFAULT_TOLERANCES, **baseline.get("tolerances", {})}
+    regressions = []
+    for name in QUALITY_METRICS:
+        before, after = baseline["quality"].get(name), report["quality"][name]
+        if before is not None and after < before - tolerances["quality_drop"]:
+            regressions.append(f"{name}: {after:.4f} < baseline {before:.4f}")
+    if skip_latency:
+        return regressions
+    before, after = baseline["latency_ms"]["total"]["p95"], report["latency_ms"]["total"]["p95"]
+    if after > before * tolerances["latency_p95_ratio"] + tolerances["latency_slack_ms"]:
+        regressions.append(f"p95 latency: {after:.1f} ms > {tolerances['latency_p95_ratio']}x baseline {before:.1f} ms")
+    before, after = baseline.get("peak_rss_mb"), report.get("peak_rss_mb")
+    if before and after and after > before * tolerances["peak_rss_ratio"]:
+        regressions.append(f"peak RSS: {after:.0f} MB > {tolerances['peak_rss_ratio']}x baseline {before:.0f} MB")
+    return regressions
+
+
+def print_report(report: dict):
+    print(f"\nQuery set v{report['query_set_version']}: {report['queries']} queries, k={report['k']}")
+    print("\nQuality:")
+    for name, value in report["quality"].items():
+        print(f"  {name:32s} {value:.4f}")
+    print(f"  {'candidate_recall_at_retrieve_k':32s} {report['calibration']['candidate_recall_at_retrieve_k']:.4f}")
+    print("\nLatency (ms):")
+    print(f"  {'stage':18s} {'p50':>9s} {'p95':>9s}")
+    for name, stats in report["latency_ms"].items():
+        print(f"  {name:18s} {stats['p50']:9.2f} {stats['p95']:9.2f}")
+    print(f"\nThroughput: {report['queries_per_second']:.1f} queries/s (one query per call)")
+    print(f"Peak RSS:   {report['peak_rss_mb']} MB")
+    print("\nBest cross-encoder score per query, by category:")
+    for category, spread in report["calibration"]["best_score_by_category"].items():
+        print(f"  {category:14s} min {spread['min']:7.2f}  median {spread['median']:7.2f}  max {spread['max']:7.2f}")
+    threshold = report["settings"]["relevance_threshold"]
+    print(f"\nThreshold sweep (current relevance threshold = {threshold}):")
+    print(f"  {'threshold':>9s} {'recall@k':>9s} {'answered':>9s} {'no-result prec.':>16s}")
+    for row in report["calibration"]["sweep"]:
+        marker = "  <-" if row["threshold"] == threshold else ""
+        print(f"  {row['threshold']:9.1f} {row['on_topic_recall_at_k']:9.3f} {row['on_topic_answer_rate']:9.3f} "
+              f"{row['off_topic_no_result_precision']:16.3f}{marker}")
+
+    cascade = report["cascade"]
+    print("\nAdaptive re-rank cascade vs. the fixed pipeline:")
+    print(f"  {'':32s} {'fixed':>9s} {'adaptive':>9s} {'delta':>9s}")
+    print(f"  {'mean cross-encoder pairs/query':32s} {cascade['fixed']['mean_rerank_pairs']:9.2f} "
+          f"{cascade['adaptive']['mean_rerank_pairs']:9.2f} "
+          f"{cascade['adaptive']['mean_rerank_pairs'] - cascade['fixed']['mean_rerank_pairs']:9.2f}")
+    for name in QUALITY_METRICS:
+        print(f"  {name:32s} {cascade['fixed']['quality'][name]:9.4f} {cascade['adaptive']['quality'][name]:9.4f} "
+              f"{cascade['quality_delta'][name]:+9.4f}")
+    print("\nBest bi-encoder cosine per query, by category:")
+    for category, spread in cascade["best_similarity_by_category"].items():
+        print(f"  {category:14s} min {spread['min']:7.3f}  median {spread['median']:7.3f}  max {spread['max']:7.3f}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Retrieval quality and latency benchmark.")
+    parser.add_argument("--queries", default=QUERY_SET_FILE, help="Labelled query set (JSON).")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="Baseline report to compare against.")
+    parser.add_argument("--update-baseline", action="store_true", help="Write this run as the new baseline.")
+    parser.add_argument("--skip-latency", action="store_true",
+                        help="Only fail on quality regressions (latency depends on the machine).")
+    parser.add_argument("--repeats", type=int, default=3, help="Timed passes over the query set (default 3).")
+    parser.add_argument("--output", help="Also write the full report to this JSON file.")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    model, embeddings, metadata = load_search_artifacts()
+    load_reranker()
+    query_set = load_query_set(args.queries, metadata)
+    k = RERANK_TOP_K
+
+    # Warm-up so the timed pass doesn't pay for lazy initialisation.
+    search_indices_batch([query_set["queries"][0]["query"], "kural 1"], model, embeddings, metadata, k)
+
+    results, latency, queries_per_second = run_timed_pass(query_set, model, embeddings, metadata, k, args.repeats)
+    report = {
+        "query_set_version": query_set["version"],
+        "queries": len(query_set["queries"]),
+        "k": k,
+        "settings": {
+            "fingerprint": search_config_fingerprint(embeddings),
+            "embedding_model": EMBEDDING_MODEL,
+            "embedding_dtype": embeddings.dtype,
+            "rerank_model": RERANK_MODEL,
+            "retrieve_k": RETRIEVE_K,
+            "inference_backend": INFERENCE_BACKEND,
+            "relevance_threshold": load_relevance_threshold(),
+            "hybrid_search": HYBRID_SEARCH,
+            "lexical_k": LEXICAL_K,
+            "adaptive_rerank": ADAPTIVE_RERANK,
+        },
+        "machine": {"platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count()},
+        "quality": {name: round(value, 4) for name, value in quality_metrics(query_set, results, k).items()},
+        "latency_ms": latency,
+        "queries_per_second": queries_per_second,
+        "calibration": threshold_sweep(query_set, model, embeddings, metadata, k),
+        "cascade": cascade_comparison(query_set, model, embeddings, metadata, k),
+        "peak_rss_mb": peak_rss_mb(),
+        "results": {query_id: [int(metadata.value(row, "kural_no")) for row in rows] for query_id, rows in results.items()},
+    }
+    print_report(report)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\nReport written to {args.output}")
+
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({**report, "tolerances": DEFAULT_TOLERANCES}, f, indent=2, ensure_ascii=False)
+        print(f"\nBaseline written to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}, skipping the regression check; record one with "
+              "--update-baseline (on the reference machine, with the cached models).")
+        return
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline["settings"]["fingerprint"] != report["settings"]["fingerprint"]:
+        changed = [name for name, value in report["settings"].items() if baseline["settings"].get(name) != value]
+        print(f"\nSearch settings differ from the baseline ({', '.join(changed)}); comparing anyway.")
+    regressions = compare_with_baseline(report, baseline, args.skip_latency)
+    if regressions:
+        raise SystemExit("Regression against baseline:\n  " + "\n  ".join(regressions))
+    print("\nNo regressions against the baseline.")
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,148 @@
 # embed_data.py
+import argparse
+import glob
+import hashlib
 import json
-import pandas as pd
-from sentence_transformers import SentenceTransformer
-import numpy as np
 import os
-import pickle
-from src.config import DATA_PATH, EMBEDDING_MODEL, SEARCH_ARTIFACTS_PATH, METADATA_FILE
+import shutil
+import time
+import numpy as np
+import pandas as pd
+from sentence_transformers import SentenceTransformer, CrossEncoder
+from src.config import (
+    DATA_PATH,
+    EMBEDDING_MODEL,
+    SEARCH_ARTIFACTS_PATH,
+    METADATA_FILE,
+    EMBEDDING_MANIFEST_FILE,
+    EMBEDDING_STORE_DTYPE,
+    EMBED_BATCH_SIZE,
+    EMBED_NUM_PROCESSES,
+    EMBED_CHECKPOINT_EVERY,
+    LEXICAL_INDEX_FILE,
+    FACET_INDEX_FILE,
+    RERANK_MODEL,
+    RERANK_BATCH_SIZE,
+    NEIGHBOR_GRAPH_FILE,
+    NEIGHBOR_GRAPH_K,
+    NEIGHBOR_GRAPH_RERANK,
+)
+from src.embedding_store import save_embedding_store, load_reusable_vectors
+from src.metadata_store import save_metadata_store
+from src.facet_index import build_facet_index, save_facet_index
+from src.neighbor_graph import NeighborGraphError, build_neighbor_graph, load_neighbor_graph, save_neighbor_graph
+from src.lexical_index import build_bm25_index, lexical_document, save_bm25_index
+
+# Vectors encoded so far are checkpointed here, so an interrupted run resumes
+# instead of starting over. Removed once the store has been written.
+CHECKPOINT_PATH = os.path.join(SEARCH_ARTIFACTS_PATH, ".embed_checkpoint")
+
+# Embed a composite document per Kural, combining the strongest English
+# signals rather than the explanation alone: the gist (explanation), the
+# poetic rendering (couplet), and the chapter theme (adhikaram). This gives
+# the retriever more surface area to match a theme query against.
+def build_document(row: dict) -> str:
+    parts = [
+        row.get("kural_english_explanation", ""),
+        row.get("couplet", ""),
+        row.get("adhikaram_translation_english", ""),
+    ]
+    return " ".join(str(p).strip() for p in parts if str(p).strip())
+
+def document_hash(document: str) -> str:
+    return hashlib.sha256(document.encode("utf-8")).hexdigest()
+
+def load_checkpoints(model_name: str) -> dict:
+    """
+    Vectors saved by an interrupted run with the same model, keyed by hash.
+    """
+    reusable = {}
+    for chunk_file in sorted(glob.glob(os.path.join(CHECKPOINT_PATH, "chunk_*.npz"))):
+        chunk = np.load(chunk_file)
+        if str(chunk["model"]) != model_name:
+            continue
+        reusable.update(zip(chunk["hashes"].tolist(), chunk["vectors"]))
+    return reusable
+
+def save_checkpoint(model_name: str, hashes: list, vectors: np.ndarray):
+    os.makedirs(CHECKPOINT_PATH, exist_ok=True)
+    chunk_file = os.path.join(CHECKPOINT_PATH, f"chunk_{time.time_ns()}.npz")
+    tmp_file = chunk_file + ".tmp"
+    with open(tmp_file, 'wb') as f:
+        np.savez(f, model=np.array(model_name), hashes=np.array(hashes), vectors=vectors)
+    os.replace(tmp_file, chunk_file)
+
+def encode_documents(model: SentenceTransformer, documents: list, hashes: list, batch_size: int, processes: int) -> dict:
+    """
+    Encodes `documents` in checkpointed chunks, on a multi-process pool when
+    processes > 1. Returns hash -> vector for the encoded documents.
+    """
+    pool = model.start_multi_process_pool(["cpu"] * processes) if processes > 1 else None
+    encoded = {}
+    try:
+        for start in range(0, len(documents), EMBED_CHECKPOINT_EVERY):
+            chunk_documents = documents[start:start + EMBED_CHECKPOINT_EVERY]
+            chunk_hashes = hashes[start:start + EMBED_CHECKPOINT_EVERY]
+            if pool is not None:
+                vectors = model.encode_multi_process(chunk_documents, pool, batch_size=batch_size)
+            else:
+                vectors = model.encode(chunk_documents, batch_size=batch_size)
+            vectors = np.asarray(vectors, dtype=np.float32)
+            save_checkpoint(EMBEDDING_MODEL, chunk_hashes, vectors)
+            encoded.update(zip(chunk_hashes, vectors))
+            print(f"  encoded {min(start + EMBED_CHECKPOINT_EVERY, len(documents))}/{len(documents)}")
+    finally:
+        if pool is not None:
+            SentenceTransformer.stop_multi_process_pool(pool)
+    return encoded
 
-# Define a new path for the embeddings file in your config or here
-EMBEDDINGS_FILE = os.path.join(SEARCH_ARTIFACTS_PATH, "kural_embeddings.npy")
+def update_neighbor_graph(metadata: list, embeddings: np.ndarray, hashes: list, embeddings_sha256: str, rerank: bool):
+    """
+    Rebuilds the related-kurals graph unless the current one was built from
+    the same embeddings with the same settings. When reranking, cross-encoder
+    scores from the previous graph are reused for unchanged pairs.
+    """
+    try:
+        previous = load_neighbor_graph()
+    except NeighborGraphError:
+        previous = None
+    rerank_model = RERANK_MODEL if rerank else None
+    if (previous is not None and previous.manifest.get("embeddings_sha256") == embeddings_sha256
+            and previous.k == NEIGHBOR_GRAPH_K and previous.manifest.get("rerank_model") == rerank_model):
+        print("Neighbor graph is up to date.")
+        return
+
+    score_pairs = None
+    if rerank:
+        print(f"Initializing re-ranker for the neighbor graph: {RERANK_MODEL}")
+        reranker = CrossEncoder(RERANK_MODEL)
+        texts = [row.get("kural_english_explanation", "") for row in metadata]
+
+        def score_pairs(pairs):
+            print(f"  re-ranking {len(pairs)} neighbor pairs...")
+            return reranker.predict([(texts[a], texts[b]) for a, b in pairs], batch_size=RERANK_BATCH_SIZE)
+
+    graph = build_neighbor_graph(embeddings, NEIGHBOR_GRAPH_K, score_pairs, rerank_model, hashes, previous)
+    save_neighbor_graph(graph, embeddings_sha256)
+    if rerank:
+        print(f"Neighbor graph re-ranked: {graph.manifest['scored_pairs']} pairs scored, "
+              f"{graph.manifest['reused_pairs']} reused.")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Build the search artifacts.")
+    parser.add_argument("--full", action="store_true",
+                        help="Re-embed every document instead of only new or changed ones.")
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE,
+                        help=f"Encoder batch size (default {EMBED_BATCH_SIZE}).")
+    parser.add_argument("--processes", type=int, default=EMBED_NUM_PROCESSES,
+                        help=f"Encoder processes; >1 uses a multi-process pool (default {EMBED_NUM_PROCESSES}).")
+    parser.add_argument("--rerank-neighbors", action="store_true", default=NEIGHBOR_GRAPH_RERANK,
+                        help="Reorder the related-kurals graph with the cross-encoder (default: NEIGHBOR_GRAPH_RERANK).")
+    return parser.parse_args()
 
 def main():
+    args = parse_args()
+
     # --- 1. Load and Prepare Data ---
     with open(DATA_PATH, 'r', encoding='utf-8') as file:
         thirukkural_data = json.load(file)
@@ -21,38 +153,50 @@ def main():
                        'mv': 'kural_tamil_explanation'}, inplace=True)
     metadata = df.to_dict(orient='records')
 
-    # Embed a composite document per Kural, combining the strongest English
-    # signals rather than the explanation alone: the gist (explanation), the
-    # poetic rendering (couplet), and the chapter theme (adhikaram). This gives
-    # the retriever more surface area to match a theme query against.
-    def build_document(row: dict) -> str:
-        parts = [
-            row.get("kural_english_explanation", ""),
-            row.get("couplet", ""),
-            row.get("adhikaram_translation_english", ""),
-        ]
-        return " ".join(str(p).strip() for p in parts if str(p).strip())
-
     documents_to_embed = [build_document(row) for row in metadata]
+    hashes = [document_hash(document) for document in documents_to_embed]
 
-    # --- 2. Generate and Save Embeddings ---
-    print(f"Initializing embedding model: {EMBEDDING_MODEL}")
-    model = SentenceTransformer(EMBEDDING_MODEL)
-    print("Generating embeddings... This may take a while.")
-    embeddings = model.encode(documents_to_embed, show_progress_bar=True)
-    
-    # Create the directory if it doesn't exist
-    if not os.path.exists(SEARCH_ARTIFACTS_PATH):
-        os.makedirs(SEARCH_ARTIFACTS_PATH)
+    # --- 2. Work out which documents need (re-)embedding ---
+    # Vectors are reused by content hash, so unchanged documents keep their
+    # vector even if rows are added, removed or reordered.
+    reusable = {} if args.full else load_reusable_vectors(EMBEDDING_MODEL)
+    reusable.update(load_checkpoints(EMBEDDING_MODEL))
+    pending = {doc_hash: document for doc_hash, document in zip(hashes, documents_to_embed) if doc_hash not in reusable}
+    print(f"{len(documents_to_embed)} documents: {len(documents_to_embed) - len(pending)} reused, {len(pending)} to embed.")
+
+    # --- 3. Generate and Save Embeddings ---
+    if pending:
+        print(f"Initializing embedding model: {EMBEDDING_MODEL}")
+        model = SentenceTransformer(EMBEDDING_MODEL)
+        print("Generating embeddings... This may take a while.")
+        start = time.perf_counter()
+        reusable.update(encode_documents(model, list(pending.values()), list(pending.keys()),
+                                         args.batch_size, args.processes))
+        elapsed = time.perf_counter() - start
+        print(f"Embedded {len(pending)} documents in {elapsed:.1f}s "
+              f"({len(pending) / elapsed:.1f} docs/sec, batch size {args.batch_size}, {args.processes} process(es)).")
+
+    embeddings = np.stack([reusable[doc_hash] for doc_hash in hashes])
     
-    # Save the embeddings array and the metadata list
-    np.save(EMBEDDINGS_FILE, embeddings)
-    with open(METADATA_FILE, 'wb') as f:
-        pickle.dump(metadata, f)
+    # Save the normalized embeddings (float32 plus the configured variant),
+    # their manifest, and the metadata list
+    manifest = save_embedding_store(embeddings, EMBEDDING_MODEL, ("float32", EMBEDDING_STORE_DTYPE),
+                                    document_hashes=hashes)
+    save_metadata_store(metadata)
+    # The BM25 index needs no model, so it is simply rebuilt on every run.
+    save_bm25_index(build_bm25_index([lexical_document(row) for row in metadata]))
+    # So are the Paal/chapter ranges and the chapter centroids (from the float32 vectors).
+    save_facet_index(build_facet_index(metadata, embeddings), manifest["variants"]["float32"]["sha256"])
+    update_neighbor_graph(metadata, embeddings, hashes, manifest["variants"]["float32"]["sha256"], args.rerank_neighbors)
+    shutil.rmtree(CHECKPOINT_PATH, ignore_errors=True)
         
-    print(f"Embeddings saved to: {EMBEDDINGS_FILE}")
+    print(f"Embeddings saved: {', '.join(v['file'] for v in manifest['variants'].values())}")
+    print(f"Manifest saved to: {EMBEDDING_MANIFEST_FILE}")
     print(f"Metadata saved to: {METADATA_FILE}")
+    print(f"Lexical index saved to: {LEXICAL_INDEX_FILE}")
+    print(f"Facet index saved to: {FACET_INDEX_FILE}")
+    print(f"Neighbor graph saved to: {NEIGHBOR_GRAPH_FILE}")
     print("\nProcess completed successfully!")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,300 @@
+# optimize_models.py
+# Prepares a CPU-optimized INFERENCE_BACKEND (torch-int8, onnx, onnx-int8):
+#   1. exports the bi-encoder and cross-encoder (ONNX backends only),
+#   2. checks ranking parity against the float32 PyTorch models on the
+#      labelled benchmark queries and the committed corpus embeddings,
+#   3. recalibrates RELEVANCE_THRESHOLD for the backend's cross-encoder logits,
+#   4. compares per-query latency and memory with float32,
+# and writes optimized_models/<backend>/manifest.json, which the app requires
+# before it will use the backend.
+# Usage: python optimize_models.py --backend onnx-int8
+import argparse
+import glob
+import json
+import os
+import shutil
+import time
+import numpy as np
+from src.config import (
+    EMBEDDING_MODEL,
+    RERANK_MODEL,
+    QUERY_PREFIX,
+    RETRIEVE_K,
+    RERANK_TOP_K,
+    RELEVANCE_THRESHOLD,
+    ONNX_QUANTIZATION_CONFIG,
+)
+from src.artifact_io import atomic_write_json
+from src.embedding_store import load_embedding_store
+from src.metadata_store import load_metadata_store
+from src.model_backends import (
+    BACKENDS,
+    BACKEND_MANIFEST_FILENAME,
+    backend_dir,
+    create_bi_encoder,
+    create_cross_encoder,
+)
+
+CALIBRATION_QUERIES_FILE = "benchmarks/data/retrieval_queries_v1.json"
+EXTRA_QUERIES_FILE = "data/popular_queries.txt"
+
+# The backend is refused unless it stays this close to float32.
+MIN_RETRIEVAL_OVERLAP = 0.90    # mean |top RETRIEVE_K float32 ∩ backend| / RETRIEVE_K
+MIN_RERANK_SPEARMAN = 0.90      # mean per-query rank correlation of re-rank scores
+MIN_TOP_K_AGREEMENT = 0.90      # queries whose top RERANK_TOP_K set is unchanged
+MIN_DECISION_AGREEMENT = 0.97   # pairs kept/dropped the same way at the (recalibrated) threshold
+
+
+def current_rss_mb():
+    """
+    Current resident set size (Linux), or None elsewhere.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        return None
+
+def load_measured(create):
+    """
+    Returns (model, seconds to load, approximate RSS growth in MB).
+    """
+    before = current_rss_mb()
+    start = time.perf_counter()
+    model = create()
+    seconds = time.perf_counter() - start
+    after = current_rss_mb()
+    return model, seconds, (round(after - before, 1) if before is not None and after is not None else None)
+
+def directory_size_mb(path: str) -> float:
+    total = sum(os.path.getsize(p) for p in glob.glob(os.path.join(path, "**", "*"), recursive=True) if os.path.isfile(p))
+    return round(total / (1024 * 1024), 1)
+
+def percentile_ms(samples: list, q: float) -> float:
+    return round(float(np.percentile(samples, q)) * 1000, 2)
+
+
+def export_onnx(backend: str) -> dict:
+    """
+    Exports both models to ONNX under optimized_models/<backend>/ and returns
+    their manifest entries (directory and .onnx file relative to it).
+    """
+    from sentence_transformers import export_dynamic_quantized_onnx_model
+    out_dir = backend_dir(backend)
+    entries = {}
+    for key, create in (("bi_encoder", create_bi_encoder), ("cross_encoder", create_cross_encoder)):
+        model_dir = os.path.join(out_dir, key)
+        shutil.rmtree(model_dir, ignore_errors=True)
+        # Loading a hub model with backend="onnx" exports it to ONNX if the
+        # repository has no ONNX weights of its own.
+        model = create("onnx")
+        model.save_pretrained(model_dir)
+        if backend == "onnx-int8":
+            export_dynamic_quantized_onnx_model(model, ONNX_QUANTIZATION_CONFIG, model_dir, file_suffix="qint8")
+            pattern = "*qint8*.onnx"
+        else:
+            pattern = "model.onnx"
+        matches = sorted(glob.glob(os.path.join(model_dir, "**", pattern), recursive=True))
+        if not matches:
+            raise SystemExit(f"Export produced no {pattern} under {model_dir}.")
+        entries[key] = {"path": key, "file_name": os.path.relpath(matches[0], model_dir).replace(os.sep, "/")}
+        print(f"  {key}: {entries[key]['file_name']} ({directory_size_mb(model_dir)} MB on disk)")
+    return entries
+
+
+def load_queries() -> list:
+    with open(CALIBRATION_QUERIES_FILE, 'r', encoding='utf-8') as f:
+        queries = [item["query"] for item in json.load(f)["queries"] if item["category"] != "exact_lookup"]
+    if os.path.exists(EXTRA_QUERIES_FILE):
+        with open(EXTRA_QUERIES_FILE, 'r', encoding='utf-8') as f:
+            queries += [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    return list(dict.fromkeys(queries))
+
+def rank_correlation(a: np.ndarray, b: np.ndarray) -> float:
+    """
+    Spearman correlation (no tie correction; scores are continuous).
+    """
+    if len(a) < 2:
+        return 1.0
+    ranks_a = np.argsort(np.argsort(a)).astype(np.float64)
+    ranks_b = np.argsort(np.argsort(b)).astype(np.float64)
+    return float(np.corrcoef(ranks_a, ranks_b)[0, 1])
+
+def recalibrate_threshold(reference: np.ndarray, candidate: np.ndarray, threshold: float):
+    """
+    The threshold on the candidate's scores whose keep/drop decisions agree
+    most with `reference >= threshold`, preferring values nearest the
+    mean-shifted original. Returns (threshold, agreement).
+    """
+    decisions = reference >= threshold
+    shift = float(np.mean(candidate - reference))
+    values = np.unique(candidate)
+    options = np.concatenate([[threshold, threshold + shift], (values[:-1] + values[1:]) / 2, values[:1] - 1e-3, values[-1:] + 1e-3])
+    agreements = [(float(np.mean((candidate >= t) == decisions)), -abs(t - (threshold + shift)), float(t)) for t in options]
+    best_agreement, _, best = max(agreements)
+    # Keep the original threshold unless moving it actually helps.
+    original = float(np.mean((candidate >= threshold) == decisions))
+    if original >= best_agreement:
+        return threshold, original
+    return round(best, 3), best_agreement
+
+
+def parity_report(bi_encoder, cross_encoder, ref_bi_encoder, ref_cross_encoder, embeddings, metadata) -> dict:
+    queries = load_queries()
+    prefixed = [QUERY_PREFIX + q for q in queries]
+
+    # --- Bi-encoder: same stored corpus vectors, query vectors from each model ---
+    ref_vectors = np.asarray(ref_bi_encoder.encode(prefixed), dtype=np.float32)
+    vectors = np.asarray(bi_encoder.encode(prefixed), dtype=np.float32)
+    ref_top = np.argsort(-embeddings.score(ref_vectors), axis=1, kind="stable")[:, :RETRIEVE_K]
+    top = np.argsort(-embeddings.score(vectors), axis=1, kind="stable")[:, :RETRIEVE_K]
+    overlap = float(np.mean([len(set(a) & set(b)) / RETRIEVE_K for a, b in zip(ref_top, top)]))
+    top1 = float(np.mean(ref_top[:, 0] == top[:, 0]))
+    cosine = float(np.mean(np.sum(ref_vectors * vectors, axis=1) /
+                           (np.linalg.norm(ref_vectors, axis=1) * np.linalg.norm(vectors, axis=1))))
+
+    # --- Cross-encoder: the float32 candidates, scored by both models ---
+    pairs = [(q, metadata[int(i)].get("kural_english_explanation", "")) for q, row in zip(queries, ref_top) for i in row]
+    ref_scores = np.asarray(ref_cross_encoder.predict(pairs), dtype=np.float64).reshape(len(queries), RETRIEVE_K)
+    scores = np.asarray(cross_encoder.predict(pairs), dtype=np.float64).reshape(len(queries), RETRIEVE_K)
+    spearman = float(np.mean([rank_correlation(a, b) for a, b in zip(ref_scores, scores)]))
+
+    threshold, decision_agreement = recalibrate_threshold(ref_scores.ravel(), scores.ravel(), RELEVANCE_THRESHOLD)
+
+    def kept_top_k(row_scores, t):
+        order = np.argsort(-row_scores, kind="stable")
+        return frozenset(int(i) for i in order[:RERANK_TOP_K] if row_scores[i] >= t)
+
+    top_k_agreement = float(np.mean([kept_top_k(a, RELEVANCE_THRESHOLD) == kept_top_k(b, threshold)
+                                     for a, b in zip(ref_scores, scores)]))
+    diff = scores - ref_scores
+    return {
+        "queries": len(queries),
+        "bi_encoder": {
+            f"top_{RETRIEVE_K}_overlap": round(overlap, 4),
+            "top_1_agreement": round(top1, 4),
+            "query_vector_cosine": round(cosine, 5),
+        },
+        "cross_encoder": {
+            "spearman": round(spearman, 4),
+            f"top_{RERANK_TOP_K}_agreement": round(top_k_agreement, 4),
+            "logit_shift_mean": round(float(np.mean(diff)), 4),
+            "logit_shift_max_abs": round(float(np.max(np.abs(diff))), 4),
+            "decision_agreement": round(decision_agreement, 4),
+        },
+        "relevance_threshold": threshold,
+        "passed": bool(overlap >= MIN_RETRIEVAL_OVERLAP and spearman >= MIN_RERANK_SPEARMAN
+                       and top_k_agreement >= MIN_TOP_K_AGREEMENT and decision_agreement >= MIN_DECISION_AGREEMENT),
+    }
+
+
+def latency_report(bi_encoder, cross_encoder, metadata, repeats: int = 20) -> dict:
+    """
+    p50/p95 of one query encode and one RETRIEVE_K-pair re-rank, as in the app.
+    """
+    queries = load_queries()[:repeats]
+    documents = [metadata[i].get("kural_english_explanation", "") for i in range(RETRIEVE_K)]
+    bi_encoder.encode([QUERY_PREFIX + queries[0]])
+    cross_encoder.predict([(queries[0], documents[0])])
+    encode, rerank = [], []
+    for query in queries:
+        start = time.perf_counter()
+        bi_encoder.encode([QUERY_PREFIX + query])
+        encode.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        cross_encoder.predict([(query, d) for d in documents])
+        rerank.append(time.perf_counter() - start)
+    return {
+        "encode_p50_ms": percentile_ms(encode, 50),
+        "encode_p95_ms": percentile_ms(encode, 95),
+        "rerank_p50_ms": percentile_ms(rerank, 50),
+        "rerank_p95_ms": percentile_ms(rerank, 95),
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Export and validate an optimized inference backend.")
+    parser.add_argument("--backend", required=True, choices=[b for b in BACKENDS if b != "torch"])
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    backend = args.backend
+    os.makedirs(backend_dir(backend), exist_ok=True)
+    manifest_file = os.path.join(backend_dir(backend), BACKEND_MANIFEST_FILENAME)
+    if os.path.exists(manifest_file):
+        os.remove(manifest_file)
+
+    # --- 1. Export ---
+    if backend.startswith("onnx"):
+        print(f"Exporting {EMBEDDING_MODEL} and {RERANK_MODEL} to ONNX ({backend})...")
+        entries = export_onnx(backend)
+    else:
+        # torch-int8 quantizes the hub models at load time; nothing to export.
+        entries = {"bi_encoder": {"path": None}, "cross_encoder": {"path": None}}
+
+    def create(key, factory):
+        entry = entries[key]
+        if entry["path"] is None:
+            return factory(backend)
+        return factory(backend, os.path.join(backend_dir(backend), entry["path"]), entry["file_name"])
+
+    # --- 2. Load both variants, measuring load time and memory ---
+    embeddings = load_embedding_store()
+    metadata = load_metadata_store()
+    print("Loading float32 reference models...")
+    ref_bi, ref_bi_s, ref_bi_mb = load_measured(lambda: create_bi_encoder("torch"))
+    ref_ce, ref_ce_s, ref_ce_mb = load_measured(lambda: create_cross_encoder("torch"))
+    print(f"Loading {backend} models...")
+    bi, bi_s, bi_mb = load_measured(lambda: create("bi_encoder", create_bi_encoder))
+    ce, ce_s, ce_mb = load_measured(lambda: create("cross_encoder", create_cross_encoder))
+
+    # --- 3. Parity and threshold recalibration ---
+    print("Checking parity against float32...")
+    parity = parity_report(bi, ce, ref_bi, ref_ce, embeddings, metadata)
+
+    # --- 4. Latency ---
+    print("Measuring latency...")
+    latency = {"float32": latency_report(ref_bi, ref_ce, metadata), backend: latency_report(bi, ce, metadata)}
+    memory = {
+        "float32": {"load_seconds": round(ref_bi_s + ref_ce_s, 2), "rss_growth_mb": _sum_or_none(ref_bi_mb, ref_ce_mb)},
+        backend: {"load_seconds": round(bi_s + ce_s, 2), "rss_growth_mb": _sum_or_none(bi_mb, ce_mb)},
+    }
+    if backend.startswith("onnx"):
+        memory[backend]["disk_mb"] = directory_size_mb(backend_dir(backend))
+
+    manifest = {
+        "backend": backend,
+        "embedding_model": EMBEDDING_MODEL,
+        "rerank_model": RERANK_MODEL,
+        "onnx_quantization_config": ONNX_QUANTIZATION_CONFIG if backend == "onnx-int8" else None,
+        "bi_encoder": entries["bi_encoder"],
+        "cross_encoder": entries["cross_encoder"],
+        "float32_relevance_threshold": RELEVANCE_THRESHOLD,
+        "relevance_threshold": parity.pop("relevance_threshold"),
+        "parity_passed": parity.pop("passed"),
+        "parity": parity,
+        "latency": latency,
+        "memory": memory,
+    }
+    atomic_write_json(manifest_file, manifest)
+
+    print(f"\nParity ({parity['queries']} queries):")
+    for model_name in ("bi_encoder", "cross_encoder"):
+        for name, value in parity[model_name].items():
+            print(f"  {model_name:14s} {name:24s} {value}")
+    print(f"\nRELEVANCE_THRESHOLD: float32 {RELEVANCE_THRESHOLD} -> {backend} {manifest['relevance_threshold']}")
+    print(f"\n{'':10s} {'encode p50':>11s} {'rerank p50':>11s} {'load s':>7s} {'RSS MB':>7s}")
+    for name in ("float32", backend):
+        print(f"{name:10s} {latency[name]['encode_p50_ms']:9.2f}ms {latency[name]['rerank_p50_ms']:9.2f}ms "
+              f"{memory[name]['load_seconds']:7.2f} {memory[name]['rss_growth_mb']!s:>7s}")
+    print(f"\nManifest written to {manifest_file}")
+    if not manifest["parity_passed"]:
+        raise SystemExit(f"Parity check failed; the app will refuse INFERENCE_BACKEND={backend}.")
+    print(f"Parity check passed. Set INFERENCE_BACKEND={backend} to use it.")
+
+def _sum_or_none(a, b):
+    return round(a + b, 1) if a is not None and b is not None else None
+
+if __name__ == "__main__":
+    main()
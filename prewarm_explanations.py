@@ -0,0 +1,43 @@
+# prewarm_explanations.py
+# Offline pre-warming of the explanation cache: searches each popular query
+# and generates (and stores) the relevance explanation for every result, so
+# those page views never wait on the LLM.
+# Usage: python prewarm_explanations.py [queries_file]
+import sys
+import time
+from src.config import LLM_PROVIDER, LLM_PROVIDER_HUGGINGFACE
+from src.search_logic import load_search_artifacts, semantic_search_batch
+from src.llm_services import load_hf_model, load_explanation_cache, stream_explanations_concurrently
+
+DEFAULT_QUERIES_FILE = "data/popular_queries.txt"
+
+def main():
+    queries_file = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_QUERIES_FILE
+    with open(queries_file, 'r', encoding='utf-8') as f:
+        queries = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+    cache = load_explanation_cache()
+    if cache is None:
+        raise SystemExit("EXPLANATION_CACHE_DB is disabled; nothing to pre-warm.")
+
+    model, tokenizer = None, None
+    if LLM_PROVIDER == LLM_PROVIDER_HUGGINGFACE:
+        model, tokenizer = load_hf_model()
+
+    print(f"Searching {len(queries)} queries from {queries_file}...")
+    search_model, embeddings, metadata = load_search_artifacts()
+    all_results = semantic_search_batch(queries, search_model, embeddings, metadata)
+
+    start = time.perf_counter()
+    for n, (query, results) in enumerate(zip(queries, all_results), start=1):
+        explanations = [kural_data.get('kural_english_explanation', '') for kural_data in results]
+        kural_numbers = [kural_data.get('kural_no') for kural_data in results]
+        # Drain the stream; generated explanations are stored as they finish.
+        for _ in stream_explanations_concurrently(query, explanations, model, tokenizer, kural_numbers=kural_numbers):
+            pass
+        print(f"[{n}/{len(queries)}] {query!r}: {len(results)} results")
+
+    print(f"\nPre-warmed in {time.perf_counter() - start:.1f}s. Cache stats: {cache.stats()}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,332 @@
+# search_service.py
+# Headless HTTP/JSON service over the same search engine as app.py, for other
+# frontends and load tests. Standard library only (http.server).
+#
+#   POST /search   {"query": "...", "top_k": 3, "paals": ["Wealth"], "chapters": [39]}
+#   POST /chapters {"query": "...", "top_n": 5, "paals": ["Wealth"]}
+#   POST /related  {"kural_no": 42, "top_n": 5}
+#   POST /explain  {"query": "...", "kural_no": 42}  or  {"query": "...", "kural_numbers": [1, 2, 3]}
+#   GET  /health   status, micro-batcher and explanation job queue stats
+#   GET  /metrics  Prometheus text (with METRICS_ENABLED=true)
+#
+# Concurrent /search requests are micro-batched (see src/micro_batcher.py);
+# cached queries are answered without entering the batcher.
+# Usage: python search_service.py [--host HOST] [--port PORT]
+import argparse
+import json
+import logging
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from src import metrics
+from src.config import (
+    LLM_PROVIDER,
+    LLM_PROVIDER_HUGGINGFACE,
+    LLM_MAX_CONCURRENCY,
+    RERANK_TOP_K,
+    SERVICE_HOST,
+    SERVICE_PORT,
+    SERVICE_MAX_BATCH_SIZE,
+    SERVICE_MAX_WAIT_MS,
+    SERVICE_MAX_QUEUE,
+    SERVICE_REQUEST_TIMEOUT_SECONDS,
+    SERVICE_MAX_QUERY_CHARS,
+    SERVICE_MAX_TOP_K,
+    CHAPTER_SEARCH_TOP_N,
+    RELATED_KURALS_SHOWN,
+)
+from src.explanation_cache import is_cacheable
+from src.facet_index import FacetFilter
+from src.micro_batcher import MicroBatcher, QueueFullError
+from src.search_logic import (
+    load_search_artifacts,
+    start_model_warmup,
+    load_search_cache,
+    load_facets,
+    load_related_graph,
+    related_kurals,
+    search_config_fingerprint,
+    search_chapters,
+    search_indices_batch,
+)
+from src.llm_services import load_hf_model, get_explanation_queue, stream_explanations_concurrently
+
+MAX_BODY_BYTES = 16 * 1024
+
+
+class RequestError(Exception):
+    """
+    A client or capacity error, returned as {"error": message} with `status`.
+    """
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class SearchService:
+    """
+    The loaded models and artifacts plus the micro-batcher in front of them.
+    """
+
+    def __init__(self):
+        start_model_warmup((load_hf_model,) if LLM_PROVIDER == LLM_PROVIDER_HUGGINGFACE else ()).result()
+        self.model, self.embeddings, self.metadata = load_search_artifacts()
+        self.llm_model, self.tokenizer = load_hf_model() if LLM_PROVIDER == LLM_PROVIDER_HUGGINGFACE else (None, None)
+        self.cache = load_search_cache(search_config_fingerprint(self.embeddings))
+        self.rows_by_number = {int(n): row for row, n in enumerate(self.metadata.column("kural_no"))}
+        self.facets = load_facets()
+        self.related_graph = load_related_graph()
+        self.batcher = MicroBatcher(self._search_batch, SERVICE_MAX_BATCH_SIZE, SERVICE_MAX_WAIT_MS, SERVICE_MAX_QUEUE)
+        # Explanations are slow; beyond this many in flight, /explain waits
+        # (up to the request timeout) and then returns 503.
+        self.explain_slots = threading.BoundedSemaphore(max(1, LLM_MAX_CONCURRENCY))
+
+    def _search_batch(self, items: list) -> list:
+        """
+        One encode + one re-rank for every queued (query, top_k, filter).
+        Results for the largest top_k are truncated per request, which
+        matches running each request on its own.
+        """
+        metrics.increment("service_batches_total")
+        metrics.increment("service_batched_queries_total", len(items))
+        with metrics.span("service_batch"):
+            all_indices = search_indices_batch([query for query, _, _ in items], self.model, self.embeddings,
+                                               self.metadata, max(top_k for _, top_k, _ in items),
+                                               facet_filters=[facet_filter for _, _, facet_filter in items])
+        return [indices[:top_k] for indices, (_, top_k, _) in zip(all_indices, items)]
+
+    def _facet_filter(self, body: dict) -> FacetFilter:
+        paals, chapters = body.get("paals", []), body.get("chapters", [])
+        if (not isinstance(paals, list) or any(not isinstance(p, str) for p in paals)
+                or not isinstance(chapters, list) or any(not isinstance(c, int) for c in chapters)):
+            raise RequestError(400, "paals must be a list of Paal names and chapters a list of chapter numbers.")
+        facet_filter = FacetFilter.create(paals, chapters)
+        if facet_filter:
+            if self.facets is None:
+                raise RequestError(400, "Faceted search is not available: the facet index has not been built.")
+            try:
+                self.facets.chapter_positions(facet_filter)
+            except ValueError as e:
+                raise RequestError(400, str(e))
+        return facet_filter
+
+    def search(self, body: dict) -> dict:
+        query = _require_query(body)
+        top_k = body.get("top_k", RERANK_TOP_K)
+        if not isinstance(top_k, int) or not 1 <= top_k <= SERVICE_MAX_TOP_K:
+            raise RequestError(400, f"top_k must be an integer between 1 and {SERVICE_MAX_TOP_K}.")
+        facet_filter = self._facet_filter(body)
+
+        indices = self.cache.get(query, top_k, facet_filter.cache_token())
+        cached = indices is not None
+        if not cached:
+            try:
+                future = self.batcher.submit((query, top_k, facet_filter), timeout=SERVICE_REQUEST_TIMEOUT_SECONDS)
+            except QueueFullError as e:
+                raise RequestError(503, str(e))
+            try:
+                indices = future.result(timeout=SERVICE_REQUEST_TIMEOUT_SECONDS)
+            except (TimeoutError, FutureTimeoutError):
+                future.cancel()
+                raise RequestError(504, f"Search did not finish within {SERVICE_REQUEST_TIMEOUT_SECONDS:.0f}s.")
+            self.cache.put(query, top_k, indices, facet_filter.cache_token())
+        return {
+            "query": query,
+            "cached": cached,
+            "results": [self.metadata[i].to_dict() for i in indices],
+        }
+
+    def chapters(self, body: dict) -> dict:
+        query = _require_query(body)
+        if self.facets is None:
+            raise RequestError(400, "Chapter search is not available: the facet index has not been built.")
+        top_n = body.get("top_n", CHAPTER_SEARCH_TOP_N)
+        if not isinstance(top_n, int) or not 1 <= top_n <= len(self.facets.chapters):
+            raise RequestError(400, f"top_n must be an integer between 1 and {len(self.facets.chapters)}.")
+        facet_filter = self._facet_filter(body)
+        chapters = search_chapters(query, self.model, top_n, facet_filter)
+        return {
+            "query": query,
+            "chapters": [{key: chapter[key] for key in ("number", "name_english", "name_tamil", "paal", "score")}
+                         for chapter in chapters],
+        }
+
+    def related(self, body: dict) -> dict:
+        if self.related_graph is None:
+            raise RequestError(400, "Related kurals are not available: the neighbor graph has not been built.")
+        kural_no = body.get("kural_no")
+        if not isinstance(kural_no, int) or kural_no not in self.rows_by_number:
+            raise RequestError(400, "Give a valid kural_no.")
+        top_n = body.get("top_n", RELATED_KURALS_SHOWN)
+        if not isinstance(top_n, int) or not 1 <= top_n <= self.related_graph.k:
+            raise RequestError(400, f"top_n must be an integer between 1 and {self.related_graph.k}.")
+        return {
+            "kural_no": kural_no,
+            "related": [{**record.to_dict(), "score": score}
+                        for record, score in related_kurals(self.rows_by_number[kural_no], self.metadata, top_n)],
+        }
+
+    def explain(self, body: dict) -> dict:
+        query = _require_query(body)
+        kural_numbers = body.get("kural_numbers", [body.get("kural_no")])
+        if (not isinstance(kural_numbers, list) or not 1 <= len(kural_numbers) <= SERVICE_MAX_TOP_K
+                or any(not isinstance(n, int) or n not in self.rows_by_number for n in kural_numbers)):
+            raise RequestError(400, f"Give a valid kural_no, or up to {SERVICE_MAX_TOP_K} kural_numbers.")
+
+        # SERVICE_REQUEST_TIMEOUT_SECONDS bounds the whole request: waiting
+        # for a slot plus generating. Explanations unfinished by then come
+        # back as fallbacks, so a stalled provider can't hold the slot.
+        deadline = time.monotonic() + SERVICE_REQUEST_TIMEOUT_SECONDS
+        if not self.explain_slots.acquire(timeout=SERVICE_REQUEST_TIMEOUT_SECONDS):
+            raise RequestError(503, "All explanation slots are busy; try again later.")
+        try:
+            records = [self.metadata[self.rows_by_number[n]] for n in kural_numbers]
+            explanations = [None] * len(records)
+            for index, text, done in stream_explanations_concurrently(
+                    query, [r.get("kural_english_explanation", "") for r in records],
+                    self.llm_model, self.tokenizer, kural_numbers=kural_numbers,
+                    timeout=max(0.0, deadline - time.monotonic())):
+                if done:
+                    explanations[index] = text
+        finally:
+            self.explain_slots.release()
+        return {
+            "query": query,
+            "explanations": [
+                {"kural_no": n, "explanation": text, "fallback": not is_cacheable(text)}
+                for n, text in zip(kural_numbers, explanations)
+            ],
+        }
+
+    def health(self) -> dict:
+        return {"status": "ok", "llm_provider": LLM_PROVIDER, "batcher": self.batcher.stats(),
+                "explanation_jobs": get_explanation_queue().stats()}
+
+
+def _require_query(body: dict) -> str:
+    query = body.get("query")
+    if not isinstance(query, str) or not query.strip():
+        raise RequestError(400, "query must be a non-empty string.")
+    if len(query) > SERVICE_MAX_QUERY_CHARS:
+        raise RequestError(400, f"query is longer than {SERVICE_MAX_QUERY_CHARS} characters.")
+    return query
+
+
+class ServiceHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default listen backlog (5) drops connections under load before the
+    # micro-batcher's own backpressure can answer them with a 503.
+    request_queue_size = 1024
+
+
+def make_handler(service: SearchService):
+    routes = {
+        ("POST", "/search"): service.search,
+        ("POST", "/chapters"): service.chapters,
+        ("POST", "/related"): service.related,
+        ("POST", "/explain"): service.explain,
+        ("GET", "/health"): lambda body: service.health(),
+    }
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            if self.path.split("?")[0] == "/metrics":
+                self._send(200, metrics.REGISTRY.render_prometheus().encode("utf-8"),
+                           "text/plain; version=0.0.4; charset=utf-8")
+                return
+            self._dispatch("GET")
+
+        def do_POST(self):
+            self._dispatch("POST")
+
+        def _dispatch(self, method: str):
+            path = self.path.split("?")[0]
+            start = time.perf_counter()
+            status = 200
+            # Unread body bytes would be parsed as the next request on this
+            # keep-alive connection; _read_json clears this once it has read them.
+            self._body_pending = bool(self.headers.get("Content-Length"))
+            try:
+                route = routes.get((method, path))
+                if route is None:
+                    raise RequestError(404, f"No route for {method} {path}.")
+                payload = route(self._read_json() if method == "POST" else {})
+            except RequestError as e:
+                status, payload = e.status, {"error": str(e)}
+            except Exception as e:
+                logging.exception(f"{method} {path} failed")
+                status, payload = 500, {"error": f"Internal error: {e}"}
+            elapsed = time.perf_counter() - start
+            metrics.increment("service_requests_total", endpoint=path, status=str(status))
+            metrics.observe("service_request_duration_seconds", elapsed, endpoint=path)
+            if status == 200:
+                payload["took_ms"] = round(elapsed * 1000, 2)
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            headers = {"Retry-After": "1"} if status == 503 else {}
+            if self._body_pending:
+                headers["Connection"] = "close"
+                self.close_connection = True
+            self._send(status, body, "application/json; charset=utf-8", headers)
+
+        def _read_json(self) -> dict:
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+            except ValueError:
+                length = -1
+            if length < 0:
+                raise RequestError(400, "Content-Length must be a non-negative integer.")
+            if length > MAX_BODY_BYTES:
+                raise RequestError(413, f"Request body larger than {MAX_BODY_BYTES} bytes.")
+            raw = self.rfile.read(length)
+            self._body_pending = False
+            try:
+                body = json.loads(raw or b"{}")
+            except (ValueError, UnicodeDecodeError):
+                raise RequestError(400, "Request body is not valid JSON.")
+            if not isinstance(body, dict):
+                raise RequestError(400, "Request body must be a JSON object.")
+            return body
+
+        def _send(self, status: int, body: bytes, content_type: str, headers: dict = None):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logging.debug(format % args)
+
+    return Handler
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Headless Thirukkural search service.")
+    parser.add_argument("--host", default=SERVICE_HOST, help=f"Bind address (default {SERVICE_HOST}).")
+    parser.add_argument("--port", type=int, default=SERVICE_PORT, help=f"Port (default {SERVICE_PORT}).")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    print("Loading models and search artifacts...")
+    service = SearchService()
+    server = ServiceHTTPServer((args.host, args.port), make_handler(service))
+    print(f"Serving on http://{args.host}:{args.port} "
+          f"(batch <= {SERVICE_MAX_BATCH_SIZE}, wait <= {SERVICE_MAX_WAIT_MS:g} ms, queue <= {SERVICE_MAX_QUEUE})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+# src/artifact_io.py
+# Small helpers shared by the on-disk artifact formats in search_artifacts/.
+import hashlib
+import json
+import os
+import numpy as np
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def atomic_save_npy(file_path: str, array: np.ndarray):
+    """
+    Writes to a temporary file and renames it over the target, so readers
+    (and an interrupted build) never see a half-written array.
+    """
+    tmp_path = file_path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        np.save(f, array)
+    os.replace(tmp_path, file_path)
+
+
+def atomic_write_json(file_path: str, payload):
+    tmp_path = file_path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, indent=2)
+    os.replace(tmp_path, file_path)
@@ -10,8 +10,21 @@ APP_MODE = os.getenv("APP_MODE", "local")
 # Suggestion 2: Renamed from FAISS_PATH for clarity.
 DATA_PATH = "data/thirukkural_data.json"
 SEARCH_ARTIFACTS_PATH = "search_artifacts" 
-METADATA_FILE = os.path.join(SEARCH_ARTIFACTS_PATH, "kural_metadata.pkl")
-# Note: You will also need to update this path in embed_data.py and search_logic.py
+# Schema of the columnar metadata store; see src/metadata_store.py.
+METADATA_FILE = os.path.join(SEARCH_ARTIFACTS_PATH, "kural_metadata.json")
+# Describes the stored embedding vectors (model, shape, checksums); see src/embedding_store.py.
+EMBEDDING_MANIFEST_FILE = os.path.join(SEARCH_ARTIFACTS_PATH, "embedding_manifest.json")
+# Which stored variant the app memory-maps: "float32", "float16" or "int8".
+# embed_data.py always writes float32 and additionally writes this variant.
+EMBEDDING_STORE_DTYPE = os.getenv("EMBEDDING_STORE_DTYPE", "float32")
+
+# --- Corpus Embedding (embed_data.py) ---
+# Only documents whose content hash is new are re-embedded; these control how.
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+# >1 encodes on a sentence-transformers multi-process pool.
+EMBED_NUM_PROCESSES = int(os.getenv("EMBED_NUM_PROCESSES", "1"))
+# Documents encoded between checkpoints; an interrupted run resumes from the last one.
+EMBED_CHECKPOINT_EVERY = 256
 
 # --- Model Configuration ---
 # Bi-encoder used to embed both the corpus (embed_data.py) and the query
@@ -36,6 +49,125 @@ RERANK_TOP_K = 3
 # semantic connection scores >= -8, so -9.0 acts as a garbage gate that still
 # surfaces borderline matches. (Empirically calibrated — see plan.)
 RELEVANCE_THRESHOLD = -9.0
+# --- Inference Backend ---
+# "torch" runs both models in float32 PyTorch. "torch-int8", "onnx" and
+# "onnx-int8" are CPU-optimized alternatives; prepare one with
+# `python optimize_models.py --backend <name>`, which exports the models to
+# OPTIMIZED_MODELS_PATH, checks ranking parity against float32 and recalibrates
+# RELEVANCE_THRESHOLD for the backend's cross-encoder (see src/model_backends.py).
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch")
+OPTIMIZED_MODELS_PATH = os.getenv("OPTIMIZED_MODELS_PATH", "optimized_models")
+# Instruction set targeted by the ONNX int8 export: arm64, avx2, avx512 or avx512_vnni.
+ONNX_QUANTIZATION_CONFIG = os.getenv("ONNX_QUANTIZATION_CONFIG", "avx2")
+
+# --- Hybrid (lexical + dense) Retrieval ---
+# Stage 1 also runs BM25 over an inverted index built by embed_data.py (English
+# explanation, couplet, transliterations, Tamil lines, chapter names). Its top
+# LEXICAL_K hits are fused with the top RETRIEVE_K dense hits by reciprocal-rank
+# fusion, and the best RETRIEVE_K fused candidates go to the cross-encoder, so
+# exact-term queries no longer need a larger RETRIEVE_K.
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "true").lower() == "true"
+LEXICAL_INDEX_FILE = os.path.join(SEARCH_ARTIFACTS_PATH, "bm25_index.json")
+LEXICAL_K = 15
+RRF_K = 60
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# --- Faceted Search ---
+# Row ranges per Paal and per Adhikaram plus one centroid vector per chapter,
+# built by embed_data.py. A search filtered to some Paals or chapters only
+# scores the rows of those chapters.
+FACET_INDEX_FILE = os.path.join(SEARCH_ARTIFACTS_PATH, "facet_index.json")
+# Coarse-to-fine: when > 0, each query is first matched against the chapter
+# centroids and only the rows of its best COARSE_TO_FINE_CHAPTERS chapters
+# are scored by the bi-encoder (BM25 still covers the whole filter).
+COARSE_TO_FINE_CHAPTERS = int(os.getenv("COARSE_TO_FINE_CHAPTERS", "0"))
+# Chapters listed by the "find relevant chapters" mode.
+CHAPTER_SEARCH_TOP_N = 5
+
+# --- Related Kurals ---
+# embed_data.py stores each kural's NEIGHBOR_GRAPH_K nearest kurals by
+# embedding cosine. With NEIGHBOR_GRAPH_RERANK those neighbors are reordered
+# by the cross-encoder at build time (slow once; later runs only rescore pairs
+# touching changed kurals). The app shows the first RELATED_KURALS_SHOWN.
+NEIGHBOR_GRAPH_FILE = os.path.join(SEARCH_ARTIFACTS_PATH, "neighbor_graph.json")
+NEIGHBOR_GRAPH_K = 10
+NEIGHBOR_GRAPH_RERANK = os.getenv("NEIGHBOR_GRAPH_RERANK", "false").lower() == "true"
+RELATED_KURALS_SHOWN = 5
+
+# --- Adaptive Re-ranking Cascade ---
+# With ADAPTIVE_RERANK the cross-encoder only sees as many candidates as the
+# query needs instead of always RETRIEVE_K:
+#   - queries whose best bi-encoder cosine is below CASCADE_OFF_TOPIC_SIMILARITY
+#     return no results without any cross-encoder call;
+#   - candidates more than CASCADE_SIMILARITY_WINDOW below the best cosine are
+#     dropped (keeping at least CASCADE_MIN_CANDIDATES);
+#   - if the top RERANK_TOP_K lead the rest by CASCADE_DECISIVE_MARGIN, only
+#     they are scored (to apply the relevance threshold);
+#   - otherwise candidates are scored CASCADE_CHUNK_SIZE at a time, stopping
+#     once RERANK_TOP_K clear the threshold by CASCADE_STOP_MARGIN logits.
+# Calibrate with `python -m benchmarks.retrieval_benchmark`, which reports the
+# pairs per query and the quality delta against the fixed pipeline.
+ADAPTIVE_RERANK = os.getenv("ADAPTIVE_RERANK", "false").lower() == "true"
+# PLACEHOLDER, NOT CALIBRATED: bge-small cosines for off-topic queries usually
+# sit well above 0.30, so at this value the no-cross-encoder reject almost
+# never fires. Before turning on ADAPTIVE_RERANK, set it from the benchmark's
+# "Best bi-encoder cosine per query, by category" table: between the off_topic
+# max and the on_topic min, erring low (a false reject hides a real answer).
+CASCADE_OFF_TOPIC_SIMILARITY = float(os.getenv("CASCADE_OFF_TOPIC_SIMILARITY", "0.30"))
+CASCADE_SIMILARITY_WINDOW = 0.10
+CASCADE_MIN_CANDIDATES = 5
+CASCADE_DECISIVE_MARGIN = 0.08
+CASCADE_CHUNK_SIZE = 5
+CASCADE_STOP_MARGIN = 3.0
+
+# Batch sizes passed to the bi-encoder and cross-encoder. Only matter for
+# semantic_search_batch, where a whole evaluation set is sent in one call.
+ENCODE_BATCH_SIZE = 64
+RERANK_BATCH_SIZE = 128
+
+# --- Cache Configuration ---
+# Runtime caches (never committed) live under this directory.
+CACHE_PATH = os.getenv("CACHE_PATH", ".cache")
+# In-process LRU for search results, in front of a SQLite tier that survives
+# restarts. Entries are keyed on the models and thresholds above, so changing
+# any of them invalidates the cache automatically.
+SEARCH_CACHE_MAX_ENTRIES = 512
+SEARCH_CACHE_TTL_SECONDS = 6 * 60 * 60
+# Set SEARCH_CACHE_DB="" to keep only the in-process tier.
+SEARCH_CACHE_DB = os.getenv("SEARCH_CACHE_DB", os.path.join(CACHE_PATH, "search_cache.sqlite3"))
+# Persistent store for generated LLM explanations, keyed on provider, model,
+# prompt version, query and kural number. Least recently used entries are
+# evicted once the stored text exceeds the byte budget.
+# Set EXPLANATION_CACHE_DB="" to disable it.
+EXPLANATION_CACHE_DB = os.getenv("EXPLANATION_CACHE_DB", os.path.join(CACHE_PATH, "explanation_cache.sqlite3"))
+EXPLANATION_CACHE_MAX_BYTES = 50 * 1024 * 1024
+
+# --- Metrics / Tracing ---
+# Per-stage timings, cache counters and LLM latency histograms (src/metrics.py).
+# Off by default; when off the instrumentation is a no-op. When on, the app
+# shows a timing breakdown in the sidebar and exports Prometheus text to
+# METRICS_FILE after every search and/or on :METRICS_PORT/metrics.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "false").lower() == "true"
+METRICS_FILE = os.getenv("METRICS_FILE", os.path.join(CACHE_PATH, "metrics.prom"))
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+# Interface the /metrics server binds to; loopback unless a scraper on
+# another host needs it (e.g. "0.0.0.0").
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+
+# --- Headless Search Service (search_service.py) ---
+# Concurrent /search requests are gathered for up to SERVICE_MAX_WAIT_MS into
+# one batched encode + re-rank of at most SERVICE_MAX_BATCH_SIZE queries.
+# Beyond SERVICE_MAX_QUEUE waiting requests new ones are rejected with 503,
+# and a request not answered within SERVICE_REQUEST_TIMEOUT_SECONDS gets 504.
+SERVICE_HOST = os.getenv("SERVICE_HOST", "127.0.0.1")
+SERVICE_PORT = int(os.getenv("SERVICE_PORT", "8000"))
+SERVICE_MAX_BATCH_SIZE = int(os.getenv("SERVICE_MAX_BATCH_SIZE", "32"))
+SERVICE_MAX_WAIT_MS = float(os.getenv("SERVICE_MAX_WAIT_MS", "5"))
+SERVICE_MAX_QUEUE = int(os.getenv("SERVICE_MAX_QUEUE", "256"))
+SERVICE_REQUEST_TIMEOUT_SECONDS = float(os.getenv("SERVICE_REQUEST_TIMEOUT_SECONDS", "10"))
+SERVICE_MAX_QUERY_CHARS = 500
+SERVICE_MAX_TOP_K = 10
 
 # --- LLM Provider Switch ---
 # Suggestion 1: Implemented the "smart default" logic.
@@ -56,17 +188,65 @@ LLM_PROVIDER = os.getenv("LLM_PROVIDER", default_provider)
 
 # Configuration for Hugging Face model
 HF_MODEL_ID = "TinyLlama/TinyLlama-1.1B-Chat-v1.0"
+# Generation budget per explanation. Fast mode decodes greedily with a shorter
+# budget, trading some fluency for much lower latency on CPU-only hardware.
+HF_MAX_NEW_TOKENS = 150
+HF_FAST_MAX_NEW_TOKENS = 60
+HF_FAST_MODE = os.getenv("HF_FAST_MODE", "false").lower() == "true"
 
 # Configuration for Ollama model
 #OLLAMA_MODEL_ID = "phi3" # was "llama3"
 OLLAMA_MODEL_ID = "llama3" # was "phi3"
 
+# Where the Ollama server listens (the ollama library's own default).
+OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://127.0.0.1:11434")
+
 # Google Gemini (for Streamlit Cloud)
 # gemini-2.5-flash is a GA (generally available) model with a long support window,
 # so it won't be retired on short notice like the deprecated 1.5 series was.
 GEMINI_MODEL_ID = "gemini-2.5-flash"
 # This will read the API key from Streamlit's Secrets manager
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+# Leave unset for Google's endpoint; point it at a local fake server for testing.
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL")
+
+# --- Remote LLM Client Configuration (Ollama, Gemini) ---
+# Timeout for each HTTP request (connect, and each read while streaming).
+LLM_REQUEST_TIMEOUT_SECONDS = float(os.getenv("LLM_REQUEST_TIMEOUT_SECONDS", "30"))
+# Hard deadline for a whole explanation, including retries and streaming.
+LLM_CALL_DEADLINE_SECONDS = float(os.getenv("LLM_CALL_DEADLINE_SECONDS", "60"))
+# Connection errors, timeouts and 429/5xx responses are retried this many
+# times before any text has streamed, with exponential backoff from this base.
+LLM_MAX_RETRIES = 2
+LLM_RETRY_BACKOFF_SECONDS = 0.5
+# Process-wide cap on in-flight remote LLM calls, across all sessions.
+LLM_GLOBAL_CONCURRENCY = int(os.getenv("LLM_GLOBAL_CONCURRENCY", "8"))
+# After this many consecutive failures the provider is considered down and
+# calls return the fallback message immediately for the reset period.
+CIRCUIT_BREAKER_FAILURE_THRESHOLD = 3
+CIRCUIT_BREAKER_RESET_SECONDS = 30
+
+# Maximum number of explanations generated at the same time. Results are
+# explained concurrently and streamed into the page as tokens arrive.
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "3"))
+
+# --- Background Explanation Jobs ---
+# Explanations run on a process-wide worker pool rather than the Streamlit
+# script thread, so a rerun doesn't abandon or repeat them. Sessions asking
+# for the same (query, kural) share one job. The local Hugging Face model
+# always uses one worker, which batches every queued job for the same query.
+LLM_JOB_WORKERS = int(os.getenv("LLM_JOB_WORKERS", str(LLM_MAX_CONCURRENCY)))
+# Submissions beyond this many waiting jobs get the fallback message at once.
+LLM_JOB_MAX_QUEUE = int(os.getenv("LLM_JOB_MAX_QUEUE", "256"))
+# A running job with no session waiting on it for this long is cancelled
+# (long enough for a rerun to pick it up again); a queued one is dropped
+# as soon as a worker reaches it.
+LLM_JOB_CANCEL_GRACE_SECONDS = 5.0
+# Finished jobs are kept this long, so a rerun shows the result without the
+# explanation cache (e.g. when EXPLANATION_CACHE_DB is disabled).
+LLM_JOB_RETAIN_SECONDS = 60.0
+# How often a waiting page re-checks its jobs when no update arrives.
+LLM_JOB_POLL_SECONDS = 0.25
 
 # --- UI Text Configuration ---
 APP_TITLE = os.getenv("APP_TITLE", "There's a kural for that! - Thirukkural Semantic Search")
@@ -0,0 +1,221 @@
+# src/embedding_store.py
+# On-disk format for the corpus embeddings written by embed_data.py.
+#
+# Vectors are stored L2-normalized, so scoring a query is a plain dot product.
+# A JSON manifest records the model, shape and checksum of each stored variant
+# (float32, and optionally float16 or int8), and the loader memory-maps the
+# vectors so several Streamlit worker processes share one page-cache copy.
+import json
+import os
+import numpy as np
+from src.artifact_io import file_sha256, atomic_save_npy, atomic_write_json
+from src.config import (
+    EMBEDDING_MODEL,
+    SEARCH_ARTIFACTS_PATH,
+    EMBEDDING_MANIFEST_FILE,
+    EMBEDDING_STORE_DTYPE,
+)
+
+STORE_FORMAT_VERSION = 1
+SUPPORTED_DTYPES = ("float32", "float16", "int8")
+
+
+class EmbeddingStoreError(RuntimeError):
+    """
+    Raised when the stored embeddings are missing, corrupt, or were built for
+    a different model than the one configured.
+    """
+
+
+def l2_normalize(vectors: np.ndarray) -> np.ndarray:
+    """
+    Scales each row to unit length so a dot product equals cosine similarity.
+    Zero rows are left as zeros, matching sklearn's cosine_similarity.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+DOCUMENT_HASHES_FILENAME = "kural_doc_hashes.json"
+
+
+def _vectors_filename(dtype: str) -> str:
+    return f"kural_vectors.{dtype}.npy"
+
+
+def _scales_filename(dtype: str) -> str:
+    return f"kural_vectors.{dtype}_scales.npy"
+
+
+class EmbeddingStore:
+    """
+    Read-only view over the stored, L2-normalized corpus vectors.
+    For the int8 variant each row carries a float32 scale that maps the
+    quantized values back to the normalized vector.
+    """
+
+    def __init__(self, vectors: np.ndarray, scales: np.ndarray = None, manifest: dict = None):
+        self.vectors = vectors
+        self.scales = scales
+        self.manifest = manifest or {}
+
+    def __len__(self) -> int:
+        return self.vectors.shape[0]
+
+    @property
+    def dim(self) -> int:
+        return self.vectors.shape[1]
+
+    @property
+    def dtype(self) -> str:
+        return str(self.vectors.dtype)
+
+    def score(self, query_embeddings: np.ndarray, ranges: list = None) -> np.ndarray:
+        """
+        Cosine similarity between each query and every stored row, as a
+        (n_queries, n_rows) float32 array. Queries are normalized here; the
+        stored rows already are. With `ranges`, a list of [start, end) row
+        ranges, only those rows are scored and the columns follow them in
+        order.
+        """
+        queries = l2_normalize(query_embeddings)
+        if ranges is None:
+            ranges = [(0, len(self))]
+        blocks = []
+        for start, end in ranges:
+            block = queries @ self.vectors[start:end].T.astype(np.float32, copy=False)
+            if self.scales is not None:
+                block *= self.scales[start:end]
+            blocks.append(block)
+        return blocks[0] if len(blocks) == 1 else np.concatenate(blocks, axis=1)
+
+
+def _quantize_int8(vectors: np.ndarray):
+    """
+    Symmetric per-row int8 quantization: row * scale ~= original row.
+    """
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    quantized = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return quantized, scales.astype(np.float32)
+
+
+def save_embedding_store(embeddings: np.ndarray, model_name: str = EMBEDDING_MODEL,
+                         dtypes=("float32",), path: str = SEARCH_ARTIFACTS_PATH,
+                         document_hashes: list = None) -> dict:
+    """
+    Normalizes `embeddings` and writes one file per requested dtype plus the
+    manifest describing them. `document_hashes` (one content hash per row)
+    lets the next build re-embed only the rows that changed.
+    Every file is written atomically and the manifest last, so an interrupted
+    write leaves either the old store or a checksum mismatch, never silently
+    mixed vectors. Returns the manifest.
+    """
+    vectors = l2_normalize(embeddings)
+    os.makedirs(path, exist_ok=True)
+
+    variants = {}
+    for dtype in dict.fromkeys(dtypes):
+        if dtype not in SUPPORTED_DTYPES:
+            raise ValueError(f"Unsupported embedding dtype '{dtype}'. Choose from {SUPPORTED_DTYPES}.")
+        variant = {"file": _vectors_filename(dtype)}
+        if dtype == "int8":
+            stored, scales = _quantize_int8(vectors)
+            variant["scales_file"] = _scales_filename(dtype)
+            atomic_save_npy(os.path.join(path, variant["scales_file"]), scales)
+            variant["scales_sha256"] = file_sha256(os.path.join(path, variant["scales_file"]))
+        else:
+            stored = vectors.astype(dtype)
+        atomic_save_npy(os.path.join(path, variant["file"]), stored)
+        variant["sha256"] = file_sha256(os.path.join(path, variant["file"]))
+        variants[dtype] = variant
+
+    manifest = {
+        "format_version": STORE_FORMAT_VERSION,
+        "model": model_name,
+        "dim": int(vectors.shape[1]),
+        "rows": int(vectors.shape[0]),
+        "normalized": True,
+        "variants": variants,
+    }
+    if document_hashes is not None:
+        if len(document_hashes) != manifest["rows"]:
+            raise ValueError(f"Got {len(document_hashes)} document hashes for {manifest['rows']} rows.")
+        atomic_write_json(os.path.join(path, DOCUMENT_HASHES_FILENAME), list(document_hashes))
+        manifest["document_hashes_file"] = DOCUMENT_HASHES_FILENAME
+    atomic_write_json(os.path.join(path, os.path.basename(EMBEDDING_MANIFEST_FILE)), manifest)
+    return manifest
+
+
+def read_manifest(path: str = SEARCH_ARTIFACTS_PATH) -> dict:
+    manifest_file = os.path.join(path, os.path.basename(EMBEDDING_MANIFEST_FILE))
+    if not os.path.exists(manifest_file):
+        raise EmbeddingStoreError(
+            f"No embedding manifest at {manifest_file}. Run `python embed_data.py` to build the search artifacts."
+        )
+    with open(manifest_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def load_embedding_store(dtype: str = EMBEDDING_STORE_DTYPE, expected_model: str = EMBEDDING_MODEL,
+                         path: str = SEARCH_ARTIFACTS_PATH, verify_checksum: bool = True) -> EmbeddingStore:
+    """
+    Memory-maps the requested variant after checking it against the manifest.
+    Fails fast if the artifacts were built with a different embedding model,
+    since scoring queries from one model against another's vectors silently
+    returns meaningless rankings.
+    """
+    manifest = read_manifest(path)
+    if manifest.get("format_version") != STORE_FORMAT_VERSION:
+        raise EmbeddingStoreError(
+            f"Embedding store format {manifest.get('format_version')} is not supported "
+            f"(expected {STORE_FORMAT_VERSION}). Re-run `python embed_data.py`."
+        )
+    if manifest.get("model") != expected_model:
+        raise EmbeddingStoreError(
+            f"Search artifacts were built with '{manifest.get('model')}' but EMBEDDING_MODEL is "
+            f"'{expected_model}'. Re-run `python embed_data.py`."
+        )
+    variant = manifest["variants"].get(dtype)
+    if variant is None:
+        raise EmbeddingStoreError(
+            f"No '{dtype}' embeddings in the manifest (available: {sorted(manifest['variants'])}). "
+            f"Set EMBEDDING_STORE_DTYPE='{dtype}' and re-run `python embed_data.py`."
+        )
+
+    def _open(filename, sha256):
+        file_path = os.path.join(path, filename)
+        if verify_checksum and file_sha256(file_path) != sha256:
+            raise EmbeddingStoreError(f"Checksum mismatch for {file_path}. Re-run `python embed_data.py`.")
+        return np.load(file_path, mmap_mode='r')
+
+    vectors = _open(variant["file"], variant["sha256"])
+    if vectors.shape != (manifest["rows"], manifest["dim"]):
+        raise EmbeddingStoreError(
+            f"{variant['file']} has shape {vectors.shape}, manifest says ({manifest['rows']}, {manifest['dim']})."
+        )
+    scales = None
+    if "scales_file" in variant:
+        scales = np.asarray(_open(variant["scales_file"], variant["scales_sha256"]))
+    return EmbeddingStore(vectors, scales, manifest)
+
+
+def load_reusable_vectors(model_name: str = EMBEDDING_MODEL, path: str = SEARCH_ARTIFACTS_PATH) -> dict:
+    """
+    Maps document hash -> stored float32 vector from the current store, for
+    incremental rebuilds. Returns {} when there is nothing safe to reuse: no
+    store, a different model, or a store written without document hashes.
+    """
+    try:
+        store = load_embedding_store("float32", expected_model=model_name, path=path)
+    except EmbeddingStoreError:
+        return {}
+    hashes_file = store.manifest.get("document_hashes_file")
+    if not hashes_file:
+        return {}
+    with open(os.path.join(path, hashes_file), 'r', encoding='utf-8') as f:
+        document_hashes = json.load(f)
+    vectors = np.asarray(store.vectors)
+    return {doc_hash: vectors[row] for row, doc_hash in enumerate(document_hashes)}
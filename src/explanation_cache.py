@@ -0,0 +1,113 @@
+# src/explanation_cache.py
+# Durable store for LLM relevance explanations, the most expensive output the
+# app produces (and, with Gemini, one that costs money per call).
+#
+# Entries are keyed on (provider, model ID, prompt version, normalized query,
+# kural number) and kept in SQLite. When the stored text exceeds max_bytes the
+# least recently used entries are evicted. Fallback/error messages are never
+# stored, so a transient outage can't poison the cache.
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from src.search_cache import normalize_query
+
+# Prefixes of the messages get_relevance_explanation returns instead of a
+# real explanation. A stream cut off mid-way ends with the fallback message
+# after its partial text, so that is rejected wherever it appears.
+UNCACHEABLE_PREFIXES = ("Explanation not available", "Error:")
+FALLBACK_MARKER = "Explanation not available"
+
+
+def is_cacheable(explanation: str) -> bool:
+    text = (explanation or "").strip()
+    return bool(text) and not text.startswith(UNCACHEABLE_PREFIXES) and FALLBACK_MARKER not in text
+
+
+class ExplanationCache:
+    """
+    Thread-safe SQLite cache with size-based LRU eviction.
+    """
+
+    def __init__(self, db_path: str, max_bytes: int = 50 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "stores": 0, "rejected": 0, "evictions": 0}
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS explanations ("
+            " key TEXT PRIMARY KEY, provider TEXT NOT NULL, model_id TEXT NOT NULL,"
+            " prompt_version TEXT NOT NULL, query TEXT NOT NULL, kural_no INTEGER NOT NULL,"
+            " explanation TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS explanations_last_access ON explanations (last_access)")
+        self._db.commit()
+
+    @staticmethod
+    def make_key(provider: str, model_id: str, prompt_version: str, query: str, kural_no: int) -> str:
+        raw = "\x1f".join([provider, model_id, str(prompt_version), normalize_query(query), str(kural_no)])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, provider: str, model_id: str, prompt_version: str, query: str, kural_no: int):
+        """
+        Returns the stored explanation, or None on a miss.
+        """
+        key = self.make_key(provider, model_id, prompt_version, query, kural_no)
+        with self._lock:
+            row = self._db.execute("SELECT explanation FROM explanations WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self._counters["misses"] += 1
+                return None
+            self._db.execute("UPDATE explanations SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+            self._counters["hits"] += 1
+            return row[0]
+
+    def put(self, provider: str, model_id: str, prompt_version: str, query: str, kural_no: int, explanation: str) -> bool:
+        """
+        Stores a generated explanation. Fallback messages are rejected.
+        Returns whether the explanation was stored.
+        """
+        if not is_cacheable(explanation):
+            with self._lock:
+                self._counters["rejected"] += 1
+            return False
+        key = self.make_key(provider, model_id, prompt_version, query, kural_no)
+        size = len(explanation.encode("utf-8"))
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO explanations"
+                " (key, provider, model_id, prompt_version, query, kural_no, explanation, size, last_access)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, provider, model_id, str(prompt_version), normalize_query(query), int(kural_no),
+                 explanation, size, time.time()),
+            )
+            self._counters["stores"] += 1
+            self._evict()
+            self._db.commit()
+        return True
+
+    def _evict(self):
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM explanations").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Evict down to 90% of the budget so we don't evict on every put.
+        target = self.max_bytes * 0.9
+        doomed = []
+        for key, size in self._db.execute("SELECT key, size FROM explanations ORDER BY last_access"):
+            if total <= target:
+                break
+            doomed.append((key,))
+            total -= size
+        self._db.executemany("DELETE FROM explanations WHERE key = ?", doomed)
+        self._counters["evictions"] += len(doomed)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters)
+            entries, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM explanations").fetchone()
+        stats["entries"] = entries
+        stats["bytes"] = size
+        return stats
@@ -0,0 +1,201 @@
+# src/facet_index.py
+# Precomputed partitions of the corpus by Paal (book) and Adhikaram (chapter)
+# for faceted search, plus a coarse index of one centroid vector per chapter.
+#
+# Kurals are stored in order, so every chapter (and every Paal) is one
+# contiguous [start, end) range of metadata rows; a filtered search scores
+# only the rows of the selected chapters instead of post-filtering the whole
+# corpus. The chapter centroids back the "find relevant chapters" mode and
+# the optional coarse-to-fine search (COARSE_TO_FINE_CHAPTERS).
+#
+# Layout (written by embed_data.py):
+#   facet_index.json            paals and chapters with their row ranges, checksums
+#   facet_index.centroids.npy   float32 (n_chapters, dim) L2-normalized chapter centroids
+import json
+import os
+from typing import NamedTuple
+import numpy as np
+from src.artifact_io import file_sha256, atomic_save_npy, atomic_write_json
+from src.config import FACET_INDEX_FILE
+from src.embedding_store import l2_normalize
+
+FACET_INDEX_FORMAT_VERSION = 1
+
+
+class FacetIndexError(RuntimeError):
+    """
+    Raised when the facet index is missing, corrupt, or was built from
+    different embeddings than the ones loaded.
+    """
+
+
+class FacetFilter(NamedTuple):
+    """
+    Restricts a search to some Paals (by English name, e.g. "Wealth") and/or
+    some chapters (by Adhikaram number, 1-133). Values within a facet are
+    OR-ed; the two facets are AND-ed. An empty filter matches everything.
+    """
+    paals: tuple = ()
+    chapters: tuple = ()
+
+    @classmethod
+    def create(cls, paals=None, chapters=None) -> "FacetFilter":
+        return cls(tuple(sorted(set(paals or ()))), tuple(sorted({int(c) for c in chapters or ()})))
+
+    def cache_token(self) -> str:
+        """
+        Stable text form for result-cache keys ("" for no filter).
+        """
+        if not self:
+            return ""
+        return f"paals={','.join(self.paals)};chapters={','.join(map(str, self.chapters))}"
+
+    def __bool__(self) -> bool:
+        return bool(self.paals or self.chapters)
+
+
+class FacetIndex:
+    """
+    Paal and chapter row ranges with the chapter centroids. `paals` and
+    `chapters` are lists of dicts; chapter i (0-based) is Adhikaram i + 1.
+    """
+
+    def __init__(self, paals: list, chapters: list, centroids: np.ndarray, manifest: dict = None):
+        self.paals = paals
+        self.chapters = chapters
+        self.centroids = centroids
+        self.manifest = manifest or {}
+        self._paal_names = {paal["name_english"] for paal in paals}
+
+    def chapter_positions(self, facet_filter: FacetFilter = None) -> list:
+        """
+        Indices into `chapters` allowed by the filter, in corpus order.
+        Raises ValueError for an unknown Paal name or chapter number.
+        """
+        if not facet_filter:
+            return list(range(len(self.chapters)))
+        unknown = [name for name in facet_filter.paals if name not in self._paal_names]
+        if unknown:
+            raise ValueError(f"Unknown Paal {', '.join(unknown)}; expected one of {', '.join(sorted(self._paal_names))}.")
+        out_of_range = [number for number in facet_filter.chapters if not 1 <= number <= len(self.chapters)]
+        if out_of_range:
+            raise ValueError(f"Chapter numbers must be between 1 and {len(self.chapters)}.")
+        return [
+            position for position, chapter in enumerate(self.chapters)
+            if (not facet_filter.paals or chapter["paal"] in facet_filter.paals)
+            and (not facet_filter.chapters or chapter["number"] in facet_filter.chapters)
+        ]
+
+    def row_ranges(self, positions: list) -> list:
+        """
+        Merged [start, end) row ranges covering the given chapters.
+        """
+        ranges = []
+        for position in sorted(positions):
+            start, end = self.chapters[position]["start"], self.chapters[position]["end"]
+            if ranges and ranges[-1][1] == start:
+                ranges[-1] = (ranges[-1][0], end)
+            else:
+                ranges.append((start, end))
+        return ranges
+
+    def rank_chapters(self, query_embeddings: np.ndarray, positions: list = None) -> list:
+        """
+        Per query, (chapter position, cosine similarity to the centroid)
+        pairs over the allowed chapters, best first.
+        """
+        positions = np.arange(len(self.chapters)) if positions is None else np.asarray(positions, dtype=np.int64)
+        if len(positions) == 0:
+            return [[] for _ in query_embeddings]
+        scores = l2_normalize(query_embeddings) @ np.asarray(self.centroids)[positions].T
+        order = np.argsort(-scores, axis=1, kind="stable")
+        return [[(int(positions[j]), float(row_scores[j])) for j in row_order]
+                for row_scores, row_order in zip(scores, order)]
+
+
+def _contiguous_runs(values: list) -> list:
+    """
+    (value, start, end) for each run of equal consecutive values.
+    """
+    runs = []
+    for row, value in enumerate(values):
+        if runs and runs[-1][0] == value:
+            runs[-1][2] = row + 1
+        else:
+            runs.append([value, row, row + 1])
+    return [tuple(run) for run in runs]
+
+
+def build_facet_index(metadata, vectors: np.ndarray) -> FacetIndex:
+    """
+    Derives the Paal and chapter ranges from the metadata rows (dicts or a
+    MetadataStore) and the chapter centroids from the corpus vectors, as the
+    normalized mean of each chapter's normalized rows. Fails if a Paal or
+    chapter is split across the corpus, since the ranges assume kural order.
+    """
+    paal_names = [(row.get("paal_translation_english"), row.get("paal_name_tamil")) for row in metadata]
+    chapter_names = [(row.get("adhikaram_translation_english"), row.get("adhikaram_name_tamil"),
+                      row.get("paal_translation_english")) for row in metadata]
+    paal_runs = _contiguous_runs(paal_names)
+    chapter_runs = _contiguous_runs(chapter_names)
+    if len({name for name, _, _ in paal_runs}) != len(paal_runs):
+        raise FacetIndexError("A Paal is split across the corpus; rows must be in kural order.")
+    # Two chapters can share an English name, so they are told apart by the
+    # (English, Tamil) pair and numbered in corpus order.
+    if len({name for name, _, _ in chapter_runs}) != len(chapter_runs):
+        raise FacetIndexError("A chapter is split across the corpus; rows must be in kural order.")
+
+    paals = [{"name_english": english, "name_tamil": tamil, "start": start, "end": end}
+             for (english, tamil), start, end in paal_runs]
+    chapters = [{"number": number, "name_english": english, "name_tamil": tamil, "paal": paal, "start": start, "end": end}
+                for number, ((english, tamil, paal), start, end) in enumerate(chapter_runs, start=1)]
+    vectors = l2_normalize(vectors)
+    centroids = l2_normalize(np.stack([vectors[c["start"]:c["end"]].mean(axis=0) for c in chapters]))
+    return FacetIndex(paals, chapters, centroids)
+
+
+def _centroids_file(index_file: str) -> str:
+    base = index_file[:-len(".json")] if index_file.endswith(".json") else index_file
+    return base + ".centroids.npy"
+
+
+def save_facet_index(index: FacetIndex, embeddings_sha256: str, index_file: str = FACET_INDEX_FILE) -> dict:
+    """
+    Writes the centroids and then the JSON manifest, which records the
+    checksum of the embeddings the centroids were computed from.
+    """
+    centroids_file = _centroids_file(index_file)
+    os.makedirs(os.path.dirname(index_file) or ".", exist_ok=True)
+    atomic_save_npy(centroids_file, np.asarray(index.centroids, dtype=np.float32))
+    manifest = {
+        "format_version": FACET_INDEX_FORMAT_VERSION,
+        "embeddings_sha256": embeddings_sha256,
+        "paals": index.paals,
+        "chapters": index.chapters,
+        "centroids": {"file": os.path.basename(centroids_file), "sha256": file_sha256(centroids_file)},
+    }
+    atomic_write_json(index_file, manifest)
+    return manifest
+
+
+def load_facet_index(embeddings_sha256: str, index_file: str = FACET_INDEX_FILE) -> FacetIndex:
+    """
+    Loads the facet index, checking it was built from the embeddings with
+    the given float32 checksum.
+    """
+    if not os.path.exists(index_file):
+        raise FacetIndexError(
+            f"No facet index at {index_file}. Run `python embed_data.py` to build the search artifacts."
+        )
+    with open(index_file, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") != FACET_INDEX_FORMAT_VERSION:
+        raise FacetIndexError(f"Facet index at {index_file} is out of date. Re-run `python embed_data.py`.")
+    if manifest.get("embeddings_sha256") != embeddings_sha256:
+        raise FacetIndexError(
+            f"Facet index at {index_file} was built from different embeddings. Re-run `python embed_data.py`."
+        )
+    centroids_file = os.path.join(os.path.dirname(index_file), manifest["centroids"]["file"])
+    if file_sha256(centroids_file) != manifest["centroids"]["sha256"]:
+        raise FacetIndexError(f"Checksum mismatch for {centroids_file}. Re-run `python embed_data.py`.")
+    return FacetIndex(manifest["paals"], manifest["chapters"], np.load(centroids_file), manifest)
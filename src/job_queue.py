@@ -0,0 +1,269 @@
+# src/job_queue.py
+# Process-wide background job queue for slow work (LLM explanations) that has
+# to outlive a Streamlit script run. Any widget interaction reruns app.py from
+# the top; work done on the script thread is then abandoned or repeated.
+# Here jobs run on the queue's own worker threads and callers only subscribe:
+#   - jobs are keyed, so concurrent requests for the same key share one job;
+#   - subscribers pass a threading.Event that is set on every update, and
+#     poll the job's snapshot instead of blocking on the work itself;
+#   - a job nobody is waiting for is cancelled: at once if it hasn't started,
+#     or between chunks once it has had no subscriber for the grace period
+#     (long enough for a rerun to re-subscribe).
+import logging
+import threading
+import time
+from collections import deque
+from src import metrics
+from src.micro_batcher import QueueFullError
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+
+
+class Job:
+    """
+    One unit of work and its progress. The runner reports progress with
+    update(text) and ends the job with finish(result); subscribers read
+    snapshot().
+    """
+
+    def __init__(self, key: str, payload, cancel_grace_seconds: float):
+        self.key = key
+        self.payload = payload
+        self.state = QUEUED
+        self.text = ""
+        self.result = None
+        self.error = None
+        self.submitted_at = time.monotonic()
+        self.started_at = None
+        self.finished_at = None
+        self._cancel_grace_seconds = cancel_grace_seconds
+        self._listeners = set()
+        self._released_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def done(self) -> bool:
+        return self.state in (DONE, FAILED, CANCELLED)
+
+    @property
+    def wait_seconds(self) -> float:
+        """
+        Time spent queued (so far, if the job hasn't started).
+        """
+        return (self.started_at or time.monotonic()) - self.submitted_at
+
+    def snapshot(self):
+        """
+        (text so far, done); once done, the text is the final result.
+        """
+        with self._lock:
+            return (self.result if self.done else self.text), self.done
+
+    def update(self, text: str):
+        with self._lock:
+            self.text = text
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener.set()
+
+    def finish(self, result, state: str = DONE, error: str = None):
+        with self._lock:
+            if self.done:
+                return
+            self.result, self.state, self.error = result, state, error
+            self.finished_at = time.monotonic()
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener.set()
+
+    def cancel_if_abandoned(self) -> bool:
+        """
+        Cancels the job if no subscriber has waited on it for the grace
+        period. Runners call this between chunks and stop when it is True.
+        """
+        with self._lock:
+            if self.done:
+                return self.state == CANCELLED
+            if self._listeners or self._released_at is None:
+                return False
+            if time.monotonic() - self._released_at < self._cancel_grace_seconds:
+                return False
+            self.state, self.finished_at = CANCELLED, time.monotonic()
+            return True
+
+    def _subscribe(self, listener: threading.Event) -> bool:
+        with self._lock:
+            if self.state in (FAILED, CANCELLED):
+                return False
+            self._listeners.add(listener)
+            self._released_at = None
+        listener.set()
+        return True
+
+    def _unsubscribe(self, listener: threading.Event):
+        with self._lock:
+            self._listeners.discard(listener)
+            if not self._listeners:
+                self._released_at = time.monotonic()
+
+    def _start_if_wanted(self) -> bool:
+        with self._lock:
+            if not self._listeners:
+                self.state, self.finished_at = CANCELLED, time.monotonic()
+                return False
+            self.state, self.started_at = RUNNING, time.monotonic()
+            return True
+
+
+class JobQueue:
+    """
+    FIFO queue served by `workers` threads. run(jobs) receives one job, or,
+    with `batch_key`, the oldest job plus every queued job with the same
+    batch key; it must update()/finish() each job it is given. Finished jobs
+    are kept for `retain_seconds` so a rerun can pick up their result.
+    """
+
+    def __init__(self, run, workers: int = 1, max_queue: int = 256, batch_key=None,
+                 cancel_grace_seconds: float = 5.0, retain_seconds: float = 60.0, name: str = "jobs"):
+        self.run = run
+        self.max_queue = max_queue
+        self.batch_key = batch_key
+        self.cancel_grace_seconds = cancel_grace_seconds
+        self.retain_seconds = retain_seconds
+        self.name = name
+        self._queue = deque()
+        self._jobs = {}
+        self._running = 0
+        self._condition = threading.Condition()
+        self._counters = {"submitted": 0, "shared": 0, "rejected": 0, "completed": 0, "failed": 0, "cancelled": 0}
+        self._total_wait = 0.0
+        self._started = 0
+        for i in range(max(1, workers)):
+            threading.Thread(target=self._run_worker, name=f"{name}-{i}", daemon=True).start()
+
+    @property
+    def depth(self) -> int:
+        with self._condition:
+            return len(self._queue)
+
+    def stats(self) -> dict:
+        with self._condition:
+            stats = dict(self._counters)
+            stats["queue_depth"] = len(self._queue)
+            stats["running"] = self._running
+            stats["mean_wait_seconds"] = self._total_wait / self._started if self._started else 0.0
+        return stats
+
+    def submit(self, key: str, payload, listener: threading.Event) -> Job:
+        """
+        Subscribes `listener` to the job for `key`, queuing a new job with
+        `payload` unless one is already queued, running or recently done.
+        Raises QueueFullError when max_queue jobs are already waiting.
+        """
+        return self.submit_many([(key, payload)], listener)[0]
+
+    def submit_many(self, items: list, listener: threading.Event) -> list:
+        """
+        submit() for several (key, payload) pairs at once, so a worker sees
+        them all queued together (and can batch them). Either every item is
+        accepted or QueueFullError is raised and none is.
+        """
+        with self._condition:
+            self._forget_finished()
+            jobs = [None] * len(items)
+            new = []
+            for i, (key, _) in enumerate(items):
+                job = self._jobs.get(key)
+                if job is not None and job._subscribe(listener):
+                    jobs[i] = job
+                elif key not in (items[j][0] for j in new):
+                    new.append(i)
+            if new and len(self._queue) + len(new) > self.max_queue:
+                for job in jobs:
+                    if job is not None:
+                        job._unsubscribe(listener)
+                self._counters["rejected"] += len(items)
+                metrics.increment("job_requests_total", len(items), queue=self.name, result="rejected")
+                raise QueueFullError(f"Job queue '{self.name}' is full ({self.max_queue} waiting).")
+            for i in new:
+                key, payload = items[i]
+                job = jobs[i] = self._jobs[key] = Job(key, payload, self.cancel_grace_seconds)
+                job._subscribe(listener)
+                self._queue.append(job)
+            # Repeated keys within `items` share the job created for the first.
+            for i, (key, _) in enumerate(items):
+                jobs[i] = jobs[i] or self._jobs[key]
+            self._counters["submitted"] += len(new)
+            self._counters["shared"] += len(items) - len(new)
+            if new:
+                metrics.increment("job_requests_total", len(new), queue=self.name, result="new")
+                self._publish_gauges()
+                self._condition.notify(len(new))
+            if len(items) > len(new):
+                metrics.increment("job_requests_total", len(items) - len(new), queue=self.name, result="shared")
+        return jobs
+
+    def release(self, job: Job, listener: threading.Event):
+        """
+        The subscriber stopped waiting (finished, or its script run ended).
+        """
+        job._unsubscribe(listener)
+
+    def _forget_finished(self):
+        now = time.monotonic()
+        expired = [key for key, job in self._jobs.items()
+                   if job.state in (FAILED, CANCELLED) or (job.done and now - job.finished_at > self.retain_seconds)]
+        for key in expired:
+            del self._jobs[key]
+
+    def _publish_gauges(self):
+        metrics.set_gauge("job_queue_depth", len(self._queue), queue=self.name)
+        metrics.set_gauge("jobs_running", self._running, queue=self.name)
+
+    def _take_batch(self) -> list:
+        with self._condition:
+            while not self._queue:
+                self._condition.wait()
+            batch = [self._queue.popleft()]
+            if self.batch_key is not None:
+                key = self.batch_key(batch[0].payload)
+                batch += [job for job in self._queue if self.batch_key(job.payload) == key]
+                for job in batch[1:]:
+                    self._queue.remove(job)
+            live = []
+            for job in batch:
+                if job._start_if_wanted():
+                    live.append(job)
+                    self._started += 1
+                    self._total_wait += job.wait_seconds
+                    metrics.observe("job_wait_seconds", job.wait_seconds, queue=self.name)
+                else:
+                    self._count_outcome(CANCELLED)
+            self._running += len(live)
+            self._publish_gauges()
+            return live
+
+    def _count_outcome(self, state: str):
+        outcome = {DONE: "completed", FAILED: "failed", CANCELLED: "cancelled"}[state]
+        self._counters[outcome] += 1
+        metrics.increment("jobs_total", queue=self.name, outcome=outcome)
+
+    def _run_worker(self):
+        while True:
+            jobs = self._take_batch()
+            if not jobs:
+                continue
+            try:
+                self.run(jobs)
+            except Exception as e:
+                logging.exception(f"Job batch of {len(jobs)} in '{self.name}' failed")
+                for job in jobs:
+                    job.finish(None, FAILED, str(e))
+            for job in jobs:
+                # A runner that returned without finishing a job has nothing more to give.
+                job.finish(job.text)
+            with self._condition:
+                self._running -= len(jobs)
+                for job in jobs:
+                    self._count_outcome(job.state)
+                self._publish_gauges()
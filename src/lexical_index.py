@@ -0,0 +1,253 @@
+# src/lexical_index.py
+# Prebuilt BM25 inverted index over the lexical fields of each kural (English
+# explanation, couplet, transliterations, Tamil lines, chapter names), plus the
+# exact kural-number / exact-phrase fast paths that skip the models entirely.
+#
+# Layout (written by embed_data.py, memory-mapped on load):
+#   bm25_index.json          parameters, vocabulary, checksums
+#   bm25_index.indptr.npy    int64 (V + 1): postings of term t are [indptr[t], indptr[t + 1])
+#   bm25_index.doc_ids.npy   int32 row index of each posting
+#   bm25_index.tfs.npy       uint16 term frequency of each posting
+#   bm25_index.doc_lengths.npy  float32 tokens per document
+import json
+import os
+import re
+import unicodedata
+from collections import Counter
+import numpy as np
+from src.artifact_io import file_sha256, atomic_save_npy, atomic_write_json
+from src.config import LEXICAL_INDEX_FILE, BM25_K1, BM25_B
+
+LEXICAL_INDEX_FORMAT_VERSION = 1
+
+# Fields indexed for BM25. Chapter names are included so chapter-name queries
+# hit, but they are excluded from the exact-match fast path (a theme query
+# like "friendship" is also a chapter name and should still be ranked).
+LEXICAL_FIELDS = (
+    "kural_english_explanation",
+    "couplet",
+    "Translation",
+    "transliteration1",
+    "transliteration2",
+    "Line1",
+    "Line2",
+    "adhikaram_translation_english",
+    "adhikaram_name_tamil",
+)
+PHRASE_FIELDS = (
+    "kural_english_explanation",
+    "couplet",
+    "Translation",
+    "transliteration1",
+    "transliteration2",
+    "Line1",
+    "Line2",
+)
+
+# Python's \w does not match Tamil vowel signs (Unicode category Mc/Mn), so
+# the Tamil block is listed explicitly or words would be split mid-syllable.
+TOKEN_PATTERN = re.compile(r"[\w஀-௿]+")
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have he her his i in is it its "
+    "of on or our she so that the their them they this to was were what when "
+    "which who will with you your".split()
+)
+KURAL_NUMBER_PATTERN = re.compile(r"^\s*(?:kural\s*(?:no\.?|number)?\s*)?#?\s*(\d{1,4})\s*$", re.IGNORECASE)
+
+
+class LexicalIndexError(RuntimeError):
+    """
+    Raised when the lexical index is missing or corrupt.
+    """
+
+
+def normalize_text(text: str) -> str:
+    """
+    NFC-normalized, case-folded text with zero-width joiners removed and
+    whitespace collapsed; used for both tokens and phrase matching.
+    """
+    text = unicodedata.normalize("NFC", str(text)).casefold()
+    text = text.replace("‌", "").replace("‍", "")
+    return " ".join(text.split())
+
+
+def tokenize(text: str) -> list:
+    """
+    Word tokens for English, transliterated and Tamil-script text.
+    """
+    return [t for t in TOKEN_PATTERN.findall(normalize_text(text)) if t not in STOPWORDS and t != "_"]
+
+
+def lexical_document(row) -> str:
+    return " ".join(str(row.get(field, "") or "") for field in LEXICAL_FIELDS)
+
+
+class BM25Index:
+    """
+    Okapi BM25 over a CSR-style inverted index.
+    """
+
+    def __init__(self, vocabulary: dict, indptr: np.ndarray, doc_ids: np.ndarray, tfs: np.ndarray,
+                 doc_lengths: np.ndarray, k1: float = BM25_K1, b: float = BM25_B, manifest: dict = None):
+        self.vocabulary = vocabulary
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.doc_lengths = np.asarray(doc_lengths, dtype=np.float32)
+        self.k1 = k1
+        self.b = b
+        self.manifest = manifest or {}
+        n_docs = len(self.doc_lengths)
+        doc_freq = np.diff(np.asarray(indptr)).astype(np.float32)
+        self.idf = np.log1p((n_docs - doc_freq + 0.5) / (doc_freq + 0.5)).astype(np.float32)
+        average = float(self.doc_lengths.mean()) if n_docs else 0.0
+        self._length_norm = self.k1 * (1 - self.b + self.b * self.doc_lengths / (average or 1.0))
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def score(self, query: str) -> np.ndarray:
+        """
+        BM25 score of every document for the query (zeros if no term matches).
+        """
+        scores = np.zeros(len(self), dtype=np.float32)
+        for term, query_tf in Counter(tokenize(query)).items():
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                continue
+            start, end = self.indptr[term_id], self.indptr[term_id + 1]
+            docs = self.doc_ids[start:end]
+            tf = self.tfs[start:end].astype(np.float32)
+            scores[docs] += query_tf * self.idf[term_id] * tf * (self.k1 + 1) / (tf + self._length_norm[docs])
+        return scores
+
+    def top_k(self, query: str, k: int, ranges: list = None) -> np.ndarray:
+        """
+        Row indices of the k best-scoring documents with a non-zero score,
+        best first, optionally only within the given [start, end) row ranges.
+        """
+        scores = self.score(query)
+        matched = np.flatnonzero(scores > 0)
+        if ranges is not None:
+            inside = np.zeros(len(matched), dtype=bool)
+            for start, end in ranges:
+                inside |= (matched >= start) & (matched < end)
+            matched = matched[inside]
+        if len(matched) > k:
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        return matched[np.argsort(-scores[matched], kind="stable")]
+
+
+def build_bm25_index(documents: list, k1: float = BM25_K1, b: float = BM25_B) -> BM25Index:
+    term_counts = [Counter(tokenize(document)) for document in documents]
+    vocabulary = {term: i for i, term in enumerate(sorted({t for counts in term_counts for t in counts}))}
+    postings = [[] for _ in vocabulary]
+    for doc_id, counts in enumerate(term_counts):
+        for term, tf in counts.items():
+            postings[vocabulary[term]].append((doc_id, tf))
+
+    indptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum([len(p) for p in postings])
+    doc_ids = np.array([d for p in postings for d, _ in p], dtype=np.int32)
+    tfs = np.array([min(tf, np.iinfo(np.uint16).max) for p in postings for _, tf in p], dtype=np.uint16)
+    doc_lengths = np.array([sum(counts.values()) for counts in term_counts], dtype=np.float32)
+    return BM25Index(vocabulary, indptr, doc_ids, tfs, doc_lengths, k1, b)
+
+
+def _data_files(index_file: str) -> dict:
+    base = index_file[:-len(".json")] if index_file.endswith(".json") else index_file
+    return {kind: f"{base}.{kind}.npy" for kind in ("indptr", "doc_ids", "tfs", "doc_lengths")}
+
+
+def save_bm25_index(index: BM25Index, index_file: str = LEXICAL_INDEX_FILE) -> dict:
+    files = _data_files(index_file)
+    os.makedirs(os.path.dirname(index_file) or ".", exist_ok=True)
+    for kind, path in files.items():
+        atomic_save_npy(path, np.asarray(getattr(index, kind)))
+    manifest = {
+        "format_version": LEXICAL_INDEX_FORMAT_VERSION,
+        "fields": list(LEXICAL_FIELDS),
+        "k1": index.k1,
+        "b": index.b,
+        "documents": len(index),
+        "vocabulary": sorted(index.vocabulary, key=index.vocabulary.get),
+        "files": {kind: {"file": os.path.basename(p), "sha256": file_sha256(p)} for kind, p in files.items()},
+    }
+    atomic_write_json(index_file, manifest)
+    return manifest
+
+
+def load_bm25_index(index_file: str = LEXICAL_INDEX_FILE) -> BM25Index:
+    if not os.path.exists(index_file):
+        raise LexicalIndexError(
+            f"No lexical index at {index_file}. Run `python embed_data.py` to build the search artifacts."
+        )
+    with open(index_file, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") != LEXICAL_INDEX_FORMAT_VERSION or manifest.get("fields") != list(LEXICAL_FIELDS):
+        raise LexicalIndexError(f"Lexical index at {index_file} is out of date. Re-run `python embed_data.py`.")
+    directory = os.path.dirname(index_file)
+    arrays = {}
+    for kind, entry in manifest["files"].items():
+        path = os.path.join(directory, entry["file"])
+        if file_sha256(path) != entry["sha256"]:
+            raise LexicalIndexError(f"Checksum mismatch for {path}. Re-run `python embed_data.py`.")
+        arrays[kind] = np.load(path, mmap_mode='r')
+    vocabulary = {term: i for i, term in enumerate(manifest["vocabulary"])}
+    return BM25Index(vocabulary, arrays["indptr"], arrays["doc_ids"], arrays["tfs"], arrays["doc_lengths"],
+                     manifest["k1"], manifest["b"], manifest)
+
+
+class ExactMatcher:
+    """
+    Fast paths that answer a query without any model:
+      - a kural number ("42", "kural 42", "#42")
+      - a query in double quotes, found verbatim in a kural's text fields
+      - a query equal to a whole text field (a pasted line or couplet)
+    Built from the metadata columns at load time; lookups are dict/substring
+    scans over 1,330 rows.
+    """
+
+    def __init__(self, metadata):
+        self._row_by_number = {int(n): row for row, n in enumerate(metadata.column("kural_no"))}
+        self._texts = [normalize_text(" \n ".join(str(metadata[row].get(f, "") or "") for f in PHRASE_FIELDS))
+                       for row in range(len(metadata))]
+        self._rows_by_field_value = {}
+        for field in PHRASE_FIELDS:
+            for row, value in enumerate(metadata.column(field)):
+                key = normalize_text(value)
+                if key:
+                    self._rows_by_field_value.setdefault(key, []).append(row)
+
+    def match(self, query: str):
+        """
+        Returns the matching row indices (best first), or None when the
+        query should go through the normal search.
+        """
+        number = KURAL_NUMBER_PATTERN.match(query)
+        if number:
+            row = self._row_by_number.get(int(number.group(1)))
+            return [row] if row is not None else None
+
+        stripped = query.strip()
+        if len(stripped) > 2 and stripped[0] in "\"“" and stripped[-1] in "\"”":
+            phrase = normalize_text(stripped[1:-1])
+            if phrase:
+                rows = [row for row, text in enumerate(self._texts) if phrase in text]
+                return rows or None
+
+        rows = self._rows_by_field_value.get(normalize_text(query))
+        return list(rows) if rows else None
+
+
+def reciprocal_rank_fusion(rankings: list, k: int = 60) -> list:
+    """
+    Fuses several best-first lists of row indices: each row scores
+    sum(1 / (k + rank)) over the lists it appears in. Returns rows best first;
+    ties keep the order of first appearance.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking, start=1):
+            scores[int(row)] = scores.get(int(row), 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
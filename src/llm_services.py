@@ -1,110 +1,497 @@
 # src/llm_services.py
+# Provider-agnostic explanation logic: caching, streaming, background jobs
+# and remote-call resilience. Backend libraries are only imported when the
+# configured provider is first used; see src/providers/.
 import streamlit as st
-from transformers import AutoModelForCausalLM, AutoTokenizer
-import torch
 import logging
-import ollama
-from google import genai
-from src.config import LLM_PROVIDER, HF_MODEL_ID, OLLAMA_MODEL_ID, GEMINI_MODEL_ID, GEMINI_API_KEY, LLM_PROVIDER_HUGGINGFACE, LLM_PROVIDER_OLLAMA, LLM_PROVIDER_GEMINI
+import queue
+import random
+import sys
+import threading
+import time
+from src import metrics
+from src.config import LLM_PROVIDER, LLM_PROVIDER_HUGGINGFACE
+from src.config import EXPLANATION_CACHE_DB, EXPLANATION_CACHE_MAX_BYTES
+from src.config import (
+    LLM_CALL_DEADLINE_SECONDS,
+    LLM_MAX_RETRIES,
+    LLM_RETRY_BACKOFF_SECONDS,
+    LLM_GLOBAL_CONCURRENCY,
+    CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+    CIRCUIT_BREAKER_RESET_SECONDS,
+    LLM_JOB_WORKERS,
+    LLM_JOB_MAX_QUEUE,
+    LLM_JOB_CANCEL_GRACE_SECONDS,
+    LLM_JOB_RETAIN_SECONDS,
+    LLM_JOB_POLL_SECONDS,
+)
+from src.explanation_cache import ExplanationCache, is_cacheable
+from src.job_queue import JobQueue, DONE, FAILED
+from src.micro_batcher import QueueFullError
+from src.prompts import PROMPT_VERSION, build_prompts, clean_response
+from src.providers import get_provider, provider_model_id
+from src.search_cache import normalize_query
 
 logging.basicConfig(level=logging.INFO)
 
-@st.cache_resource
 def load_hf_model():
     """
-    Loads the Hugging Face model and tokenizer.
+    Loads the Hugging Face model and tokenizer (importing torch and
+    transformers on first call).
     """
-    try:
-        logging.info(f"Loading Hugging Face model: {HF_MODEL_ID}")
-        tokenizer = AutoTokenizer.from_pretrained(HF_MODEL_ID)
-        model = AutoModelForCausalLM.from_pretrained(HF_MODEL_ID, torch_dtype=torch.float32)
-        logging.info("Hugging Face model loaded successfully.")
-        return model, tokenizer
-    except Exception as e:
-        logging.error(f"Error loading Hugging Face model: {e}")
-        return None, None
+    return get_provider(LLM_PROVIDER_HUGGINGFACE).load_hf_model()
 
-def get_relevance_explanation(query: str, kural_explanation: str, model=None, tokenizer=None) -> str:
+@st.cache_resource
+def load_explanation_cache():
     """
-    Generates an explanation by dispatching to the configured LLM provider.
+    Process-wide persistent explanation cache, or None if disabled.
     """
-    # --- PROMPT REFINEMENT ---
-    system_prompt = """You are an insightful analyst of philosophy and literature. Your task is to explain the connection between a user's query and a verse from the ancient Tamil text, the Thirukkural."""
-    
-    user_prompt = f"""
-    Analyze the following.
-    
-    **Query:** "{query}"
-    **Thirukkural Verse Explanation:** "{kural_explanation}"
+    if not EXPLANATION_CACHE_DB:
+        return None
+    return ExplanationCache(EXPLANATION_CACHE_DB, max_bytes=EXPLANATION_CACHE_MAX_BYTES)
 
-    Now, in 2-3 concise and natural sentences, provide your analysis of the semantic connection:
+def current_model_id() -> str:
     """
-    
-    # --- OLLAMA LOGIC ---
-    if LLM_PROVIDER == LLM_PROVIDER_OLLAMA:
-        try:
-            logging.info(f"Getting explanation from Ollama model: {OLLAMA_MODEL_ID}")
-            response = ollama.chat(
-                model=OLLAMA_MODEL_ID,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ]
-            )
-            # --- Clean-up Step ---
-            # Ensures we only return the generated text
-            clean_response = response['message']['content'].split("semantic connection:")[-1].strip()
-            return clean_response
+    The model ID of the configured provider, part of the explanation cache key.
+    """
+    return provider_model_id(LLM_PROVIDER)
 
-        except Exception as e:
-            logging.error(f"Error with Ollama: {e}")
-            return "Explanation not available: Could not connect to Ollama."
+def _cached_explanation(query: str, kural_no):
+    cache = load_explanation_cache() if kural_no is not None else None
+    if cache is None:
+        return None
+    explanation = cache.get(LLM_PROVIDER, current_model_id(), PROMPT_VERSION, query, kural_no)
+    metrics.increment("explanation_cache_requests_total", result="miss" if explanation is None else "hit")
+    return explanation
+
+def _store_explanation(query: str, kural_no, explanation: str):
+    cache = load_explanation_cache() if kural_no is not None else None
+    if cache is not None:
+        cache.put(LLM_PROVIDER, current_model_id(), PROMPT_VERSION, query, kural_no, explanation)
+
+# --- Remote call resilience ---
+# Remote providers keep one long-lived, connection-pooled client each (see
+# src/providers/). Calls go through _resilient_stream, which applies a global
+# concurrency limit, a per-call deadline, bounded retries with exponential
+# backoff, and a per-provider circuit breaker.
+class CircuitOpenError(RuntimeError):
+    """
+    Raised instead of calling a provider whose circuit breaker is open.
+    """
 
-    # --- HUGGING FACE TRANSFORMERS LOGIC ---
-    elif LLM_PROVIDER == LLM_PROVIDER_HUGGINGFACE:
-        if not model or not tokenizer:
-            return "Explanation not available: Hugging Face LLM failed to load."
 
-        chat_prompt = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ]
-        input_ids = tokenizer.apply_chat_template(chat_prompt, add_generation_prompt=True, return_tensors="pt")
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failed calls and rejects calls
+    for `reset_seconds`. After that, one trial call is let through
+    (half-open): success closes the circuit, failure re-opens it.
+    """
 
+    def __init__(self, name: str, failure_threshold: int = CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+                 reset_seconds: float = CIRCUIT_BREAKER_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.reset_seconds:
+                return "half-open"
+            return "open"
+
+    def before_call(self):
+        with self._lock:
+            if self._opened_at is None:
+                return
+            remaining = self.reset_seconds - (time.monotonic() - self._opened_at)
+            if remaining > 0 or self._trial_in_flight:
+                raise CircuitOpenError(f"{self.name} is unavailable; retrying in {max(remaining, 0):.0f}s.")
+            self._trial_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def release_trial(self):
+        """
+        Ends a half-open trial that finished without a verdict (the caller
+        stopped reading mid-stream), so the next call can be the trial.
+        """
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                logging.warning(f"Circuit breaker for {self.name} opened after {self._failures} failure(s).")
+            self._trial_in_flight = False
+
+
+@st.cache_resource
+def get_circuit_breaker(provider: str) -> CircuitBreaker:
+    return CircuitBreaker(provider)
+
+@st.cache_resource
+def get_llm_semaphore() -> threading.BoundedSemaphore:
+    """
+    Caps in-flight remote LLM calls across all sessions in this process.
+    """
+    return threading.BoundedSemaphore(max(1, LLM_GLOBAL_CONCURRENCY))
+
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+def _is_retryable(error: Exception) -> bool:
+    """
+    Connection problems, timeouts and overload/5xx responses are worth
+    retrying; anything else (bad request, auth) will fail the same way again.
+    """
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    # httpx is only present once a remote provider has been imported.
+    httpx = sys.modules.get("httpx")
+    if httpx is not None and isinstance(error, httpx.TransportError):
+        return True
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    return status in RETRYABLE_STATUS_CODES
+
+_STREAM_END = object()
+
+def _stream_with_deadline(open_stream, deadline: float, description: str):
+    """
+    Iterates open_stream() on a helper thread, so a backend that hangs
+    before its first chunk or between chunks can't block past `deadline`
+    (a time.monotonic() value): TimeoutError is raised instead. Closing this
+    generator tells the helper to stop reading; a read it is blocked in ends
+    at the client's own request timeout.
+    """
+    chunks = queue.Queue()
+    stop = threading.Event()
+
+    def pump():
+        stream = None
         try:
-            logging.info(f"Getting explanation from Hugging Face model: {HF_MODEL_ID}")
-            outputs = model.generate(input_ids, max_new_tokens=150, temperature=0.3, do_sample=True)
-            response_text = tokenizer.decode(outputs[0][input_ids.shape[-1]:], skip_special_tokens=True)
-            
-            # --- Clean-up Step ---
-            # Ensures we only return the generated text
-            clean_response = response_text.split("semantic connection:")[-1].strip()
-            return clean_response
-            
-        except Exception as e:
-            logging.error(f"Error during LLM inference: {e}")
-            return "Explanation not available due to a technical issue."
-        
-    # --- NEW GEMINI API LOGIC ---
-    elif LLM_PROVIDER == LLM_PROVIDER_GEMINI:
-        if not GEMINI_API_KEY:
-            return "Explanation not available: The GEMINI_API_KEY is not configured."
-        try:
-            logging.info(f"Getting explanation from Gemini model: {GEMINI_MODEL_ID}")
-            client = genai.Client(api_key=GEMINI_API_KEY)
-            # The Gemini API handles the system prompt differently, so we combine them
-            full_prompt = f"{system_prompt}\n\n{user_prompt}"
-            response = client.models.generate_content(
-                model=GEMINI_MODEL_ID,
-                contents=full_prompt,
-            )
-            return response.text.strip()
+            stream = open_stream()
+            for chunk in stream:
+                if stop.is_set():
+                    break
+                chunks.put((chunk, None))
+            chunks.put((_STREAM_END, None))
         except Exception as e:
-            logging.error(f"Error with Gemini API: {e}")
-            # TODO: temporary — surfaces the real error in the UI for debugging.
-            # Revert to the generic message once the Gemini call is confirmed working.
-            return f"Explanation not available due to an API error: {e}"
+            chunks.put((_STREAM_END, e))
+        finally:
+            if hasattr(stream, "close"):
+                stream.close()
+
+    threading.Thread(target=pump, name="llm-stream", daemon=True).start()
+    try:
+        while True:
+            try:
+                chunk, error = chunks.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                raise TimeoutError(f"{description} exceeded its deadline.") from None
+            if error is not None:
+                raise error
+            if chunk is _STREAM_END:
+                return
+            yield chunk
+    finally:
+        stop.set()
+
+def _resilient_stream(provider: str, open_stream, deadline_seconds: float = LLM_CALL_DEADLINE_SECONDS):
+    """
+    Yields chunks from open_stream() under the provider's circuit breaker and
+    the global concurrency limit. Failures before the first chunk are retried
+    up to LLM_MAX_RETRIES times with jittered exponential backoff; the whole
+    call, including waiting for a slot and streaming, must finish within
+    deadline_seconds or TimeoutError is raised.
+    """
+    breaker = get_circuit_breaker(provider)
+    breaker.before_call()
+    deadline = time.monotonic() + deadline_seconds
+
+    semaphore = get_llm_semaphore()
+    if not semaphore.acquire(timeout=max(0.0, deadline - time.monotonic())):
+        # Every slot stayed busy for the whole deadline: the backend is too slow.
+        breaker.record_failure()
+        raise TimeoutError(f"No free LLM slot within {deadline_seconds:.0f}s.")
+    settled = False
+    try:
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            produced = False
+            try:
+                for chunk in _stream_with_deadline(open_stream, deadline, f"{provider} call ({deadline_seconds:.0f}s)"):
+                    produced = True
+                    yield chunk
+                breaker.record_success()
+                settled = True
+                return
+            except Exception as e:
+                backoff = LLM_RETRY_BACKOFF_SECONDS * (2 ** attempt) * (0.5 + random.random())
+                retry = (not produced and attempt < LLM_MAX_RETRIES and _is_retryable(e)
+                         and time.monotonic() + backoff < deadline)
+                if not retry:
+                    breaker.record_failure()
+                    settled = True
+                    raise
+                logging.warning(f"{provider} call failed ({e}); retry {attempt + 1}/{LLM_MAX_RETRIES} in {backoff:.1f}s.")
+                time.sleep(backoff)
+    finally:
+        semaphore.release()
+        if not settled:
+            # Closed mid-stream (a cancelled job, a Streamlit rerun): no
+            # verdict on the backend, but a half-open trial must not stay in
+            # flight, or every later call would be rejected.
+            breaker.release_trial()
+
+class FallbackText(str):
+    """
+    A chunk that is a fallback/error message rather than model output. An
+    explanation containing one is shown but never cached or shared.
+    """
+
+
+def stream_relevance_explanation(query: str, kural_explanation: str, model=None, tokenizer=None, should_stop=None):
+    """
+    Streams an explanation from the configured LLM provider, chunk by chunk.
+    If the provider fails, its fallback message ("Explanation not
+    available...") is yielded as a FallbackText chunk: on its own if nothing
+    was produced, otherwise after the partial text, so callers can tell a
+    cut-off explanation from a complete one. A local provider polls
+    should_stop() while generating and ends early once it is true.
+    """
+    try:
+        provider = get_provider(LLM_PROVIDER)
+    except KeyError:
+        yield FallbackText(f"Error: Unknown LLM_PROVIDER '{LLM_PROVIDER}' configured.")
+        return
+    reason = provider.unavailable_reason(model, tokenizer)
+    if reason:
+        yield FallbackText(reason)
+        return
+
+    system_prompt, user_prompt = build_prompts(query, kural_explanation)
+    if provider.REMOTE:
+        chunks = _resilient_stream(LLM_PROVIDER, lambda: provider.stream(system_prompt, user_prompt))
+    else:
+        chunks = provider.stream(system_prompt, user_prompt, model, tokenizer, should_stop=should_stop)
+
+    produced = False
+    try:
+        for chunk in chunks:
+            if chunk:
+                produced = True
+                yield chunk
+    except GeneratorExit:
+        # Closed by the caller: stop the provider's stream now rather than
+        # whenever it is garbage-collected (the local model keeps
+        # generating until then).
+        chunks.close()
+        raise
+    except Exception as e:
+        logging.error(f"{provider.ERROR_LOG}: {e}")
+        metrics.increment("llm_failures_total", provider=LLM_PROVIDER)
+        if produced:
+            yield FallbackText("\n\n" + provider.fallback_message(e))
+        else:
+            yield FallbackText(provider.fallback_message(e))
+
+def _join_chunks(chunks) -> tuple:
+    """
+    (cleaned explanation, whether it ended in a fallback message).
+    """
+    parts = list(chunks)
+    return clean_response("".join(parts)), any(isinstance(part, FallbackText) for part in parts)
 
+def get_relevance_explanation(query: str, kural_explanation: str, model=None, tokenizer=None, kural_no=None) -> str:
+    """
+    Generates an explanation by dispatching to the configured LLM provider.
+    When kural_no is given, the persistent explanation cache is consulted
+    first and successful generations are stored.
+    """
+    cached = _cached_explanation(query, kural_no)
+    if cached is not None:
+        return cached
+    explanation, failed = _join_chunks(stream_relevance_explanation(query, kural_explanation, model, tokenizer))
+    if not failed:
+        _store_explanation(query, kural_no, explanation)
+    return explanation
+
+# --- Background explanation jobs ---
+# Explanations are generated on a process-wide worker pool (src/job_queue.py)
+# instead of the Streamlit script thread. A rerun only re-subscribes to the
+# jobs already in flight, sessions asking for the same (query, kural) share
+# one generation, and a job nobody waits for any more is cancelled.
+def _explanation_job_key(query: str, kural_no, kural_explanation: str) -> str:
+    subject = kural_no if kural_no is not None else kural_explanation
+    return ExplanationCache.make_key(LLM_PROVIDER, current_model_id(), PROMPT_VERSION, query, subject)
+
+def _run_explanation_jobs(jobs: list):
+    """
+    Worker side of the explanation queue. Several jobs (only ever queued
+    together for the local Hugging Face model) go through one batched call;
+    a single job is streamed chunk by chunk, stopping early if it is
+    abandoned. Time-to-first-token and total time are logged.
+    """
+    start = time.perf_counter()
+    jobs = [job for job in jobs if not job.cancel_if_abandoned()]
+    if not jobs:
+        return
+    first = jobs[0].payload
+    if len(jobs) > 1:
+        # Evaluates every job (not short-circuiting), so each abandoned one
+        # is cancelled; generation stops once all of them are.
+        explanations = get_provider(LLM_PROVIDER).get_relevance_explanations_batch_hf(
+            first["query"], [job.payload["kural_explanation"] for job in jobs], first["model"], first["tokenizer"],
+            should_stop=lambda: all([job.cancel_if_abandoned() for job in jobs]))
+        total = time.perf_counter() - start
+        logging.info(f"Batch of {len(explanations)} explanations ({LLM_PROVIDER}): total {total:.2f}s")
+        metrics.observe("llm_request_duration_seconds", total, provider=LLM_PROVIDER)
+        for job, explanation in zip(jobs, explanations):
+            if job.done:
+                # Cancelled mid-batch: its output may be cut short.
+                continue
+            _store_explanation(job.payload["query"], job.payload["kural_no"], explanation)
+            job.finish(explanation, DONE if is_cacheable(explanation) else FAILED)
+        return
 
+    job = jobs[0]
+    parts = []
+    failed = False
+    first_token = None
+    chunks = stream_relevance_explanation(first["query"], first["kural_explanation"], first["model"], first["tokenizer"],
+                                          should_stop=job.cancel_if_abandoned)
+    try:
+        for chunk in chunks:
+            if job.cancel_if_abandoned():
+                logging.info(f"Explanation for kural {first['kural_no']} cancelled: no session is waiting for it.")
+                return
+            if first_token is None:
+                first_token = time.perf_counter() - start
+            failed = failed or isinstance(chunk, FallbackText)
+            parts.append(chunk)
+            job.update("".join(parts))
+        if job.cancel_if_abandoned():
+            # A local model stopped early through should_stop: the text is cut short.
+            logging.info(f"Explanation for kural {first['kural_no']} cancelled: no session is waiting for it.")
+            return
+    finally:
+        chunks.close()
+        total = time.perf_counter() - start
+        ttft = f"{first_token:.2f}s" if first_token is not None else "n/a"
+        logging.info(f"Explanation for kural {first['kural_no']} ({LLM_PROVIDER}): time-to-first-token {ttft}, total {total:.2f}s")
+        metrics.observe("llm_request_duration_seconds", total, provider=LLM_PROVIDER)
+        if first_token is not None:
+            metrics.observe("llm_first_token_seconds", first_token, provider=LLM_PROVIDER)
+    explanation = clean_response("".join(parts))
+    if failed:
+        # The fallback message is still shown (after any partial text), but
+        # as a failed job it is neither cached nor shared with later runs,
+        # so the next request tries again.
+        job.finish(explanation, FAILED)
+        return
+    _store_explanation(first["query"], first["kural_no"], explanation)
+    job.finish(explanation)
+
+@st.cache_resource
+def get_explanation_queue() -> JobQueue:
+    """
+    Process-wide explanation job queue, shared by every session. The local
+    Hugging Face model gets a single worker that batches the queued jobs of
+    one query, since concurrent generate() calls would just contend for the
+    same CPU; remote providers get LLM_JOB_WORKERS concurrent workers.
+    """
+    if LLM_PROVIDER == LLM_PROVIDER_HUGGINGFACE:
+        workers, batch_key = 1, lambda payload: normalize_query(payload["query"])
     else:
-        return f"Error: Unknown LLM_PROVIDER '{LLM_PROVIDER}' configured."
\ No newline at end of file
+        workers, batch_key = LLM_JOB_WORKERS, None
+    return JobQueue(
+        _run_explanation_jobs,
+        workers=workers,
+        max_queue=LLM_JOB_MAX_QUEUE,
+        batch_key=batch_key,
+        cancel_grace_seconds=LLM_JOB_CANCEL_GRACE_SECONDS,
+        retain_seconds=LLM_JOB_RETAIN_SECONDS,
+        name="llm_explanations",
+    )
+
+def stream_explanations_concurrently(query: str, kural_explanations: list, model=None, tokenizer=None, kural_numbers: list = None,
+                                     timeout: float = None):
+    """
+    Queues an explanation job for every result and yields
+    (index, text_so_far, done) as tokens arrive, so the caller can update
+    each placeholder from its own thread. The final event for each index
+    carries the cleaned-up explanation.
+    The caller only polls: generation runs on the shared job queue and
+    carries on if this generator is abandoned (e.g. by a Streamlit rerun),
+    so the next run picks up the same jobs instead of starting over.
+    If kural_numbers is given, cached explanations are yielded immediately
+    and only the misses are generated (and then stored).
+    With `timeout` (seconds), explanations still unfinished by then are
+    ended with a fallback message and their jobs released.
+    """
+    start = time.perf_counter()
+    deadline = None if timeout is None else start + timeout
+    kural_numbers = kural_numbers or [None] * len(kural_explanations)
+
+    pending = []
+    for index, kural_no in enumerate(kural_numbers):
+        cached = _cached_explanation(query, kural_no)
+        if cached is not None:
+            yield index, cached, True
+        else:
+            pending.append(index)
+    if not pending:
+        return
+
+    job_queue = get_explanation_queue()
+    listener = threading.Event()
+    metrics.note("llm_queue_depth", job_queue.depth)
+    items = [(_explanation_job_key(query, kural_numbers[index], kural_explanations[index]),
+              {"query": query, "kural_no": kural_numbers[index], "kural_explanation": kural_explanations[index],
+               "model": model, "tokenizer": tokenizer})
+             for index in pending]
+    try:
+        jobs = dict(zip(pending, job_queue.submit_many(items, listener)))
+    except QueueFullError as e:
+        logging.warning(f"Explanations not queued: {e}")
+        for index in pending:
+            yield index, "Explanation not available: too many explanations are being generated right now.", True
+        return
+
+    submitted = list(jobs.values())
+    shown = {}
+    try:
+        while jobs:
+            if deadline is not None and time.perf_counter() >= deadline:
+                logging.warning(f"{len(jobs)} explanation(s) not finished within {timeout:.0f}s.")
+                for index in sorted(jobs):
+                    yield index, "Explanation not available: it took too long to generate.", True
+                break
+            wait = LLM_JOB_POLL_SECONDS if deadline is None else min(LLM_JOB_POLL_SECONDS, deadline - time.perf_counter())
+            listener.wait(max(0.0, wait))
+            listener.clear()
+            for index, job in list(jobs.items()):
+                text, done = job.snapshot()
+                if done:
+                    del jobs[index]
+                    job_queue.release(job, listener)
+                    yield index, text if text is not None else "Explanation not available: generation failed.", True
+                elif text and text != shown.get(index):
+                    shown[index] = text
+                    yield index, text, False
+    finally:
+        for job in jobs.values():
+            job_queue.release(job, listener)
+    metrics.note("llm_job_wait_ms", round(max(job.wait_seconds for job in submitted) * 1000, 1))
+    metrics.record_stage("llm_explanations", time.perf_counter() - start)
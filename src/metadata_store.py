@@ -0,0 +1,193 @@
+# src/metadata_store.py
+# Columnar, memory-mapped store for the per-kural metadata written by
+# embed_data.py, replacing the pickled list of dicts.
+#
+# Layout (Arrow-style, plain NumPy so there is nothing to unpickle):
+#   kural_metadata.json          schema: row count, field names/types, checksums
+#   kural_metadata.strings.npy   one UTF-8 byte blob holding every string value
+#   kural_metadata.offsets.npy   int64 (n_string_fields, rows + 1) offsets into the blob
+#   kural_metadata.ints.npy      int64 (n_int_fields, rows)
+# Nothing is decoded until a field of a row is read, so the search path only
+# materializes the handful of rows it returns.
+import json
+import os
+from collections.abc import Mapping, Sequence
+import numpy as np
+from src.artifact_io import file_sha256, atomic_save_npy, atomic_write_json
+from src.config import METADATA_FILE
+
+METADATA_FORMAT_VERSION = 1
+
+
+class MetadataStoreError(RuntimeError):
+    """
+    Raised when the metadata store is missing or corrupt.
+    """
+
+
+def _data_files(schema_file: str) -> dict:
+    base = schema_file[:-len(".json")] if schema_file.endswith(".json") else schema_file
+    return {
+        "strings": base + ".strings.npy",
+        "offsets": base + ".offsets.npy",
+        "ints": base + ".ints.npy",
+    }
+
+
+def save_metadata_store(records: list, schema_file: str = METADATA_FILE) -> dict:
+    """
+    Writes `records` (a list of flat dicts sharing the same keys) in the
+    columnar layout. Integer fields stay integers; everything else is stored
+    as text. Returns the schema.
+    """
+    if not records:
+        raise ValueError("Cannot write an empty metadata store.")
+    names = list(records[0].keys())
+    int_fields = [n for n in names if all(isinstance(r.get(n), (int, np.integer)) and not isinstance(r.get(n), bool) for r in records)]
+    str_fields = [n for n in names if n not in int_fields]
+
+    ints = np.array([[int(r[n]) for r in records] for n in int_fields], dtype=np.int64).reshape(len(int_fields), len(records))
+    offsets = np.zeros((len(str_fields), len(records) + 1), dtype=np.int64)
+    chunks = []
+    position = 0
+    for f, name in enumerate(str_fields):
+        offsets[f, 0] = position
+        for row, record in enumerate(records):
+            value = record.get(name)
+            encoded = ("" if value is None else str(value)).encode("utf-8")
+            chunks.append(encoded)
+            position += len(encoded)
+            offsets[f, row + 1] = position
+    strings = np.frombuffer(b"".join(chunks), dtype=np.uint8)
+
+    files = _data_files(schema_file)
+    os.makedirs(os.path.dirname(schema_file) or ".", exist_ok=True)
+    atomic_save_npy(files["strings"], strings)
+    atomic_save_npy(files["offsets"], offsets)
+    atomic_save_npy(files["ints"], ints)
+
+    schema = {
+        "format_version": METADATA_FORMAT_VERSION,
+        "rows": len(records),
+        "fields": [
+            {"name": n, "type": "int" if n in int_fields else "str",
+             "column": int_fields.index(n) if n in int_fields else str_fields.index(n)}
+            for n in names
+        ],
+        "files": {kind: {"file": os.path.basename(p), "sha256": file_sha256(p)} for kind, p in files.items()},
+    }
+    atomic_write_json(schema_file, schema)
+    return schema
+
+
+class KuralRecord(Mapping):
+    """
+    Read-only, dict-like view of one row. Fields are decoded on access.
+    """
+    __slots__ = ("_store", "_row")
+
+    def __init__(self, store: "MetadataStore", row: int):
+        self._store = store
+        self._row = row
+
+    def __getitem__(self, name: str):
+        return self._store.value(self._row, name)
+
+    def __iter__(self):
+        return iter(self._store.field_names)
+
+    def __len__(self) -> int:
+        return len(self._store.field_names)
+
+    def __repr__(self) -> str:
+        return f"KuralRecord(row={self._row}, kural_no={self.get('kural_no')})"
+
+    @property
+    def row(self) -> int:
+        return self._row
+
+    def to_dict(self) -> dict:
+        return {name: self[name] for name in self}
+
+
+class MetadataStore(Sequence):
+    """
+    List-like access to the metadata rows: store[i] is a KuralRecord, and
+    column(name) returns a whole field for vectorized use.
+    """
+
+    def __init__(self, schema: dict, strings: np.ndarray, offsets: np.ndarray, ints: np.ndarray):
+        self.schema = schema
+        self._fields = {f["name"]: (f["type"], f["column"]) for f in schema["fields"]}
+        self.field_names = tuple(self._fields)
+        self._strings = strings
+        self._offsets = offsets
+        self._ints = ints
+        self._columns = {}
+
+    def __len__(self) -> int:
+        return self.schema["rows"]
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [KuralRecord(self, i) for i in range(*row.indices(len(self)))]
+        row = int(row)
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError(f"Metadata row {row} out of range.")
+        return KuralRecord(self, row)
+
+    def value(self, row: int, name: str):
+        try:
+            kind, column = self._fields[name]
+        except KeyError:
+            raise KeyError(name) from None
+        if kind == "int":
+            return int(self._ints[column, row])
+        start, end = self._offsets[column, row], self._offsets[column, row + 1]
+        return self._strings[start:end].tobytes().decode("utf-8")
+
+    def column(self, name: str):
+        """
+        Every value of one field (a list of str, or an int64 array), decoded
+        once and cached.
+        """
+        if name not in self._columns:
+            kind, column = self._fields[name]
+            if kind == "int":
+                self._columns[name] = np.asarray(self._ints[column])
+            else:
+                self._columns[name] = [self.value(row, name) for row in range(len(self))]
+        return self._columns[name]
+
+
+def load_metadata_store(schema_file: str = METADATA_FILE, verify_checksum: bool = True) -> MetadataStore:
+    """
+    Memory-maps the columnar metadata files after checking them against the
+    schema.
+    """
+    if not os.path.exists(schema_file):
+        raise MetadataStoreError(
+            f"No metadata schema at {schema_file}. Run `python embed_data.py` to build the search artifacts."
+        )
+    with open(schema_file, 'r', encoding='utf-8') as f:
+        schema = json.load(f)
+    if schema.get("format_version") != METADATA_FORMAT_VERSION:
+        raise MetadataStoreError(
+            f"Metadata format {schema.get('format_version')} is not supported "
+            f"(expected {METADATA_FORMAT_VERSION}). Re-run `python embed_data.py`."
+        )
+
+    directory = os.path.dirname(schema_file)
+    arrays = {}
+    for kind, entry in schema["files"].items():
+        file_path = os.path.join(directory, entry["file"])
+        if verify_checksum and file_sha256(file_path) != entry["sha256"]:
+            raise MetadataStoreError(f"Checksum mismatch for {file_path}. Re-run `python embed_data.py`.")
+        try:
+            arrays[kind] = np.load(file_path, mmap_mode='r')
+        except ValueError:
+            # Zero-length arrays (e.g. no int fields) can't be memory-mapped.
+            arrays[kind] = np.load(file_path)
+    return MetadataStore(schema, arrays["strings"], arrays["offsets"], arrays["ints"])
@@ -0,0 +1,276 @@
+# src/metrics.py
+# Lightweight tracing and metrics: per-stage spans, counters and latency
+# histograms, exported in the Prometheus text format (to a file and/or a
+# /metrics HTTP endpoint) and collected per query for the app's debug panel.
+#
+# Everything is a no-op unless METRICS_ENABLED is set: span() hands back a
+# shared null context and increment()/observe() return immediately, so the
+# instrumented code paths pay one attribute check per call.
+import contextvars
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import streamlit as st
+from src.config import METRICS_ENABLED, METRICS_HOST
+
+# Upper bounds (seconds) of the latency histogram buckets; +Inf is implicit.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_NULL_SPAN = nullcontext()
+_current_trace = contextvars.ContextVar("metrics_trace", default=None)
+
+
+class Trace:
+    """
+    Stage timings and notes for one request, in the order they happened.
+    """
+
+    def __init__(self):
+        self.stages = []
+        self.notes = {}
+        self._lock = threading.Lock()
+
+    def add_stage(self, name: str, seconds: float):
+        with self._lock:
+            self.stages.append((name, seconds))
+
+    def note(self, name: str, value):
+        with self._lock:
+            self.notes[name] = value
+
+
+class MetricsRegistry:
+    """
+    Thread-safe counters, gauges and fixed-bucket histograms keyed on
+    (name, sorted label pairs).
+    """
+
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._help = {}
+        self._lock = threading.Lock()
+
+    def describe(self, name: str, help_text: str):
+        self._help[name] = help_text
+
+    def increment(self, name: str, amount: float = 1, labels: dict = None):
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def set_gauge(self, name: str, value: float, labels: dict = None):
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            self._gauges[key] = value
+
+    def observe(self, name: str, value: float, labels: dict = None):
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0}
+            index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+            histogram["counts"][index] += 1
+            histogram["sum"] += value
+
+    def counter_value(self, name: str, labels: dict = None) -> float:
+        with self._lock:
+            return self._counters.get((name, tuple(sorted((labels or {}).items()))), 0)
+
+    def clear(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+    def render_prometheus(self) -> str:
+        """
+        The registry in the Prometheus text exposition format (version 0.0.4).
+        """
+        with self._lock:
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+            histograms = sorted((key, {"counts": list(h["counts"]), "sum": h["sum"]})
+                                for key, h in self._histograms.items())
+        lines = []
+        described = set()
+
+        def header(name: str, kind: str):
+            if name not in described:
+                described.add(name)
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in counters:
+            header(name, "counter")
+            lines.append(f"{name}{_format_labels(labels)} {_format_number(value)}")
+        for (name, labels), value in gauges:
+            header(name, "gauge")
+            lines.append(f"{name}{_format_labels(labels)} {_format_number(value)}")
+        for (name, labels), histogram in histograms:
+            header(name, "histogram")
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), histogram["counts"]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _format_number(bound)
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_number(histogram['sum'])}")
+            lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in labels)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + "}"
+
+def _format_number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+REGISTRY = MetricsRegistry()
+REGISTRY.describe("stage_duration_seconds", "Wall time of each search/explanation stage.")
+REGISTRY.describe("search_queries_total", "Searches by path (cache, exact, semantic).")
+REGISTRY.describe("search_cache_requests_total", "Search result cache lookups by outcome.")
+REGISTRY.describe("explanation_cache_requests_total", "Explanation cache lookups by outcome.")
+REGISTRY.describe("search_candidates_thresholded_total", "Re-ranked candidates dropped by RELEVANCE_THRESHOLD.")
+REGISTRY.describe("rerank_pairs_total", "(query, candidate) pairs scored by the cross-encoder.")
+REGISTRY.describe("rerank_cascade_total", "Adaptive re-rank decisions by mode (reject, decisive, chunked).")
+REGISTRY.describe("search_empty_results_total", "Searches that returned no results.")
+REGISTRY.describe("page_duration_seconds", "Wall time to render a search results page.")
+REGISTRY.describe("llm_request_duration_seconds", "Total time per LLM explanation, by provider.")
+REGISTRY.describe("llm_first_token_seconds", "Time to first streamed token per LLM explanation, by provider.")
+REGISTRY.describe("service_requests_total", "Search service requests by endpoint and HTTP status.")
+REGISTRY.describe("service_request_duration_seconds", "Search service request latency by endpoint.")
+REGISTRY.describe("service_batches_total", "Micro-batches sent to the search models by the service.")
+REGISTRY.describe("service_batched_queries_total", "Queries sent to the search models in micro-batches.")
+REGISTRY.describe("job_queue_depth", "Jobs waiting in a background job queue.")
+REGISTRY.describe("jobs_running", "Jobs currently running in a background job queue.")
+REGISTRY.describe("job_wait_seconds", "Time a job waited in its queue before a worker started it.")
+REGISTRY.describe("jobs_total", "Background jobs by queue and outcome (completed, failed, cancelled).")
+REGISTRY.describe("job_requests_total", "Job submissions by queue and result (new, shared, rejected).")
+REGISTRY.describe("llm_failures_total", "LLM explanations that fell back to an error message, by provider.")
+
+
+def enabled() -> bool:
+    return METRICS_ENABLED
+
+def increment(name: str, amount: float = 1, **labels):
+    if METRICS_ENABLED:
+        REGISTRY.increment(name, amount, labels)
+
+def set_gauge(name: str, value: float, **labels):
+    if METRICS_ENABLED:
+        REGISTRY.set_gauge(name, value, labels)
+
+def observe(name: str, value: float, **labels):
+    if METRICS_ENABLED:
+        REGISTRY.observe(name, value, labels)
+
+def note(name: str, value):
+    """
+    Attaches a value (e.g. a candidate count) to the current trace, if any.
+    """
+    if METRICS_ENABLED:
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.note(name, value)
+
+def record_stage(name: str, seconds: float):
+    """
+    Records a stage timed by the caller (e.g. one spanning generator yields).
+    """
+    if METRICS_ENABLED:
+        REGISTRY.observe("stage_duration_seconds", seconds, {"stage": name})
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add_stage(name, seconds)
+
+@contextmanager
+def _timed_span(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
+
+def span(name: str):
+    """
+    Times the enclosed block as stage `name`. Usage: `with metrics.span("rerank"): ...`
+    """
+    if not METRICS_ENABLED:
+        return _NULL_SPAN
+    return _timed_span(name)
+
+@contextmanager
+def trace():
+    """
+    Collects the stages recorded inside the block (on this thread) into a
+    Trace. Yields None when metrics are disabled.
+    """
+    if not METRICS_ENABLED:
+        yield None
+        return
+    current = Trace()
+    token = _current_trace.set(current)
+    try:
+        yield current
+    finally:
+        _current_trace.reset(token)
+
+def write_prometheus_file(path: str):
+    """
+    Atomically writes the current metrics, e.g. for node_exporter's textfile
+    collector.
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    # A temp file per call: concurrent sessions must not rename each other's.
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".metrics-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(REGISTRY.render_prometheus())
+        # mkstemp creates the file 0600; the textfile collector may run as another user.
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = REGISTRY.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+@st.cache_resource
+def start_metrics_server(port: int, host: str = METRICS_HOST):
+    """
+    Serves /metrics on a daemon thread, once per process.
+    """
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    logging.info(f"Prometheus metrics served on {host}:{port}/metrics")
+    return server
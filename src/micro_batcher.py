@@ -0,0 +1,106 @@
+# src/micro_batcher.py
+# Dynamic micro-batching for the search service: concurrent requests that
+# arrive within a few milliseconds of each other are handed to one batched
+# call (one bi-encoder encode, one cross-encoder predict) instead of running
+# one by one.
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class QueueFullError(RuntimeError):
+    """
+    Raised by submit() when the queue is at capacity (backpressure: callers
+    should reject the request, e.g. with HTTP 503, rather than wait).
+    """
+
+
+class MicroBatcher:
+    """
+    A single worker thread takes the oldest waiting item, waits at most
+    max_wait_ms for more (up to max_batch_size), and calls
+    process_batch(items), which must return one result per item in order.
+    Items whose deadline passed while queued are failed with TimeoutError
+    instead of being processed.
+    """
+
+    def __init__(self, process_batch, max_batch_size: int = 32, max_wait_ms: float = 5.0,
+                 max_queue: int = 256, name: str = "micro-batcher"):
+        self.process_batch = process_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_seconds = max_wait_ms / 1000.0
+        self.max_queue = max_queue
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._counters = {"submitted": 0, "rejected": 0, "expired": 0, "batches": 0, "batched_items": 0, "failed_batches": 0}
+        self._worker = threading.Thread(target=self._run, name=name, daemon=True)
+        self._worker.start()
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters)
+        stats["queue_depth"] = self.depth
+        stats["mean_batch_size"] = stats["batched_items"] / stats["batches"] if stats["batches"] else 0.0
+        return stats
+
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def submit(self, item, timeout: float = None) -> Future:
+        """
+        Queues item and returns a Future for its result. The deadline
+        (now + timeout) only limits time spent waiting in the queue; use
+        future.result(timeout) to bound the total wait.
+        """
+        if self._queue.qsize() >= self.max_queue:
+            self._count("rejected")
+            raise QueueFullError(f"Request queue is full ({self.max_queue} waiting).")
+        future = Future()
+        deadline = time.monotonic() + timeout if timeout else None
+        self._queue.put((item, future, deadline))
+        self._count("submitted")
+        return future
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            gather_until = time.monotonic() + self.max_wait_seconds
+            while len(batch) < self.max_batch_size:
+                remaining = gather_until - time.monotonic()
+                try:
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._process(batch)
+
+    def _process(self, batch: list):
+        now = time.monotonic()
+        live = []
+        for item, future, deadline in batch:
+            if deadline is not None and now > deadline:
+                self._count("expired")
+                future.set_exception(TimeoutError("Request expired while queued."))
+            elif future.set_running_or_notify_cancel():
+                live.append((item, future))
+        if not live:
+            return
+
+        self._count("batches")
+        self._count("batched_items", len(live))
+        try:
+            results = self.process_batch([item for item, _ in live])
+        except Exception as e:
+            logging.error(f"Batch of {len(live)} failed: {e}")
+            self._count("failed_batches")
+            for _, future in live:
+                future.set_exception(e)
+            return
+        for (_, future), result in zip(live, results):
+            future.set_result(result)
@@ -0,0 +1,131 @@
+# src/model_backends.py
+# Optional CPU-optimized inference backends for the bi-encoder and the
+# cross-encoder, selected with INFERENCE_BACKEND:
+#   torch       the float32 PyTorch models (default)
+#   torch-int8  PyTorch with dynamically quantized int8 Linear layers
+#   onnx        ONNX Runtime, float32
+#   onnx-int8   ONNX Runtime with dynamically quantized int8 weights
+# Every backend other than torch must first be exported and checked against
+# the float32 models with `python optimize_models.py --backend <name>`, which
+# writes optimized_models/<backend>/manifest.json. That manifest records the
+# parity results and the relevance threshold recalibrated for the backend's
+# cross-encoder logits; a backend that failed the parity check is refused.
+import json
+import os
+from src.config import (
+    EMBEDDING_MODEL,
+    RERANK_MODEL,
+    RELEVANCE_THRESHOLD,
+    OPTIMIZED_MODELS_PATH,
+)
+
+BACKENDS = ("torch", "torch-int8", "onnx", "onnx-int8")
+BACKEND_MANIFEST_FILENAME = "manifest.json"
+
+
+class ModelBackendError(RuntimeError):
+    """
+    Raised when the configured backend is unknown, not exported yet, exported
+    for different models, or failed its parity check.
+    """
+
+
+def backend_dir(backend: str) -> str:
+    return os.path.join(OPTIMIZED_MODELS_PATH, backend)
+
+def _check_backend(backend: str):
+    if backend not in BACKENDS:
+        raise ModelBackendError(f"Unknown INFERENCE_BACKEND '{backend}'; expected one of {', '.join(BACKENDS)}.")
+
+def read_backend_manifest(backend: str) -> dict:
+    """
+    The export/parity manifest of a non-torch backend, validated against the
+    configured models.
+    """
+    _check_backend(backend)
+    manifest_file = os.path.join(backend_dir(backend), BACKEND_MANIFEST_FILENAME)
+    if not os.path.exists(manifest_file):
+        raise ModelBackendError(
+            f"INFERENCE_BACKEND '{backend}' has not been prepared. "
+            f"Run `python optimize_models.py --backend {backend}` first."
+        )
+    with open(manifest_file, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get("embedding_model") != EMBEDDING_MODEL or manifest.get("rerank_model") != RERANK_MODEL:
+        raise ModelBackendError(
+            f"The '{backend}' models were exported from {manifest.get('embedding_model')} / "
+            f"{manifest.get('rerank_model')}, but config.py uses {EMBEDDING_MODEL} / {RERANK_MODEL}. "
+            f"Re-run `python optimize_models.py --backend {backend}`."
+        )
+    if manifest.get("float32_relevance_threshold") != RELEVANCE_THRESHOLD:
+        raise ModelBackendError(
+            f"RELEVANCE_THRESHOLD changed since the '{backend}' threshold was calibrated. "
+            f"Re-run `python optimize_models.py --backend {backend}`."
+        )
+    if not manifest.get("parity_passed"):
+        raise ModelBackendError(
+            f"The '{backend}' models failed the parity check against float32 "
+            f"(see {manifest_file}); use INFERENCE_BACKEND=torch."
+        )
+    return manifest
+
+
+def quantize_linear_layers(model):
+    """
+    Dynamic int8 quantization of every nn.Linear, in place: weights are stored
+    as int8 and activations are quantized on the fly. CPU only.
+    """
+    import torch
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+def create_bi_encoder(backend: str, model_name_or_path: str = EMBEDDING_MODEL, file_name: str = None):
+    """
+    Builds the bi-encoder for `backend` from a hub name or an exported
+    directory (used by optimize_models.py before a manifest exists).
+    """
+    from sentence_transformers import SentenceTransformer
+    _check_backend(backend)
+    if backend.startswith("onnx"):
+        model_kwargs = {"file_name": file_name} if file_name else None
+        return SentenceTransformer(model_name_or_path, backend="onnx", model_kwargs=model_kwargs)
+    model = SentenceTransformer(model_name_or_path, device="cpu" if backend == "torch-int8" else None)
+    return quantize_linear_layers(model) if backend == "torch-int8" else model
+
+def create_cross_encoder(backend: str, model_name_or_path: str = RERANK_MODEL, file_name: str = None):
+    from sentence_transformers import CrossEncoder
+    _check_backend(backend)
+    if backend.startswith("onnx"):
+        model_kwargs = {"file_name": file_name} if file_name else None
+        return CrossEncoder(model_name_or_path, backend="onnx", model_kwargs=model_kwargs)
+    model = CrossEncoder(model_name_or_path, device="cpu" if backend == "torch-int8" else None)
+    return quantize_linear_layers(model) if backend == "torch-int8" else model
+
+
+def load_bi_encoder_model(backend: str):
+    """
+    The bi-encoder for the configured backend (exported files for ONNX).
+    """
+    if backend == "torch":
+        return create_bi_encoder(backend)
+    entry = read_backend_manifest(backend)["bi_encoder"]
+    if entry.get("path") is None:
+        return create_bi_encoder(backend)
+    return create_bi_encoder(backend, os.path.join(backend_dir(backend), entry["path"]), entry.get("file_name"))
+
+def load_cross_encoder_model(backend: str):
+    if backend == "torch":
+        return create_cross_encoder(backend)
+    entry = read_backend_manifest(backend)["cross_encoder"]
+    if entry.get("path") is None:
+        return create_cross_encoder(backend)
+    return create_cross_encoder(backend, os.path.join(backend_dir(backend), entry["path"]), entry.get("file_name"))
+
+def backend_relevance_threshold(backend: str) -> float:
+    """
+    RELEVANCE_THRESHOLD, or the value recalibrated for the backend's
+    cross-encoder when its logits are shifted relative to float32.
+    """
+    if backend == "torch":
+        return RELEVANCE_THRESHOLD
+    return float(read_backend_manifest(backend)["relevance_threshold"])
@@ -0,0 +1,167 @@
+# src/neighbor_graph.py
+# Precomputed kural-to-kural nearest-neighbor graph behind "related kurals":
+# for every kural, its NEIGHBOR_GRAPH_K most similar kurals by embedding
+# cosine, optionally reordered offline by the cross-encoder. A lookup is an
+# array slice, so related kurals need no model at request time.
+#
+# Layout (written by embed_data.py, memory-mapped on load):
+#   neighbor_graph.json          parameters, embeddings checksum, file checksums
+#   neighbor_graph.indices.npy   int16 (rows, K) neighbor row indices, best first
+#   neighbor_graph.scores.npy    float16 (rows, K) cosine similarity, or the
+#                                cross-encoder logit when reranked
+import json
+import os
+import numpy as np
+from src.artifact_io import file_sha256, atomic_save_npy, atomic_write_json
+from src.config import NEIGHBOR_GRAPH_FILE, NEIGHBOR_GRAPH_K
+from src.embedding_store import l2_normalize
+
+NEIGHBOR_GRAPH_FORMAT_VERSION = 1
+MAX_ROWS = np.iinfo(np.int16).max
+
+
+class NeighborGraphError(RuntimeError):
+    """
+    Raised when the neighbor graph is missing, corrupt, or was built from
+    different embeddings than the ones loaded.
+    """
+
+
+class NeighborGraph:
+    """
+    Read-only top-K neighbor lists, one row per kural.
+    """
+
+    def __init__(self, indices: np.ndarray, scores: np.ndarray, manifest: dict = None):
+        self.indices = indices
+        self.scores = scores
+        self.manifest = manifest or {}
+
+    def __len__(self) -> int:
+        return self.indices.shape[0]
+
+    @property
+    def k(self) -> int:
+        return self.indices.shape[1]
+
+    def neighbors(self, row: int, k: int = None) -> list:
+        """
+        The (row, score) pairs of the k nearest neighbors of `row`, best first.
+        """
+        k = self.k if k is None else min(k, self.k)
+        return [(int(i), float(s)) for i, s in zip(self.indices[row, :k], self.scores[row, :k])]
+
+
+def _dense_neighbors(vectors: np.ndarray, k: int):
+    """
+    Exact top-k cosine neighbors of every row, excluding the row itself.
+    """
+    vectors = l2_normalize(vectors)
+    similarities = vectors @ vectors.T
+    np.fill_diagonal(similarities, -np.inf)
+    k = min(k, len(vectors) - 1)
+    candidates = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(similarities, candidates, axis=1), axis=1, kind="stable")
+    indices = np.take_along_axis(candidates, order, axis=1)
+    return indices, np.take_along_axis(similarities, indices, axis=1)
+
+
+def _previous_pair_scores(previous: NeighborGraph, rerank_model: str) -> dict:
+    """
+    (document hash, neighbor document hash) -> cross-encoder score from a
+    previous graph reranked with the same model, for incremental rebuilds.
+    """
+    if previous is None or previous.manifest.get("rerank_model") != rerank_model:
+        return {}
+    hashes = previous.manifest.get("document_hashes") or []
+    if len(hashes) != len(previous):
+        return {}
+    return {
+        (hashes[row], hashes[int(neighbor)]): float(score)
+        for row in range(len(previous))
+        for neighbor, score in zip(previous.indices[row], previous.scores[row])
+    }
+
+
+def build_neighbor_graph(vectors: np.ndarray, k: int = NEIGHBOR_GRAPH_K, score_pairs=None, rerank_model: str = None,
+                         document_hashes: list = None, previous: NeighborGraph = None) -> NeighborGraph:
+    """
+    Builds the graph from the corpus vectors. With `score_pairs`, a function
+    mapping a list of (row, neighbor row) pairs to cross-encoder scores,
+    each row's k dense neighbors are reordered by cross-encoder score.
+    Scores of pairs whose two documents are unchanged since `previous`
+    (matched by document hash) are reused, so after an incremental embedding
+    run only the pairs touching new or edited kurals go to the cross-encoder.
+    """
+    if len(vectors) > MAX_ROWS:
+        raise NeighborGraphError(f"The int16 neighbor graph holds at most {MAX_ROWS} rows, got {len(vectors)}.")
+    indices, scores = _dense_neighbors(vectors, k)
+    manifest = {"rerank_model": None, "reused_pairs": 0, "scored_pairs": 0}
+    if score_pairs is not None:
+        if document_hashes is None or len(document_hashes) != len(vectors):
+            raise ValueError("Reranking the neighbor graph needs one document hash per row.")
+        known = _previous_pair_scores(previous, rerank_model)
+        pairs = [(row, int(neighbor)) for row in range(len(indices)) for neighbor in indices[row]]
+        pair_keys = [(document_hashes[row], document_hashes[neighbor]) for row, neighbor in pairs]
+        pending = [i for i, key in enumerate(pair_keys) if key not in known]
+        new_scores = np.asarray(score_pairs([pairs[i] for i in pending])) if pending else np.zeros(0)
+        flat = np.array([known.get(key, 0.0) for key in pair_keys], dtype=np.float32)
+        flat[pending] = new_scores
+        scores = flat.reshape(indices.shape)
+        order = np.argsort(-scores, axis=1, kind="stable")
+        indices = np.take_along_axis(indices, order, axis=1)
+        scores = np.take_along_axis(scores, order, axis=1)
+        manifest.update(rerank_model=rerank_model, document_hashes=list(document_hashes),
+                        reused_pairs=len(pairs) - len(pending), scored_pairs=len(pending))
+    return NeighborGraph(indices.astype(np.int16), scores.astype(np.float16), manifest)
+
+
+def _data_files(graph_file: str) -> dict:
+    base = graph_file[:-len(".json")] if graph_file.endswith(".json") else graph_file
+    return {kind: f"{base}.{kind}.npy" for kind in ("indices", "scores")}
+
+
+def save_neighbor_graph(graph: NeighborGraph, embeddings_sha256: str, graph_file: str = NEIGHBOR_GRAPH_FILE) -> dict:
+    files = _data_files(graph_file)
+    os.makedirs(os.path.dirname(graph_file) or ".", exist_ok=True)
+    for kind, path in files.items():
+        atomic_save_npy(path, np.asarray(getattr(graph, kind)))
+    manifest = {
+        "format_version": NEIGHBOR_GRAPH_FORMAT_VERSION,
+        "embeddings_sha256": embeddings_sha256,
+        "rows": len(graph),
+        "k": graph.k,
+        "rerank_model": graph.manifest.get("rerank_model"),
+        "files": {kind: {"file": os.path.basename(p), "sha256": file_sha256(p)} for kind, p in files.items()},
+    }
+    if graph.manifest.get("document_hashes"):
+        manifest["document_hashes"] = graph.manifest["document_hashes"]
+    atomic_write_json(graph_file, manifest)
+    return manifest
+
+
+def load_neighbor_graph(embeddings_sha256: str = None, graph_file: str = NEIGHBOR_GRAPH_FILE) -> NeighborGraph:
+    """
+    Memory-maps the graph. With `embeddings_sha256`, fails if the graph was
+    built from other embeddings (its neighbors would point at the wrong rows).
+    """
+    if not os.path.exists(graph_file):
+        raise NeighborGraphError(
+            f"No neighbor graph at {graph_file}. Run `python embed_data.py` to build the search artifacts."
+        )
+    with open(graph_file, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") != NEIGHBOR_GRAPH_FORMAT_VERSION:
+        raise NeighborGraphError(f"Neighbor graph at {graph_file} is out of date. Re-run `python embed_data.py`.")
+    if embeddings_sha256 is not None and manifest.get("embeddings_sha256") != embeddings_sha256:
+        raise NeighborGraphError(
+            f"Neighbor graph at {graph_file} was built from different embeddings. Re-run `python embed_data.py`."
+        )
+    directory = os.path.dirname(graph_file)
+    arrays = {}
+    for kind, entry in manifest["files"].items():
+        path = os.path.join(directory, entry["file"])
+        if file_sha256(path) != entry["sha256"]:
+            raise NeighborGraphError(f"Checksum mismatch for {path}. Re-run `python embed_data.py`.")
+        arrays[kind] = np.load(path, mmap_mode='r')
+    return NeighborGraph(arrays["indices"], arrays["scores"], manifest)
@@ -0,0 +1,28 @@
+# src/prompts.py
+# The prompt shared by every LLM provider, and the clean-up applied to replies.
+
+# Bump whenever build_prompts changes, so cached explanations are regenerated.
+PROMPT_VERSION = "1"
+
+def build_prompts(query: str, kural_explanation: str):
+    """
+    Returns the (system_prompt, user_prompt) pair shared by every provider.
+    """
+    # --- PROMPT REFINEMENT ---
+    system_prompt = """You are an insightful analyst of philosophy and literature. Your task is to explain the connection between a user's query and a verse from the ancient Tamil text, the Thirukkural."""
+    
+    user_prompt = f"""
+    Analyze the following.
+    
+    **Query:** "{query}"
+    **Thirukkural Verse Explanation:** "{kural_explanation}"
+
+    Now, in 2-3 concise and natural sentences, provide your analysis of the semantic connection:
+    """
+    return system_prompt, user_prompt
+
+def clean_response(response_text: str) -> str:
+    """
+    Ensures we only return the generated text, not an echoed prompt tail.
+    """
+    return response_text.split("semantic connection:")[-1].strip()
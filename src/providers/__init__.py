@@ -0,0 +1,59 @@
+# src/providers/__init__.py
+# Registry of LLM provider plugins. Each provider lives in its own module and
+# imports its heavy libraries (torch/transformers, ollama, google-genai) at
+# module level, so nothing is imported until the configured provider is first
+# used. A provider module exposes:
+#   MODEL_ID                      model name, part of the explanation cache key
+#   REMOTE                        True to call it through the retry/circuit-breaker layer
+#   ERROR_LOG                     prefix for logged failures
+#   unavailable_reason(model, tokenizer) -> message, or None if ready
+#   fallback_message(error)       user-facing text when a call fails
+#   stream(system_prompt, user_prompt, model=None, tokenizer=None)  yields text chunks
+#                                 (local providers also take should_stop, a callable
+#                                 checked while generating)
+import importlib
+import threading
+from src.config import (
+    LLM_PROVIDER_HUGGINGFACE,
+    LLM_PROVIDER_OLLAMA,
+    LLM_PROVIDER_GEMINI,
+    HF_MODEL_ID,
+    OLLAMA_MODEL_ID,
+    GEMINI_MODEL_ID,
+)
+
+# name -> (module path, model ID). The model ID is kept here too so cache
+# lookups don't have to import the backend.
+PROVIDERS = {
+    LLM_PROVIDER_HUGGINGFACE: ("src.providers.huggingface_provider", HF_MODEL_ID),
+    LLM_PROVIDER_OLLAMA: ("src.providers.ollama_provider", OLLAMA_MODEL_ID),
+    LLM_PROVIDER_GEMINI: ("src.providers.gemini_provider", GEMINI_MODEL_ID),
+}
+
+_loaded = {}
+_lock = threading.Lock()
+
+
+def register_provider(name: str, module_path: str, model_id: str):
+    """
+    Adds (or replaces) a provider plugin.
+    """
+    with _lock:
+        PROVIDERS[name] = (module_path, model_id)
+        _loaded.pop(name, None)
+
+
+def provider_model_id(name: str) -> str:
+    return PROVIDERS[name][1] if name in PROVIDERS else ""
+
+
+def get_provider(name: str):
+    """
+    Imports the provider's module on first use. Raises KeyError for an
+    unknown provider name.
+    """
+    if name not in _loaded:
+        with _lock:
+            if name not in _loaded:
+                _loaded[name] = importlib.import_module(PROVIDERS[name][0])
+    return _loaded[name]
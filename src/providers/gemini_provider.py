@@ -0,0 +1,41 @@
+# src/providers/gemini_provider.py
+# Google Gemini backend. Importing this module is what loads `google.genai`,
+# so it only happens when LLM_PROVIDER is "gemini".
+import logging
+import streamlit as st
+from google import genai
+from google.genai import types as genai_types
+from src.config import GEMINI_MODEL_ID, GEMINI_API_KEY, GEMINI_BASE_URL, LLM_REQUEST_TIMEOUT_SECONDS
+
+MODEL_ID = GEMINI_MODEL_ID
+# Remote providers are called through the retry/deadline/circuit-breaker layer.
+REMOTE = True
+ERROR_LOG = "Error with Gemini API"
+
+def unavailable_reason(model=None, tokenizer=None):
+    if not GEMINI_API_KEY:
+        return "Explanation not available: The GEMINI_API_KEY is not configured."
+    return None
+
+def fallback_message(error: Exception) -> str:
+    # The error itself is logged (ERROR_LOG); users only see a generic message.
+    return "Explanation not available due to an API error."
+
+@st.cache_resource
+def get_client() -> genai.Client:
+    http_options = genai_types.HttpOptions(
+        timeout=int(LLM_REQUEST_TIMEOUT_SECONDS * 1000),
+        base_url=GEMINI_BASE_URL or None,
+    )
+    return genai.Client(api_key=GEMINI_API_KEY, http_options=http_options)
+
+def stream(system_prompt: str, user_prompt: str, model=None, tokenizer=None):
+    logging.info(f"Getting explanation from Gemini model: {GEMINI_MODEL_ID}")
+    client = get_client()
+    # The Gemini API handles the system prompt differently, so we combine them
+    full_prompt = f"{system_prompt}\n\n{user_prompt}"
+    for chunk in client.models.generate_content_stream(
+        model=GEMINI_MODEL_ID,
+        contents=full_prompt,
+    ):
+        yield chunk.text or ""
@@ -0,0 +1,194 @@
+# src/providers/huggingface_provider.py
+# Local Hugging Face transformers backend (TinyLlama). Importing this module is
+# what loads `torch` and `transformers`, so it only happens when LLM_PROVIDER
+# is "huggingface".
+import logging
+import threading
+import streamlit as st
+import torch
+from transformers import AutoModelForCausalLM, AutoTokenizer, StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer
+from src.config import HF_MODEL_ID, HF_MAX_NEW_TOKENS, HF_FAST_MAX_NEW_TOKENS, HF_FAST_MODE
+from src.prompts import build_prompts, clean_response
+
+MODEL_ID = HF_MODEL_ID
+REMOTE = False
+ERROR_LOG = "Error during LLM inference"
+
+def unavailable_reason(model=None, tokenizer=None):
+    if not model or not tokenizer:
+        return "Explanation not available: Hugging Face LLM failed to load."
+    return None
+
+def fallback_message(error: Exception) -> str:
+    return "Explanation not available due to a technical issue."
+
+@st.cache_resource
+def load_hf_model():
+    """
+    Loads the Hugging Face model and tokenizer.
+    """
+    try:
+        logging.info(f"Loading Hugging Face model: {HF_MODEL_ID}")
+        tokenizer = AutoTokenizer.from_pretrained(HF_MODEL_ID)
+        model = AutoModelForCausalLM.from_pretrained(HF_MODEL_ID, torch_dtype=torch.float32)
+        # Batched generation pads on the left so every prompt ends where
+        # generation starts; Llama tokenizers ship without a pad token.
+        tokenizer.padding_side = "left"
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+        logging.info("Hugging Face model loaded successfully.")
+        return model, tokenizer
+    except Exception as e:
+        logging.error(f"Error loading Hugging Face model: {e}")
+        return None, None
+
+class _StopWhen(StoppingCriteria):
+    """
+    Ends generate() at the next token once should_stop() is true, so an
+    abandoned explanation stops using the CPU instead of running to
+    max_new_tokens.
+    """
+
+    def __init__(self, should_stop):
+        self.should_stop = should_stop
+
+    def __call__(self, input_ids, scores, **kwargs):
+        return torch.full((input_ids.shape[0],), bool(self.should_stop()), dtype=torch.bool, device=input_ids.device)
+
+def stream(system_prompt: str, user_prompt: str, model=None, tokenizer=None, should_stop=None):
+    """
+    Streams tokens from generate() running on a helper thread. Closing the
+    generator, or should_stop() becoming true, stops generation at the next
+    token; the latter works even while no text is ready for the consumer.
+    """
+    chat_prompt = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+    inputs = tokenizer.apply_chat_template(chat_prompt, add_generation_prompt=True, return_tensors="pt", return_dict=True)
+    streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True)
+
+    errors = []
+    stop = threading.Event()
+
+    def generate():
+        try:
+            model.generate(**inputs, **_hf_generation_kwargs(HF_FAST_MODE), streamer=streamer,
+                           stopping_criteria=StoppingCriteriaList([_StopWhen(
+                               lambda: stop.is_set() or (should_stop is not None and should_stop()))]))
+        except Exception as e:
+            errors.append(e)
+            # Unblock the consumer; nothing more will be produced.
+            streamer.end()
+
+    logging.info(f"Getting explanation from Hugging Face model: {HF_MODEL_ID}")
+    threading.Thread(target=generate, daemon=True).start()
+    try:
+        for text in streamer:
+            yield text
+    finally:
+        stop.set()
+    if errors:
+        raise errors[0]
+
+def _hf_generation_kwargs(fast: bool) -> dict:
+    """
+    Sampling settings for TinyLlama. Fast mode decodes greedily with a
+    shorter budget, which is the main lever on CPU-only hardware.
+    """
+    if fast:
+        return {"max_new_tokens": HF_FAST_MAX_NEW_TOKENS, "do_sample": False}
+    return {"max_new_tokens": HF_MAX_NEW_TOKENS, "temperature": 0.3, "do_sample": True}
+
+def _shared_prefix_length(rows: list) -> int:
+    """
+    Number of leading tokens common to every prompt, leaving at least one
+    token per prompt to feed through generate().
+    """
+    limit = min(len(row) for row in rows) - 1
+    length = 0
+    while length < limit and len({row[length] for row in rows}) == 1:
+        length += 1
+    return length
+
+def _generate_with_shared_prefix(model, tokenizer, rows: list, generation_kwargs: dict):
+    """
+    Runs the common prompt prefix (system prompt, query) through the model
+    once, copies its KV cache across the batch, and generates from there.
+    Each row is laid out as [prefix][padding][own suffix]; the attention
+    mask hides the padding, so positions and outputs match unpadded prompts.
+    Returns (output_ids, prompt_length).
+    """
+    prefix_length = _shared_prefix_length(rows)
+    suffix_length = max(len(row) - prefix_length for row in rows)
+    prompt_length = prefix_length + suffix_length
+
+    input_ids = torch.full((len(rows), prompt_length), tokenizer.pad_token_id, dtype=torch.long)
+    attention_mask = torch.zeros_like(input_ids)
+    for i, row in enumerate(rows):
+        suffix = row[prefix_length:]
+        input_ids[i, :prefix_length] = torch.tensor(row[:prefix_length])
+        attention_mask[i, :prefix_length] = 1
+        input_ids[i, prompt_length - len(suffix):] = torch.tensor(suffix)
+        attention_mask[i, prompt_length - len(suffix):] = 1
+
+    with torch.no_grad():
+        prefix_cache = model(input_ids[:1, :prefix_length], use_cache=True).past_key_values
+    prefix_cache.batch_repeat_interleave(len(rows))
+
+    outputs = model.generate(
+        input_ids=input_ids,
+        attention_mask=attention_mask,
+        past_key_values=prefix_cache,
+        pad_token_id=tokenizer.pad_token_id,
+        **generation_kwargs,
+    )
+    return outputs, prompt_length
+
+def get_relevance_explanations_batch_hf(query: str, kural_explanations: list, model, tokenizer, fast: bool = HF_FAST_MODE,
+                                        should_stop=None) -> list:
+    """
+    Explains several results with one left-padded generate() call on the
+    local Hugging Face model, instead of one call per kural. The shared
+    system-prompt/query prefix is encoded once and its KV cache reused
+    across the batch. Returns one explanation per input, in order.
+    If should_stop() becomes true, generation ends at the next token and
+    the (truncated) outputs are returned as they are.
+    """
+    if not kural_explanations:
+        return []
+    if not model or not tokenizer:
+        return ["Explanation not available: Hugging Face LLM failed to load."] * len(kural_explanations)
+
+    chats = []
+    for kural_explanation in kural_explanations:
+        system_prompt, user_prompt = build_prompts(query, kural_explanation)
+        chats.append([
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ])
+    # The rendered template already contains BOS, so don't add it twice.
+    prompts = tokenizer.apply_chat_template(chats, add_generation_prompt=True, tokenize=False)
+    generation_kwargs = _hf_generation_kwargs(fast)
+    if should_stop is not None:
+        generation_kwargs["stopping_criteria"] = StoppingCriteriaList([_StopWhen(should_stop)])
+
+    try:
+        logging.info(f"Getting {len(prompts)} explanations in one batch from Hugging Face model: {HF_MODEL_ID}")
+        rows = [tokenizer(prompt, add_special_tokens=False)["input_ids"] for prompt in prompts]
+        try:
+            outputs, prompt_length = _generate_with_shared_prefix(model, tokenizer, rows, generation_kwargs)
+        except Exception as e:
+            # Prefix caching depends on the model's cache implementation; a
+            # plain left-padded batch is slower but always works.
+            logging.warning(f"Shared-prefix generation unavailable, using plain batch: {e}")
+            inputs = tokenizer(prompts, add_special_tokens=False, padding=True, return_tensors="pt")
+            outputs = model.generate(**inputs, pad_token_id=tokenizer.pad_token_id, **generation_kwargs)
+            prompt_length = inputs["input_ids"].shape[-1]
+        return [
+            clean_response(tokenizer.decode(output[prompt_length:], skip_special_tokens=True))
+            for output in outputs
+        ]
+    except Exception as e:
+        logging.error(f"Error during LLM inference: {e}")
+        return ["Explanation not available due to a technical issue."] * len(kural_explanations)
@@ -0,0 +1,36 @@
+# src/providers/ollama_provider.py
+# Ollama backend. Importing this module is what loads the `ollama` library,
+# so it only happens when LLM_PROVIDER is "ollama".
+import logging
+import streamlit as st
+import ollama
+from src.config import OLLAMA_MODEL_ID, OLLAMA_HOST, LLM_REQUEST_TIMEOUT_SECONDS
+
+MODEL_ID = OLLAMA_MODEL_ID
+# Remote providers are called through the retry/deadline/circuit-breaker layer.
+REMOTE = True
+ERROR_LOG = "Error with Ollama"
+
+def unavailable_reason(model=None, tokenizer=None):
+    return None
+
+def fallback_message(error: Exception) -> str:
+    return "Explanation not available: Could not connect to Ollama."
+
+@st.cache_resource
+def get_client() -> ollama.Client:
+    # Extra kwargs go to the underlying httpx.Client, which pools connections.
+    return ollama.Client(host=OLLAMA_HOST, timeout=LLM_REQUEST_TIMEOUT_SECONDS)
+
+def stream(system_prompt: str, user_prompt: str, model=None, tokenizer=None):
+    logging.info(f"Getting explanation from Ollama model: {OLLAMA_MODEL_ID}")
+    response = get_client().chat(
+        model=OLLAMA_MODEL_ID,
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ],
+        stream=True,
+    )
+    for chunk in response:
+        yield chunk['message']['content']
@@ -0,0 +1,192 @@
+# src/search_cache.py
+# Two-level cache for search results: a bounded in-process LRU with TTL in
+# front of a SQLite table that survives restarts.
+#
+# Entries are keyed on the normalized query, top_k and a fingerprint of every
+# setting that affects the ranking (models, RETRIEVE_K, RELEVANCE_THRESHOLD,
+# the embedding checksum). Changing any of them changes the fingerprint, so
+# stale entries can never be served. Several processes with different
+# settings (the app, the search service, benchmarks) can share one database:
+# each only reads its own fingerprint's rows, and rows of other or old
+# fingerprints age out through the TTL and the size bound. The TTL applies
+# to both tiers, measured from when a result was stored.
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def normalize_query(query: str) -> str:
+    """
+    Case- and whitespace-insensitive form of a query, so "Friendship " and
+    "friendship" share one cache entry.
+    """
+    return " ".join(query.casefold().split())
+
+
+def config_fingerprint(settings: dict) -> str:
+    """
+    Stable short hash of the settings that determine search results.
+    """
+    payload = json.dumps(settings, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class QueryResultCache:
+    """
+    Thread-safe two-level cache. Values must be JSON-serializable
+    (search results are cached as lists of metadata row indices).
+    Pass db_path=None to keep only the in-process tier.
+    """
+
+    def __init__(self, fingerprint: str, max_entries: int = 512, ttl_seconds: float = 6 * 60 * 60,
+                 db_path: str = None, disk_max_entries: int = 50_000):
+        self.fingerprint = fingerprint
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk_max_entries = disk_max_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {
+            "hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "disk_evictions": 0,
+            "disk_expirations": 0,
+        }
+        self._db = None
+        if db_path:
+            self._open_db(db_path)
+
+    # --- Disk tier ---
+    def _open_db(self, db_path: str):
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS search_results ("
+            " key TEXT PRIMARY KEY, fingerprint TEXT NOT NULL,"
+            " value TEXT NOT NULL, last_access REAL NOT NULL, stored_at REAL NOT NULL)"
+        )
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(search_results)")}
+        if "stored_at" not in columns:
+            # Databases from before the disk TTL: their rows count as expired.
+            self._db.execute("ALTER TABLE search_results ADD COLUMN stored_at REAL NOT NULL DEFAULT 0")
+        # Expired rows of any fingerprint can go; live ones may belong to
+        # another process with different settings.
+        deleted = self._db.execute(
+            "DELETE FROM search_results WHERE stored_at < ?", (time.time() - self.ttl_seconds,)
+        ).rowcount
+        self._db.commit()
+        self._counters["disk_expirations"] += max(deleted, 0)
+
+    def _disk_get(self, key: str):
+        """
+        (value, age in seconds) of this fingerprint's row for `key`, or None
+        if there is none or it has expired (then it is deleted).
+        """
+        row = self._db.execute(
+            "SELECT value, stored_at FROM search_results WHERE key = ? AND fingerprint = ?", (key, self.fingerprint)
+        ).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        age = now - row[1]
+        if age > self.ttl_seconds:
+            self._db.execute("DELETE FROM search_results WHERE key = ?", (key,))
+            self._db.commit()
+            self._counters["disk_expirations"] += 1
+            return None
+        self._db.execute("UPDATE search_results SET last_access = ? WHERE key = ?", (now, key))
+        self._db.commit()
+        return json.loads(row[0]), max(age, 0.0)
+
+    def _disk_put(self, key: str, value):
+        now = time.time()
+        self._db.execute(
+            "INSERT OR REPLACE INTO search_results (key, fingerprint, value, last_access, stored_at)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (key, self.fingerprint, json.dumps(value), now, now),
+        )
+        overflow = self._db.execute("SELECT COUNT(*) FROM search_results").fetchone()[0] - self.disk_max_entries
+        if overflow > 0:
+            self._db.execute(
+                "DELETE FROM search_results WHERE key IN"
+                " (SELECT key FROM search_results ORDER BY last_access LIMIT ?)",
+                (overflow,),
+            )
+            self._counters["disk_evictions"] += overflow
+        self._db.commit()
+
+    # --- Public API ---
+    def make_key(self, query: str, top_k: int, scope: str = "") -> str:
+        raw = f"{self.fingerprint}\x1f{top_k}\x1f{normalize_query(query)}"
+        if scope:
+            raw += f"\x1f{scope}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, query: str, top_k: int, scope: str = ""):
+        """
+        Returns the cached value, or None on a miss. A disk hit is promoted
+        into the in-process tier. `scope` separates results for the same
+        query under different search filters.
+        """
+        key = self.make_key(query, top_k, scope)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                if now - stored_at <= self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    self._counters["hits"] += 1
+                    return value
+                del self._memory[key]
+                self._counters["expirations"] += 1
+
+            if self._db is not None:
+                found = self._disk_get(key)
+                if found is not None:
+                    value, age = found
+                    self._counters["disk_hits"] += 1
+                    # Promoted with its original age, so it still expires on time.
+                    self._remember(key, value, now - age)
+                    return value
+
+            self._counters["misses"] += 1
+            return None
+
+    def put(self, query: str, top_k: int, value, scope: str = ""):
+        key = self.make_key(query, top_k, scope)
+        with self._lock:
+            self._remember(key, value, time.monotonic())
+            if self._db is not None:
+                self._disk_put(key, value)
+
+    def _remember(self, key: str, value, now: float):
+        self._memory[key] = (now, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters)
+            stats["memory_entries"] = len(self._memory)
+            if self._db is not None:
+                stats["disk_entries"] = self._db.execute(
+                    "SELECT COUNT(*) FROM search_results WHERE fingerprint = ?", (self.fingerprint,)
+                ).fetchone()[0]
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM search_results WHERE fingerprint = ?", (self.fingerprint,))
+                self._db.commit()
@@ -1,74 +1,540 @@
 # src/search_logic.py
-import pickle
 import streamlit as st
-from sentence_transformers import SentenceTransformer, CrossEncoder
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING
 import numpy as np
+from src import metrics
 from src.config import (
     EMBEDDING_MODEL,
-    METADATA_FILE,
-    SEARCH_ARTIFACTS_PATH,
     QUERY_PREFIX,
     RERANK_MODEL,
     RETRIEVE_K,
     RERANK_TOP_K,
-    RELEVANCE_THRESHOLD,
+    ENCODE_BATCH_SIZE,
+    RERANK_BATCH_SIZE,
+    SEARCH_CACHE_MAX_ENTRIES,
+    SEARCH_CACHE_TTL_SECONDS,
+    SEARCH_CACHE_DB,
+    HYBRID_SEARCH,
+    LEXICAL_K,
+    RRF_K,
+    INFERENCE_BACKEND,
+    ADAPTIVE_RERANK,
+    CASCADE_OFF_TOPIC_SIMILARITY,
+    CASCADE_SIMILARITY_WINDOW,
+    CASCADE_MIN_CANDIDATES,
+    CASCADE_DECISIVE_MARGIN,
+    CASCADE_CHUNK_SIZE,
+    CASCADE_STOP_MARGIN,
+    COARSE_TO_FINE_CHAPTERS,
+    CHAPTER_SEARCH_TOP_N,
+    RELATED_KURALS_SHOWN,
 )
-import os
-from sklearn.metrics.pairwise import cosine_similarity
+from src.embedding_store import EmbeddingStore, load_embedding_store
+from src.metadata_store import MetadataStore, load_metadata_store
+from src.model_backends import load_bi_encoder_model, load_cross_encoder_model, backend_relevance_threshold
+from src.facet_index import FacetFilter, FacetIndex, FacetIndexError, load_facet_index
+from src.neighbor_graph import NeighborGraphError, load_neighbor_graph
+from src.lexical_index import BM25Index, ExactMatcher, LexicalIndexError, load_bm25_index, reciprocal_rank_fusion
+from src.search_cache import QueryResultCache, config_fingerprint
 
-# Path to the new embeddings file
-EMBEDDINGS_FILE = os.path.join(SEARCH_ARTIFACTS_PATH, "kural_embeddings.npy")
+# sentence_transformers pulls in torch, so it is only imported inside the
+# model loaders; the UI can render while they warm up in the background.
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
 
 @st.cache_resource
-def load_search_artifacts():
+def load_search_data():
     """
-    Loads the sentence transformer model, embeddings, and metadata.
+    Opens the memory-mapped embeddings and metadata. Fast, and fails early
+    if the artifacts don't match EMBEDDING_MODEL.
+    """
+    print("Loading search data...")
+    embeddings = load_embedding_store()
+    metadata = load_metadata_store()
+    print("Search data loaded successfully.")
+    return embeddings, metadata
+
+@st.cache_resource
+def load_bi_encoder():
+    """
+    Loads the sentence transformer used to embed queries, on the configured
+    INFERENCE_BACKEND.
     """
-    print("Loading search artifacts...")
-    model = SentenceTransformer(EMBEDDING_MODEL)
-    embeddings = np.load(EMBEDDINGS_FILE)
-    with open(METADATA_FILE, 'rb') as f:
-        metadata = pickle.load(f)
-    print("Search artifacts loaded successfully.")
-    return model, embeddings, metadata
+    print(f"Loading bi-encoder model ({INFERENCE_BACKEND})...")
+    model = load_bi_encoder_model(INFERENCE_BACKEND)
+    print("Bi-encoder loaded successfully.")
+    return model
 
 @st.cache_resource
 def load_reranker():
     """
-    Loads the cross-encoder used to re-rank retrieval candidates.
+    Loads the cross-encoder used to re-rank retrieval candidates, on the
+    configured INFERENCE_BACKEND.
     """
-    print("Loading re-ranker model...")
-    reranker = CrossEncoder(RERANK_MODEL)
+    print(f"Loading re-ranker model ({INFERENCE_BACKEND})...")
+    reranker = load_cross_encoder_model(INFERENCE_BACKEND)
     print("Re-ranker loaded successfully.")
     return reranker
 
-def semantic_search(query: str, model: SentenceTransformer, embeddings: np.ndarray, metadata: list, top_k: int = RERANK_TOP_K):
+@st.cache_resource
+def load_relevance_threshold() -> float:
     """
-    Two-stage retrieval:
-      1. Bi-encoder + cosine similarity retrieves the top RETRIEVE_K candidates.
-      2. A cross-encoder re-scores (query, candidate) pairs and keeps the best
-         top_k above RELEVANCE_THRESHOLD.
-    Returns a list of metadata dicts (possibly empty if nothing is relevant).
+    RELEVANCE_THRESHOLD as calibrated for the configured INFERENCE_BACKEND.
     """
-    # --- Stage 1: bi-encoder candidate retrieval ---
-    # bge/e5-family models expect the instruction prefix on the query only.
-    query_embedding = model.encode([QUERY_PREFIX + query])
-    similarities = cosine_similarity(query_embedding, embeddings)[0]
+    return backend_relevance_threshold(INFERENCE_BACKEND)
+
+@st.cache_resource
+def load_lexical_index():
+    """
+    Loads the BM25 index used for hybrid retrieval, or None if hybrid search
+    is disabled or the index hasn't been built (dense retrieval only).
+    """
+    if not HYBRID_SEARCH:
+        return None
+    try:
+        index = load_bm25_index()
+    except LexicalIndexError as e:
+        print(f"Hybrid search disabled: {e}")
+        return None
+    print("Lexical index loaded successfully.")
+    return index
+
+@st.cache_resource
+def load_exact_matcher() -> ExactMatcher:
+    """
+    Kural-number and exact-phrase lookups over the loaded metadata.
+    """
+    return ExactMatcher(load_search_data()[1])
+
+@st.cache_resource
+def load_facets():
+    """
+    Loads the Paal/chapter row ranges and chapter centroids, or None if they
+    haven't been built for the loaded embeddings (no faceted search).
+    """
+    embeddings, _ = load_search_data()
+    float32 = embeddings.manifest.get("variants", {}).get("float32", {})
+    try:
+        index = load_facet_index(float32.get("sha256"))
+    except FacetIndexError as e:
+        print(f"Faceted search disabled: {e}")
+        return None
+    print("Facet index loaded successfully.")
+    return index
+
+def _require_facets() -> FacetIndex:
+    facet_index = load_facets()
+    if facet_index is None:
+        raise FacetIndexError("Faceted search needs the facet index. Run `python embed_data.py` to build it.")
+    return facet_index
 
-    # Take the top RETRIEVE_K candidate indices, highest similarity first.
-    candidate_indices = np.argsort(similarities)[-RETRIEVE_K:][::-1]
+@st.cache_resource
+def load_related_graph():
+    """
+    Loads the precomputed kural-to-kural neighbor graph, or None if it hasn't
+    been built for the loaded embeddings (no related kurals).
+    """
+    embeddings, _ = load_search_data()
+    float32 = embeddings.manifest.get("variants", {}).get("float32", {})
+    try:
+        graph = load_neighbor_graph(float32.get("sha256"))
+    except NeighborGraphError as e:
+        print(f"Related kurals disabled: {e}")
+        return None
+    print("Neighbor graph loaded successfully.")
+    return graph
+
+def related_kurals(row: int, metadata: MetadataStore, k: int = RELATED_KURALS_SHOWN) -> list:
+    """
+    The k kurals most related to metadata row `row`, as (record, score)
+    pairs, read from the neighbor graph: no model call. Empty if the graph
+    isn't available.
+    """
+    graph = load_related_graph()
+    if graph is None:
+        return []
+    return [(metadata[neighbor], score) for neighbor, score in graph.neighbors(row, k)]
+
+def load_search_artifacts():
+    """
+    Loads the sentence transformer model, embeddings, and metadata.
+    The embedding store is opened first so a model mismatch fails before
+    the (slow) model load.
+    """
+    embeddings, metadata = load_search_data()
+    return load_bi_encoder(), embeddings, metadata
+
+@st.cache_resource
+def start_model_warmup(extra_loaders: tuple = ()) -> Future:
+    """
+    Starts loading the bi-encoder, the cross-encoder and any extra loaders
+    (e.g. the local LLM) on a background thread, once per process. Callers
+    wait on the returned future only when they actually need the models.
+    """
+    def warm_up():
+        load_lexical_index()
+        load_exact_matcher()
+        load_facets()
+        load_related_graph()
+        load_bi_encoder()
+        load_reranker()
+        return [loader() for loader in extra_loaders]
+
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-warmup")
+    future = executor.submit(warm_up)
+    executor.shutdown(wait=False)
+    return future
+
+def _top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Returns the indices of the k highest scores in each row, highest first.
+    Uses argpartition so only the k winners are sorted, not the whole corpus.
+    """
+    k = min(k, scores.shape[1])
+    candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, candidates, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(candidates, order, axis=1)
+
+def _score_dense(query_embeddings: np.ndarray, embeddings: EmbeddingStore, row_ranges: list):
+    """
+    Cosine similarities and the top RETRIEVE_K rows per query. `row_ranges`
+    gives, per query, the [start, end) ranges to score (None: every row);
+    queries sharing the same ranges are scored together, over those rows
+    only. Rows a query didn't score are -inf in the similarity matrix.
+    """
+    if all(ranges is None for ranges in row_ranges):
+        similarities = embeddings.score(query_embeddings)
+        return similarities, list(_top_k_indices(similarities, RETRIEVE_K))
+    similarities = np.full((len(query_embeddings), len(embeddings)), -np.inf, dtype=np.float32)
+    dense_candidates = [None] * len(query_embeddings)
+    groups = {}
+    for i, ranges in enumerate(row_ranges):
+        groups.setdefault(None if ranges is None else tuple(ranges), []).append(i)
+    for ranges, members in groups.items():
+        if ranges is None:
+            rows = np.arange(len(embeddings))
+        else:
+            rows = np.concatenate([np.arange(start, end) for start, end in ranges])
+        scores = embeddings.score(query_embeddings[members], None if ranges is None else list(ranges))
+        similarities[np.ix_(members, rows)] = scores
+        for i, top in zip(members, _top_k_indices(scores, RETRIEVE_K)):
+            dense_candidates[i] = rows[top]
+    return similarities, dense_candidates
 
-    # --- Stage 2: cross-encoder re-ranking ---
+def _fuse_lexical_candidates(queries: list, dense_candidates: list, lexical_index: BM25Index,
+                             row_ranges: list = None) -> list:
+    """
+    Merges each query's dense candidates with its top LEXICAL_K BM25 hits by
+    reciprocal-rank fusion and keeps the best RETRIEVE_K, so the cross-encoder
+    workload stays the same. Queries with no lexical hit keep the dense list.
+    `row_ranges` limits each query's BM25 hits to its facet filter.
+    """
+    if lexical_index is None:
+        return [[int(i) for i in candidates] for candidates in dense_candidates]
+    fused = []
+    for query, candidates, ranges in zip(queries, dense_candidates, row_ranges or [None] * len(queries)):
+        lexical = lexical_index.top_k(query, LEXICAL_K, ranges)
+        if len(lexical) == 0:
+            fused.append([int(i) for i in candidates])
+        else:
+            fused.append(reciprocal_rank_fusion([candidates, lexical], RRF_K)[:RETRIEVE_K])
+    return fused
+
+def retrieve_candidates(queries: list, model: "SentenceTransformer", embeddings: EmbeddingStore,
+                         chapter_positions: list = None):
+    """
+    Stage 1: per query, the RETRIEVE_K candidate row indices from the dense
+    scores fused with the BM25 hits, best first. `chapter_positions` gives,
+    per query, the chapters its facet filter allows (None: all of them);
+    only their rows are scored. With COARSE_TO_FINE_CHAPTERS, the dense
+    scoring is further narrowed to the query's closest chapter centroids.
+    Also returns the (queries x corpus) cosine similarity matrix.
+    """
+    chapter_positions = chapter_positions or [None] * len(queries)
+    # bge/e5-family models expect the instruction prefix on the query only.
+    with metrics.span("encode"):
+        query_embeddings = np.asarray(model.encode(
+            [QUERY_PREFIX + query for query in queries],
+            batch_size=ENCODE_BATCH_SIZE,
+        ))
+    facet_index = load_facets() if COARSE_TO_FINE_CHAPTERS > 0 or any(p is not None for p in chapter_positions) else None
+    filter_ranges = [None if positions is None else facet_index.row_ranges(positions) for positions in chapter_positions]
+    dense_ranges = filter_ranges
+    if COARSE_TO_FINE_CHAPTERS > 0 and facet_index is not None:
+        with metrics.span("coarse_chapters"):
+            dense_ranges = [
+                facet_index.row_ranges([position for position, _ in
+                                        facet_index.rank_chapters(query_embeddings[i:i + 1], positions)[0][:COARSE_TO_FINE_CHAPTERS]])
+                for i, positions in enumerate(chapter_positions)
+            ]
+    # The store holds pre-normalized vectors, so this is a plain dot product.
+    with metrics.span("dense_score"):
+        similarities, dense_candidates = _score_dense(query_embeddings, embeddings, dense_ranges)
+    with metrics.span("lexical_fusion"):
+        candidate_lists = _fuse_lexical_candidates(queries, dense_candidates, load_lexical_index(), filter_ranges)
+    return candidate_lists, similarities
+
+def rerank_candidates(queries: list, candidate_lists: list, metadata: MetadataStore) -> list:
+    """
+    Stage 2: scores every (query, candidate) pair with the cross-encoder in
+    one batched call. Returns, per query, (row, score) pairs sorted by score.
+    """
     reranker = load_reranker()
     pairs = [
         (query, metadata[i].get("kural_english_explanation", ""))
-        for i in candidate_indices
+        for query, candidates in zip(queries, candidate_lists)
+        for i in candidates
     ]
-    rerank_scores = reranker.predict(pairs)
+    with metrics.span("rerank"):
+        rerank_scores = np.asarray(reranker.predict(pairs, batch_size=RERANK_BATCH_SIZE)) if pairs else np.zeros(0)
+    metrics.increment("rerank_pairs_total", len(pairs))
+
+    ranked_lists = []
+    offset = 0
+    for candidates in candidate_lists:
+        scores = rerank_scores[offset:offset + len(candidates)]
+        offset += len(candidates)
+        ranked_lists.append(sorted(((int(row), float(score)) for row, score in zip(candidates, scores)),
+                                   key=lambda x: x[1], reverse=True))
+    return ranked_lists
+
+def _plan_cascade(candidates: list, similarity: np.ndarray, top_k: int):
+    """
+    Decides, from the bi-encoder scores alone, how much re-ranking a query
+    needs. Returns (mode, candidates): "reject" (off-topic, no candidates),
+    "decisive" (only the top_k need a threshold check) or "chunked" (the
+    similarity window, to be scored chunk by chunk).
+    """
+    best = float(similarity[candidates].max()) if candidates else 0.0
+    if best < CASCADE_OFF_TOPIC_SIMILARITY:
+        return "reject", []
+    cutoff = best - CASCADE_SIMILARITY_WINDOW
+    window = [row for position, row in enumerate(candidates)
+              if position < CASCADE_MIN_CANDIDATES or similarity[row] >= cutoff]
+    by_similarity = sorted(window, key=lambda row: similarity[row], reverse=True)
+    if len(by_similarity) > top_k and similarity[by_similarity[top_k - 1]] - similarity[by_similarity[top_k]] >= CASCADE_DECISIVE_MARGIN:
+        return "decisive", by_similarity[:top_k]
+    return "chunked", window
+
+def _rerank_adaptive(queries: list, candidate_lists: list, similarities: np.ndarray, metadata: MetadataStore,
+                     top_k: int, relevance_threshold: float) -> list:
+    """
+    The adaptive cascade (ADAPTIVE_RERANK). Candidates are scored in rounds
+    of CASCADE_CHUNK_SIZE per query, all queries still open sharing one
+    cross-encoder call per round. A query closes once top_k of its scores
+    clear the threshold by CASCADE_STOP_MARGIN: a cross-encoder logit has no
+    hard upper bound, so this margin stands in for "no remaining candidate
+    can overtake them". Returns ranked (row, score) lists like
+    rerank_candidates, covering only the candidates actually scored.
+    """
+    plans = [_plan_cascade(candidates, row_similarity, top_k)
+             for candidates, row_similarity in zip(candidate_lists, similarities)]
+    for mode, _ in plans:
+        metrics.increment("rerank_cascade_total", mode=mode)
+
+    scored = [[] for _ in queries]
+    pending = [list(candidates) if mode != "decisive" else [] for mode, candidates in plans]
+    # Decisive queries are scored in the first round, all at once.
+    first_round = [candidates if mode == "decisive" else [] for mode, candidates in plans]
+    round_number = 0
+    while True:
+        chunks = []
+        for i in range(len(queries)):
+            chunk = first_round[i] if round_number == 0 else []
+            if plans[i][0] == "chunked":
+                chunk = pending[i][:CASCADE_CHUNK_SIZE]
+                pending[i] = pending[i][CASCADE_CHUNK_SIZE:]
+            chunks.append(chunk)
+        if not any(chunks):
+            break
+        for i, ranked in enumerate(rerank_candidates(queries, chunks, metadata)):
+            scored[i].extend(ranked)
+            scores = sorted((score for _, score in scored[i]), reverse=True)
+            if len(scores) >= top_k and scores[top_k - 1] >= relevance_threshold + CASCADE_STOP_MARGIN:
+                pending[i] = []
+        round_number += 1
+
+    return [sorted(ranked, key=lambda x: x[1], reverse=True) for ranked in scored]
+
+def _allowed_chapters(facet_filters: list) -> list:
+    """
+    Per query, the chapter positions its FacetFilter allows, or None when it
+    has none. Raises ValueError for an unknown Paal or chapter.
+    """
+    if not any(facet_filters):
+        return [None] * len(facet_filters)
+    facet_index = _require_facets()
+    return [facet_index.chapter_positions(facet_filter) if facet_filter else None for facet_filter in facet_filters]
+
+def search_indices_batch(queries: list, model: "SentenceTransformer", embeddings: EmbeddingStore, metadata: MetadataStore,
+                         top_k: int = RERANK_TOP_K, relevance_threshold: float = None, adaptive: bool = None,
+                         facet_filters: list = None) -> list:
+    """
+    Runs both retrieval stages and returns, per query, the metadata row
+    indices of the results (best first), for callers that cache or page
+    through results themselves (the search service, the benchmarks).
+    Queries answered by the exact matcher skip both models.
+    `relevance_threshold` and `adaptive` override the configured threshold
+    and ADAPTIVE_RERANK; `facet_filters` holds an optional FacetFilter per query.
+    """
+    if not queries:
+        return []
+    chapter_positions = _allowed_chapters(facet_filters or [None] * len(queries))
+
+    # --- Fast path: kural numbers and exact phrases need no model ---
+    with metrics.span("exact_match"):
+        matcher = load_exact_matcher()
+        all_indices = [matcher.match(query) for query in queries]
+    exact = sum(1 for indices in all_indices if indices is not None)
+    for i, positions in enumerate(chapter_positions):
+        if positions is None:
+            continue
+        if not positions:
+            # The filter excludes every chapter (e.g. a chapter outside the chosen Paal).
+            all_indices[i] = []
+        elif all_indices[i] is not None:
+            ranges = load_facets().row_ranges(positions)
+            all_indices[i] = [row for row in all_indices[i] if any(start <= row < end for start, end in ranges)]
+    semantic = [i for i, indices in enumerate(all_indices) if indices is None]
+    metrics.increment("search_queries_total", exact, path="exact")
+    metrics.increment("search_queries_total", len(semantic), path="semantic")
+    for i, indices in enumerate(all_indices):
+        if indices is not None:
+            all_indices[i] = indices[:top_k]
+    if not semantic:
+        return all_indices
+    semantic_queries = [queries[i] for i in semantic]
+
+    if relevance_threshold is None:
+        relevance_threshold = load_relevance_threshold()
+    if adaptive is None:
+        adaptive = ADAPTIVE_RERANK
+    candidate_lists, similarities = retrieve_candidates(semantic_queries, model, embeddings,
+                                                         [chapter_positions[i] for i in semantic])
+    if adaptive:
+        ranked_lists = _rerank_adaptive(semantic_queries, candidate_lists, similarities, metadata, top_k, relevance_threshold)
+    else:
+        ranked_lists = rerank_candidates(semantic_queries, candidate_lists, metadata)
+    metrics.note("rerank_pairs", sum(len(ranked) for ranked in ranked_lists))
 
-    # Sort candidates by cross-encoder score (descending) and keep those that
-    # clear the relevance threshold, up to top_k.
-    ranked = sorted(zip(candidate_indices, rerank_scores), key=lambda x: x[1], reverse=True)
-    results = [metadata[i] for i, score in ranked if score >= RELEVANCE_THRESHOLD][:top_k]
+    # Keep the candidates that clear the relevance threshold, up to top_k.
+    thresholded = 0
+    for i, ranked in zip(semantic, ranked_lists):
+        relevant = [row for row, score in ranked if score >= relevance_threshold]
+        thresholded += len(ranked) - len(relevant)
+        all_indices[i] = relevant[:top_k]
 
-    return results
\ No newline at end of file
+    metrics.increment("search_candidates_thresholded_total", thresholded)
+    metrics.increment("search_empty_results_total", sum(1 for i in semantic if not all_indices[i]))
+    metrics.note("thresholded_out", thresholded)
+    return all_indices
+
+def semantic_search_batch(queries: list, model: "SentenceTransformer", embeddings: EmbeddingStore, metadata: MetadataStore, top_k: int = RERANK_TOP_K,
+                          facet_filters: list = None):
+    """
+    Batched version of semantic_search for evaluation sets and bulk jobs:
+      1. All queries are encoded in one call and scored against the corpus
+         with a single matrix product; the top RETRIEVE_K per query are fused
+         with the BM25 hits.
+      2. Every (query, candidate) pair goes to the cross-encoder in one
+         batched predict call, then is split back per query.
+    `facet_filters` optionally restricts each query to some Paals/chapters.
+    Returns one result list per query, in the same order as `queries`.
+    """
+    all_indices = search_indices_batch(queries, model, embeddings, metadata, top_k, facet_filters=facet_filters)
+    return [[metadata[i] for i in indices] for indices in all_indices]
+
+def semantic_search(query: str, model: "SentenceTransformer", embeddings: EmbeddingStore, metadata: MetadataStore, top_k: int = RERANK_TOP_K,
+                    facet_filter: FacetFilter = None):
+    """
+    Two-stage retrieval:
+      0. Kural numbers ("kural 42") and exact or quoted phrases are looked up
+         directly, without either model.
+      1. Bi-encoder + cosine similarity (dot product over the pre-normalized
+         embedding store) retrieves the top RETRIEVE_K candidates, fused by
+         reciprocal rank with the top LEXICAL_K BM25 hits (HYBRID_SEARCH).
+      2. A cross-encoder re-scores (query, candidate) pairs and keeps the best
+         top_k above RELEVANCE_THRESHOLD.
+    A FacetFilter limits every stage to the rows of the selected Paals or
+    chapters. Returns a list of metadata dicts (possibly empty if nothing is
+    relevant). This is a batch of one, so it always agrees with
+    semantic_search_batch.
+    """
+    return semantic_search_batch([query], model, embeddings, metadata, top_k, [facet_filter])[0]
+
+def search_chapters(query: str, model: "SentenceTransformer", top_n: int = CHAPTER_SEARCH_TOP_N,
+                    facet_filter: FacetFilter = None) -> list:
+    """
+    "Find relevant chapters": the chapters whose centroid is closest to the
+    query, best first, as chapter dicts (number, names, Paal, row range) with
+    a "score". Needs only the bi-encoder.
+    """
+    facet_index = _require_facets()
+    positions = facet_index.chapter_positions(facet_filter)
+    with metrics.span("encode"):
+        query_embedding = np.asarray(model.encode([QUERY_PREFIX + query], batch_size=ENCODE_BATCH_SIZE))
+    with metrics.span("chapter_rank"):
+        ranked = facet_index.rank_chapters(query_embedding, positions)[0][:top_n]
+    return [{**facet_index.chapters[position], "score": score} for position, score in ranked]
+
+
+def search_config_fingerprint(embeddings: EmbeddingStore) -> str:
+    """
+    Fingerprint of everything that changes search results, used to key the
+    result cache. Includes the embedding checksum so rebuilding the artifacts
+    also invalidates cached results.
+    """
+    variant = embeddings.manifest.get("variants", {}).get(embeddings.dtype, {})
+    lexical_index = load_lexical_index()
+    lexical_files = lexical_index.manifest.get("files", {}) if lexical_index is not None else {}
+    facet_index = load_facets() if COARSE_TO_FINE_CHAPTERS > 0 else None
+    return config_fingerprint({
+        "embedding_model": EMBEDDING_MODEL,
+        "query_prefix": QUERY_PREFIX,
+        "rerank_model": RERANK_MODEL,
+        "retrieve_k": RETRIEVE_K,
+        "inference_backend": INFERENCE_BACKEND,
+        "relevance_threshold": load_relevance_threshold(),
+        "embeddings_sha256": variant.get("sha256"),
+        "hybrid_search": lexical_index is not None,
+        "lexical_k": LEXICAL_K,
+        "rrf_k": RRF_K,
+        "adaptive_rerank": [ADAPTIVE_RERANK, CASCADE_OFF_TOPIC_SIMILARITY, CASCADE_SIMILARITY_WINDOW, CASCADE_MIN_CANDIDATES,
+                            CASCADE_DECISIVE_MARGIN, CASCADE_CHUNK_SIZE, CASCADE_STOP_MARGIN] if ADAPTIVE_RERANK else False,
+        "lexical_index_sha256": {kind: entry["sha256"] for kind, entry in lexical_files.items()},
+        "coarse_to_fine": [COARSE_TO_FINE_CHAPTERS, facet_index.manifest["centroids"]["sha256"]] if facet_index is not None else False,
+    })
+
+@st.cache_resource
+def load_search_cache(fingerprint: str) -> QueryResultCache:
+    """
+    Process-wide result cache for the given config fingerprint.
+    """
+    return QueryResultCache(
+        fingerprint,
+        max_entries=SEARCH_CACHE_MAX_ENTRIES,
+        ttl_seconds=SEARCH_CACHE_TTL_SECONDS,
+        db_path=SEARCH_CACHE_DB or None,
+    )
+
+def cached_semantic_search(query: str, model: "SentenceTransformer", embeddings: EmbeddingStore, metadata: MetadataStore, top_k: int = RERANK_TOP_K,
+                           facet_filter: FacetFilter = None):
+    """
+    semantic_search behind the two-level result cache. Repeated queries
+    (after case/whitespace normalization, with the same filter) skip both
+    model calls.
+    """
+    scope = facet_filter.cache_token() if facet_filter else ""
+    with metrics.span("search_cache"):
+        cache = load_search_cache(search_config_fingerprint(embeddings))
+        indices = cache.get(query, top_k, scope)
+    metrics.increment("search_cache_requests_total", result="miss" if indices is None else "hit")
+    if indices is None:
+        indices = search_indices_batch([query], model, embeddings, metadata, top_k, facet_filters=[facet_filter])[0]
+        cache.put(query, top_k, indices, scope)
+    else:
+        metrics.increment("search_queries_total", path="cache")
+        if not indices:
+            metrics.increment("search_empty_results_total")
+    return [metadata[i] for i in indices]
@@ -0,0 +1,80 @@
+# tests/fake_llm_server.py
+# A local stand-in for the Ollama HTTP API (POST /api/chat, streaming), for
+# exercising the retry/deadline/circuit-breaker layer without a real model.
+# Each request takes the next scripted behavior from `server.script`, or
+# `server.default` once the script is used up:
+#   "ok"            stream the CHUNKS and finish
+#   503 (any int)   answer with that HTTP status
+#   "hang"          send nothing until the server is stopped
+#   "stall"         send the first chunk, then nothing until stopped
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CHUNKS = ["friends ", "matter"]
+
+
+def _line(content: str, done: bool) -> bytes:
+    message = {"role": "assistant", "content": content}
+    return json.dumps({"model": "fake", "created_at": "2024-01-01T00:00:00Z",
+                       "message": message, "done": done}).encode("utf-8") + b"\n"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        server = self.server
+        with server.lock:
+            server.calls += 1
+            behavior = server.script.pop(0) if server.script else server.default
+        if isinstance(behavior, int):
+            self.send_response(behavior)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"{}")
+            return
+        if behavior == "hang":
+            server.released.wait()
+            return
+        # No Content-Length: the body runs until the connection closes, so
+        # chunks can be flushed (or withheld) one at a time.
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        for i, chunk in enumerate(CHUNKS):
+            if behavior == "stall" and i == 1:
+                server.released.wait()
+                return
+            self.wfile.write(_line(chunk, False))
+            self.wfile.flush()
+        self.wfile.write(_line("", True))
+
+
+class FakeLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.lock = threading.Lock()
+        self.released = threading.Event()
+        self.script = []
+        self.default = "ok"
+        self.calls = 0
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_port}"
+
+    def start(self) -> "FakeLLMServer":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.released.set()
+        self.shutdown()
+        self.server_close()
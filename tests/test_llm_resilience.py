@@ -0,0 +1,125 @@
+# tests/test_llm_resilience.py
+# Retries, deadlines and circuit-breaker transitions of the remote LLM call
+# layer (src/llm_services.py), driven through the real Ollama client against
+# tests/fake_llm_server.py.
+# Usage: python -m pytest tests
+import time
+import pytest
+from src import llm_services
+from src.config import LLM_MAX_RETRIES
+from src.providers import ollama_provider
+from tests.fake_llm_server import FakeLLMServer
+
+DEADLINE_SECONDS = 1.0
+
+
+@pytest.fixture
+def server(monkeypatch):
+    server = FakeLLMServer().start()
+    monkeypatch.setattr(ollama_provider, "OLLAMA_HOST", server.url)
+    monkeypatch.setattr(llm_services, "LLM_RETRY_BACKOFF_SECONDS", 0.01)
+    ollama_provider.get_client.clear()
+    yield server
+    server.stop()
+    ollama_provider.get_client.clear()
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    breaker = llm_services.CircuitBreaker("fake", failure_threshold=2, reset_seconds=0.2)
+    monkeypatch.setattr(llm_services, "get_circuit_breaker", lambda provider: breaker)
+    return breaker
+
+
+def call(deadline_seconds: float = DEADLINE_SECONDS):
+    return llm_services._resilient_stream(
+        "fake", lambda: ollama_provider.stream("system", "user"), deadline_seconds=deadline_seconds)
+
+
+def test_retries_transient_errors(server, breaker):
+    server.script = [503, 503]
+    assert "".join(call()) == "friends matter"
+    assert server.calls == 3
+    assert breaker.state == "closed"
+
+
+def test_gives_up_after_max_retries(server, breaker):
+    server.default = 503
+    with pytest.raises(Exception) as error:
+        "".join(call())
+    assert getattr(error.value, "status_code", None) == 503
+    assert server.calls == LLM_MAX_RETRIES + 1
+
+
+def test_does_not_retry_non_retryable_errors(server, breaker):
+    server.default = 400
+    with pytest.raises(Exception):
+        "".join(call())
+    assert server.calls == 1
+
+
+def test_does_not_retry_after_text_streamed(breaker):
+    attempts = []
+
+    def open_stream():
+        attempts.append(1)
+        yield "partial"
+        raise ConnectionError("dropped")
+
+    chunks = []
+    with pytest.raises(ConnectionError):
+        for chunk in llm_services._resilient_stream("fake", open_stream, deadline_seconds=DEADLINE_SECONDS):
+            chunks.append(chunk)
+    assert chunks == ["partial"] and len(attempts) == 1
+
+
+@pytest.mark.parametrize("behavior", ["hang", "stall"])
+def test_deadline_bounds_a_silent_backend(server, breaker, behavior):
+    server.default = behavior
+    start = time.monotonic()
+    with pytest.raises(TimeoutError):
+        "".join(call())
+    assert time.monotonic() - start < DEADLINE_SECONDS + 0.5
+
+
+def test_breaker_opens_then_half_open_trial_closes_it(server, breaker):
+    server.script = [400, 400]
+    for _ in range(2):
+        with pytest.raises(Exception):
+            "".join(call())
+    assert breaker.state == "open"
+    with pytest.raises(llm_services.CircuitOpenError):
+        "".join(call())
+    assert server.calls == 2
+
+    time.sleep(0.25)
+    assert breaker.state == "half-open"
+    assert "".join(call()) == "friends matter"
+    assert breaker.state == "closed"
+
+
+def test_failed_half_open_trial_reopens_breaker(server, breaker):
+    server.script = [400, 400, 400]
+    for _ in range(2):
+        with pytest.raises(Exception):
+            "".join(call())
+    time.sleep(0.25)
+    with pytest.raises(Exception):
+        "".join(call())
+    assert breaker.state == "open"
+
+
+def test_half_open_trial_closed_mid_stream_is_released(server, breaker):
+    server.script = [400, 400]
+    for _ in range(2):
+        with pytest.raises(Exception):
+            "".join(call())
+    time.sleep(0.25)
+
+    stream = call()
+    assert next(stream) == "friends "
+    stream.close()
+    assert breaker.state == "half-open"
+    # The next call must be allowed as the new trial, not rejected.
+    assert "".join(call()) == "friends matter"
+    assert breaker.state == "closed"